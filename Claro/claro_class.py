@@ -1,11 +1,41 @@
 import os
 import re
+import sys
 import fnmatch
-import pandas as pd
+import importlib
 import numpy as np
-from scipy import optimize, special, stats
-import matplotlib.pyplot as plt
 import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+class LazyModule:
+    """
+    A module imported on first use (same helper as SiPM_class.py, the two folders are independent),
+    so that claro_main.py only loads pandas, scipy and matplotlib when the command needs them.
+    """
+
+    def __init__(self, name, setup=None):
+        self._name, self._setup, self._module = name, setup, None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            if self._setup is not None:
+                self._setup()
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def headless_backend():
+    # Agg backend (plt.show() does nothing) unless MPLBACKEND is set (e.g. MPLBACKEND=TkAgg) or pyplot is already in use
+    if "MPLBACKEND" not in os.environ and "matplotlib.pyplot" not in sys.modules:
+        importlib.import_module("matplotlib").use("Agg")
+
+
+pd = LazyModule("pandas")
+plt = LazyModule("matplotlib.pyplot", setup=headless_backend)
+optimize = LazyModule("scipy.optimize")
+special = LazyModule("scipy.special")
+stats = LazyModule("scipy.stats")
 
 
 ###############################################################################
@@ -318,6 +348,13 @@ class MultiAnalyzer:
         dir_walker_texas_ranger(): Traverse the self.path directory and find all the matching files, storing their paths in a .txt file.
         list_reader(): Read a .txt file containing a list of file paths and return the list of file paths.
         analyzer(discard_unfit=True, savepath=os.getcwd()): Reads self.__file_list, splits the good and bad files and applies the Claro.fit_erf() method to the good files creating .csv file with the results.
+        chip_analyzer(discard_unfit=True, savepath=os.getcwd(), erf_guess=None, workers=1): Same outputs of analyzer(), with the files loaded and fitted one chip at a time
+            (see chip_fitter), plus the per-chip transition point vs offset slopes.
+        quick_look(per_chip=2, rounds=1, savepath=os.getcwd(), ci=0.95, seed=0, erf_guess=None, saveplot=True): Fits a stratified random sample of the files
+            of each station and chip and estimates the lot quantities with confidence intervals, refining them round after round.
+        load_processed(savepath=os.getcwd()): Reads the results saved by analyzer(), to make the histograms and the summary without fitting again.
+        histograms(saveplot=True): Plots histograms of the transition points, their erf estimates and the discrepancy between them.
+        summary(savepath=os.getcwd(), heatmap="T_point_std", saveplot=True): Computes per-station, per-chip and per-channel statistics and plots a chip-grid heatmap for each station.
     """
 
     def __init__(self, path):
@@ -394,6 +431,7 @@ class MultiAnalyzer:
 
         _goodfiles = []
         _badfiles = []
+        unfit_list = []
 
         # split good and bad files and write them to files
         for idx, element in enumerate(self.__file_list):
@@ -427,6 +465,7 @@ class MultiAnalyzer:
 
             if discard_unfit == True:
                 if np.isnan(erf["transition_point_(erf)"][1]):
+                    unfit_list.append([info["station"], info["chip"], info["channel"]])
                     with open(rf"{savepath}\claro_unfit_chips.txt", "a") as unfit:
                         unfit.write("{}\n".format(data["path"]))
                         continue
@@ -463,10 +502,198 @@ class MultiAnalyzer:
             rf"{savepath}\claro_processed_chips.csv",
             index=False,
         )
+        # Without discard_unfit the unfit files are not known (None), see summary()
+        self.unfit_df = pd.DataFrame(unfit_list, columns=["Station", "Chip", "Channel"]) if discard_unfit == True else None
 
         if discard_unfit == True:
             print(rf"list of unfit files created as {savepath}\claro_unfit_chips.txt")
 
+    def chip_analyzer(self, discard_unfit=True, savepath=os.path.abspath(os.getcwd()), erf_guess=None, workers=1):
+        """
+        Chip-level version of analyzer(): the files of self.__file_list are grouped by their S_curve directory (one chip each) and every chip is
+        loaded as one array block and fitted as a batch by chip_fitter(), optionally in parallel processes.
+        Saves the same files of analyzer() (the processed chips also have the Offset column) and claro_offset_slopes.csv,
+        with the slope of the erf transition point versus the offset of every channel of every chip.
+
+        Args:
+        ----------
+            discard_unfit, savepath, erf_guess: see analyzer().
+            workers (int, optional): number of processes fitting the chips, 1 to fit them in this process. Defaults to 1.
+
+        Returns:
+        ----------
+            None
+        """
+        if not os.path.exists(savepath):
+            os.makedirs(savepath)
+
+        chips = {}
+        for element in self.__file_list:
+            chip_name = element.strip("\n")
+            if chip_name:
+                chips.setdefault(os.path.dirname(chip_name), []).append(chip_name)
+
+        outputs = {}
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(chip_fitter, folder, files, erf_guess): folder for folder, files in chips.items()}
+                for idx, future in enumerate(as_completed(futures)):
+                    outputs[futures[future]] = future.result()
+                    progress_bar(idx + 1, len(chips))
+        else:
+            for idx, (folder, files) in enumerate(chips.items()):
+                outputs[folder] = chip_fitter(folder, files, erf_guess)
+                progress_bar(idx + 1, len(chips))
+        print("\n")
+
+        # Outputs in the order of the file list
+        fits = pd.concat([outputs[folder]["fits"] for folder in chips], ignore_index=True)
+        _badfiles = [file for folder in chips for file in outputs[folder]["bad"]]
+        _goodfiles = fits["path"].tolist()
+        unfit = fits["std_erf_t_point"].isna() if discard_unfit == True else np.zeros(len(fits), dtype=bool)
+
+        print(f"found {len(_badfiles)} bad files")
+        print(rf"list of bad files created as {savepath}\claro_badfiles.txt")
+        with open(rf"{savepath}\claro_badfiles.txt", "w") as outfile:
+            outfile.write("\n".join(_badfiles))
+
+        print(f"found {len(_goodfiles)} good files")
+        print(rf"list of good files created as {savepath}\claro_goodfiles.txt")
+        with open(rf"{savepath}\claro_goodfiles.txt", "w") as outfile:
+            outfile.write("\n".join(_goodfiles))
+
+        if discard_unfit == True:
+            with open(rf"{savepath}\claro_unfit_chips.txt", "w") as outfile:
+                outfile.write("".join(f"{path}\n" for path in fits.loc[unfit, "path"]))
+            print(rf"list of unfit files created as {savepath}\claro_unfit_chips.txt")
+
+        self.processed_df = fits.loc[~unfit].drop(columns="path").reset_index(drop=True)
+        self.processed_df.to_csv(rf"{savepath}\claro_processed_chips.csv", index=False)
+        self.unfit_df = fits.loc[unfit, ["Station", "Chip", "Channel"]].reset_index(drop=True) if discard_unfit == True else None
+
+        self.slopes_df = offset_slopes(fits.loc[~unfit])
+        self.slopes_df.to_csv(os.path.join(savepath, "claro_offset_slopes.csv"), index=False, float_format="%.6g")
+        print(f"Transition point vs offset slopes saved as {os.path.join(savepath, 'claro_offset_slopes.csv')}")
+
+    def quick_look(self, per_chip=2, rounds=1, savepath=os.path.abspath(os.getcwd()), ci=0.95, seed=0, erf_guess=None, saveplot=True):
+        """
+        Quick look of a lot: draws a stratified random sample of per_chip files from every station and chip of self.__file_list, fits them with chip_fitter()
+        and estimates the mean transition point, the mean erf discrepancy and the bad and unfit fractions of the whole lot, with confidence intervals
+        (see stratified_estimate). Every round adds per_chip new files per chip to the sample and refines the estimates, until rounds are done,
+        all the files are fitted (the full run) or the run is interrupted with Ctrl+C.
+        After every round the estimates are saved as claro_quicklook.csv and, if requested, the preliminary histograms as Histogram_quicklook.png.
+
+        Args:
+        ----------
+            per_chip (int, optional): the number of files sampled from each chip in every round. Defaults to 2.
+            rounds (int, optional): the number of rounds, None to go on until all the files are fitted. Defaults to 1.
+            savepath (string, optional): The save path of the estimates and histograms. Defaults to the current directory.
+            ci (float, optional): the confidence level of the intervals. Defaults to 0.95.
+            seed (int, optional): the seed of the sampling. Defaults to 0.
+            erf_guess (list, optional): see analyzer(). Defaults to None.
+            saveplot (bool, optional): If True, saves the preliminary histograms. Defaults to True.
+
+        Returns:
+        ----------
+            quicklook_df (pandas.DataFrame): one row per quantity (T_point, Discrepancy, bad_fraction, unfit_fraction)
+                with the estimate, ci_low, ci_high and the number of sampled values n.
+        """
+        if not os.path.exists(savepath):
+            os.makedirs(savepath)
+
+        # Strata: the files of each station and chip, in random order
+        strata = {}
+        for element in self.__file_list:
+            chip_name = element.strip("\n")
+            if chip_name:
+                station = re.search(".+Station_1__(.+?)_Summary.+", chip_name)
+                chip = re.search(".+Chip_(.+?).txt", chip_name)
+                strata.setdefault((station.group(1) if station else "?", chip.group(1) if chip else "?"), []).append(chip_name)
+        rng = np.random.default_rng(seed)
+        members = [[files[i] for i in rng.permutation(len(files))] for files in strata.values()]
+        sizes = np.array([len(files) for files in members])
+        n_files = sizes.sum()
+
+        samples = []
+        round_idx = 0
+        try:
+            while rounds is None or round_idx < rounds:
+                drawn = [(h, file) for h, files in enumerate(members) for file in files[round_idx * per_chip: (round_idx + 1) * per_chip]]
+                if not drawn:
+                    break
+                chips = {}
+                for h, file in drawn:
+                    chips.setdefault(os.path.dirname(file), []).append(file)
+                stratum = {file: h for h, file in drawn}
+
+                for folder, files in chips.items():
+                    output = chip_fitter(folder, files, erf_guess)
+                    fits = output["fits"]
+                    samples.append(
+                        pd.DataFrame(
+                            {
+                                "stratum": [stratum[file] for file in fits["path"]] + [stratum[file] for file in output["bad"]],
+                                "bad": [0] * len(fits) + [1] * len(output["bad"]),
+                                "unfit": fits["std_erf_t_point"].isna().astype(float).tolist() + [np.nan] * len(output["bad"]),
+                                "T_point": fits["T_point"].where(fits["std_erf_t_point"].notna()).tolist() + [np.nan] * len(output["bad"]),
+                                "Discrepancy": (fits["T_point"] - fits["erf_t_point"]).where(fits["std_erf_t_point"].notna()).tolist()
+                                + [np.nan] * len(output["bad"]),
+                            }
+                        )
+                    )
+                round_idx += 1
+
+                sample = pd.concat(samples, ignore_index=True)
+                rows = []
+                for quantity, column in [("T_point", "T_point"), ("Discrepancy", "Discrepancy"), ("bad_fraction", "bad"), ("unfit_fraction", "unfit")]:
+                    estimate, low, high = stratified_estimate(sample[column].to_numpy(dtype=float), sample["stratum"].to_numpy(), sizes, ci)
+                    if quantity.endswith("fraction"):
+                        low, high = max(low, 0), min(high, 1)
+                    rows.append([quantity, estimate, low, high, int(sample[column].notna().sum())])
+                self.quicklook_df = pd.DataFrame(rows, columns=["quantity", "estimate", "ci_low", "ci_high", "n"])
+                self.quicklook_df.to_csv(os.path.join(savepath, "claro_quicklook.csv"), index=False, float_format="%.6g")
+
+                print(f"Quick look, round {round_idx}: {len(sample)} of {n_files} files fitted")
+                print(self.quicklook_df.to_string(index=False))
+                if saveplot == True:
+                    quicklook_hist(sample, len(sample), n_files, os.path.join(savepath, "Histogram_quicklook.png"))
+        except KeyboardInterrupt:
+            print(f"Quick look stopped after {round_idx} rounds")
+
+        print(f"Quick look estimates saved as {os.path.join(savepath, 'claro_quicklook.csv')}")
+        return getattr(self, "quicklook_df", None)
+
+    def load_processed(self, savepath=os.path.abspath(os.getcwd())):
+        """
+        Reads the results saved by analyzer() (claro_processed_chips.csv and claro_unfit_chips.txt), so that the histograms and the summary
+        can be made without fitting the files again. Without claro_unfit_chips.txt (analyzer run with discard_unfit=False) the unfit files are unknown.
+
+        Args:
+        ----------
+            savepath (string, optional): The save path of the results. Defaults to the current directory.
+
+        Returns:
+        ----------
+            processed_df (pd.DataFrame): The fit results of the good files.
+        """
+        self.processed_df = pd.read_csv(rf"{savepath}\claro_processed_chips.csv", dtype={"Station": str, "Chip": str, "Channel": str})
+
+        unfit_list = None
+        if os.path.exists(rf"{savepath}\claro_unfit_chips.txt"):
+            unfit_list = []
+            with open(rf"{savepath}\claro_unfit_chips.txt", "r") as unfit:
+                for line in unfit.read().split():
+                    station = re.search(".+Station_1__(.+?)_Summary.+", line)
+                    unfit_list.append(
+                        [
+                            station.group(1) if station else "?",
+                            re.search(".+Chip_(.+?).txt", line).group(1),
+                            re.search(".+Ch_(.+?)_.+", line).group(1),
+                        ]
+                    )
+        self.unfit_df = pd.DataFrame(unfit_list, columns=["Station", "Chip", "Channel"]) if unfit_list is not None else None
+        return self.processed_df
+
     def histograms(self, saveplot=True):
         """
         Plot histograms of the transition points, their corresponding erf estimates and the discrepancy between them.
@@ -505,6 +732,214 @@ class MultiAnalyzer:
             print(f"Plot saved as {os.getcwd()}\{plotname}")
         plt.show()
 
+    def summary(self, savepath=os.path.abspath(os.getcwd()), heatmap="T_point_std", saveplot=True):
+        """
+        Computes count, mean, std, min and max of the transition point, the width and the erf discrepancy, together with the unfit fraction,
+        for every station, every chip (of each station) and every channel (of each station).
+        The raw results are reduced once at the (station, chip, channel) level and then rolled up, so the whole summary is a single pass over self.processed_df.
+        The tables are saved as .csv files and, if requested, a chip-grid heatmap of the chosen statistic is saved for each station.
+        The unfit fraction is NaN when the unfit files are unknown (analyzer() run with discard_unfit=False, or load_processed() without claro_unfit_chips.txt).
+
+        Args:
+        ----------
+            savepath (string, optional): The save path of the tables and heatmaps. Defaults to the current directory.
+            heatmap (str, optional): The per-chip column to color the heatmaps with (e.g. "T_point_std", "Width_mean", "unfit_fraction"). Defaults to "T_point_std".
+            saveplot (bool, optional): If True, saves a heatmap for each station. Defaults to True.
+
+        Returns:
+        ----------
+            tables (dict): A dictionary with keys 'station', 'chip' and 'channel' containing the summary DataFrames.
+        """
+        if not os.path.exists(savepath):
+            os.makedirs(savepath)
+
+        fit = pd.DataFrame(
+            {
+                "Station": self.processed_df["Station"].astype(str),
+                "Chip": self.processed_df["Chip"].astype(str),
+                "Channel": self.processed_df["Channel"].astype(str),
+                "T_point": self.processed_df["T_point"].to_numpy(dtype=float),
+                "Width": self.processed_df["Width"].to_numpy(dtype=float),
+                "Discrepancy": (self.processed_df["T_point"] - self.processed_df["erf_t_point"]).to_numpy(dtype=float),
+                "unfit": 0,
+            }
+        )
+        unfit_df = getattr(self, "unfit_df", None)
+        unfit = (unfit_df if unfit_df is not None else pd.DataFrame(columns=["Station", "Chip", "Channel"])).astype(str)
+        unfit["unfit"] = 1
+        data = pd.concat([fit, unfit], ignore_index=True)
+
+        quantities = ["T_point", "Width", "Discrepancy"]
+        base = moments_table(data, ["Station", "Chip", "Channel"], quantities)
+
+        tables = {
+            "station": summary_stats(base, ["Station"], quantities),
+            "chip": summary_stats(base, ["Station", "Chip"], quantities),
+            "channel": summary_stats(base, ["Station", "Channel"], quantities),
+        }
+        if unfit_df is None:
+            for table in tables.values():
+                table["unfit_fraction"] = np.nan
+        for level, table in tables.items():
+            table.to_csv(os.path.join(savepath, f"claro_summary_{level}.csv"), index=False, float_format="%.6g")
+        print(f"Summary tables saved as {os.path.join(savepath, 'claro_summary_<station/chip/channel>.csv')}")
+
+        if saveplot == True:
+            for station, chips in tables["chip"].groupby("Station"):
+                fig, ax = plt.subplots()
+                chip_heatmap(fig, ax, chips, heatmap)
+                fig.suptitle(f"Station {station}: {heatmap} per chip")
+                plotname = f"Heatmap_Station{station}_{heatmap}.png"
+                plt.savefig(os.path.join(savepath, plotname), bbox_inches="tight")
+                plt.close(fig)
+            print(f"Heatmaps saved as {os.path.join(savepath, f'Heatmap_Station<station>_{heatmap}.png')}")
+
+        return tables
+
+
+
+###############################################################################
+#                                Lot comparison                               #
+###############################################################################
+
+
+class LotComparison:
+    """
+    Compares two or more Claro result sets (claro_processed_chips.csv files, e.g. a new lot and a previous run, or the same chips retested).
+    The results are keyed by (station, chip, channel, offset) packed into a single integer (see pack_keys) and joined with a sorted merge
+    of the integer keys; the drift of the transition point and of the width of every channel is taken against the first (baseline) result set.
+
+    Parameters:
+    ----------
+        results (list): the paths of the .csv files, or DataFrames with the same columns, the first one is the baseline.
+        labels (list, optional): a name for each result set, if None the name of the folder of each file (or lot_<n>). Defaults to None.
+
+    Methods:
+    ----------
+        compare(savepath=os.getcwd(), z_cut=3.5, saveplot=True): Evaluates and saves the drift tables, the outliers and the overlay histograms.
+    """
+
+    KEYS = ["Station", "Chip", "Channel", "Offset"]
+    QUANTITIES = ["T_point", "Width"]
+
+    def __init__(self, results, labels=None):
+        """
+        Load the result sets, sorted by their packed keys. Duplicated keys keep the last row and the number of collapsed rows is printed
+        and reported in the coverage table of compare(); duplicates in a result set without the Offset column (e.g. several offsets
+        processed by MultiAnalyzer.analyzer) raise a ValueError, since the channels could not be matched.
+
+        Args:
+        ----------
+            results (list): the paths of the .csv files or the DataFrames, the first one is the baseline.
+            labels (list, optional): a name for each result set. Defaults to None.
+        """
+        if len(results) < 2:
+            raise ValueError("At least two result sets are needed for a comparison")
+        if labels is None:
+            labels = [os.path.basename(os.path.dirname(os.path.abspath(result))) if isinstance(result, str) else "" for result in results]
+            if len(set(labels)) < len(labels) or "" in labels:
+                labels = [f"lot_{idx}" for idx in range(len(results))]
+        self.labels = list(labels)
+
+        self.lots = []
+        for label, result in zip(self.labels, results):
+            if isinstance(result, str):
+                result = pd.read_csv(result, dtype={key: str for key in self.KEYS})
+            keys = pack_keys(result)
+            order = np.argsort(keys, kind="stable")
+            last = np.r_[keys[order][1:] != keys[order][:-1], True]  # Last row of each key
+            collapsed = int(len(keys) - last.sum())
+            if collapsed:
+                if "Offset" not in result:
+                    raise ValueError(f"{label}: {collapsed} rows share station, chip and channel and there is no Offset column to tell them apart")
+                print(f"{label}: {collapsed} rows with duplicated station, chip, channel and offset collapsed (the last one is kept)")
+            self.lots.append({"keys": keys[order][last], "table": result.iloc[order[last]].reset_index(drop=True), "collapsed": collapsed})
+
+    def compare(self, savepath=os.path.abspath(os.getcwd()), z_cut=3.5, min_spread=1e-3, saveplot=True):
+        """
+        Single pass over the joined result sets: the per-channel drift table (claro_drift.csv), its per-chip summary (claro_drift_summary.csv,
+        see summary_stats), the outliers (claro_drift_outliers.csv) and, if requested, the overlay histograms (Histogram_lot_comparison.png).
+        The outliers are the channels whose drift of T_point or Width is more than z_cut robust standard deviations (1.4826 MAD) away from the median drift of their comparison.
+        The robust standard deviation has a floor of min_spread times the median magnitude of the quantity in the baseline, so that when most drifts
+        are identical (MAD = 0, e.g. a re-run of the same lot or a uniform shift) only the drifts beyond z_cut times that floor are outliers.
+
+        Args:
+        ----------
+            savepath (string, optional): The save path of the tables and histograms. Defaults to the current directory.
+            z_cut (float, optional): the robust z-score above which a channel is an outlier. Defaults to 3.5.
+            min_spread (float, optional): the floor of the robust standard deviation, relative to the median magnitude of the quantity. Defaults to 1e-3.
+            saveplot (bool, optional): If True, saves the overlay histograms. Defaults to True.
+
+        Returns:
+        ----------
+            tables (dict): A dictionary with keys 'drift' (one row per lot and matched channel/offset, with the <quantity>_base, <quantity>, <quantity>_drift
+                and <quantity>_z columns), 'summary' (per lot, station and chip), 'outliers' and 'coverage' (the keys matched, only in the baseline
+                and only in the lot, and the duplicated rows collapsed in the baseline and in the lot, for each lot).
+        """
+        if not os.path.exists(savepath):
+            os.makedirs(savepath)
+
+        base = self.lots[0]
+        drifts, coverage = [], []
+        for label, lot in zip(self.labels[1:], self.lots[1:]):
+            _, idx_base, idx_lot = np.intersect1d(base["keys"], lot["keys"], assume_unique=True, return_indices=True)
+            drift = base["table"].loc[idx_base, [key for key in self.KEYS if key in base["table"]]].reset_index(drop=True)
+            drift.insert(0, "lot", label)
+            for q in self.QUANTITIES:
+                before = base["table"][q].to_numpy(dtype=float)[idx_base]
+                after = lot["table"][q].to_numpy(dtype=float)[idx_lot]
+                drift[f"{q}_base"] = before
+                drift[q] = after
+                drift[f"{q}_drift"] = after - before
+
+                # Robust z-score of the drift within the comparison, with a floor on the spread (rounding noise when MAD = 0)
+                median = np.nanmedian(drift[f"{q}_drift"]) if len(drift) else np.nan
+                mad = 1.4826 * np.nanmedian(np.abs(drift[f"{q}_drift"] - median)) if len(drift) else np.nan
+                mad = np.fmax(mad, min_spread * np.nanmedian(np.abs(before))) if len(drift) else np.nan
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    drift[f"{q}_z"] = (drift[f"{q}_drift"] - median) / mad
+            drifts.append(drift)
+            coverage.append(
+                [label, len(idx_base), len(base["keys"]) - len(idx_base), len(lot["keys"]) - len(idx_lot), base["collapsed"], lot["collapsed"]]
+            )
+
+        drift = pd.concat(drifts, ignore_index=True)
+        z = np.column_stack([drift[f"{q}_z"].to_numpy(dtype=float) for q in self.QUANTITIES])
+        outliers = drift[(np.abs(np.nan_to_num(z, nan=0.0, posinf=np.inf)) > z_cut).any(axis=1)]
+
+        quantities = [f"{q}_drift" for q in self.QUANTITIES]
+        base_moments = moments_table(drift.assign(unfit=0), ["lot", "Station", "Chip", "Channel"], quantities)
+        summary = summary_stats(base_moments, ["lot", "Station", "Chip"], quantities).drop(columns="unfit_fraction")
+        summary = summary.rename(columns={"n_files": "n_channels"})
+        coverage = pd.DataFrame(coverage, columns=["lot", "matched", "only_baseline", "only_lot", "collapsed_baseline", "collapsed_lot"])
+
+        drift.to_csv(os.path.join(savepath, "claro_drift.csv"), index=False, float_format="%.6g")
+        summary.to_csv(os.path.join(savepath, "claro_drift_summary.csv"), index=False, float_format="%.6g")
+        outliers.to_csv(os.path.join(savepath, "claro_drift_outliers.csv"), index=False, float_format="%.6g")
+        print(coverage.to_string(index=False))
+        print(f"found {len(outliers)} outlier channels (|z| > {z_cut})")
+        print(f"Drift tables saved as {os.path.join(savepath, 'claro_drift<_summary/_outliers>.csv')}")
+
+        if saveplot == True:
+            fig, axs = plt.subplots(2, len(self.QUANTITIES))
+            fig.suptitle("Lot comparison")
+            for col, q in enumerate(self.QUANTITIES):
+                for label, lot in zip(self.labels, self.lots):
+                    axs[0, col].hist(lot["table"][q].dropna(), bins=100, histtype="step", label=label)
+                axs[1, col].hist(drift.groupby("lot")[f"{q}_drift"].apply(lambda values: values.dropna().to_numpy()).tolist(), bins=100,
+                                 histtype="step", label=list(drift["lot"].unique()))
+                axs[0, col].set_title(q)
+                axs[1, col].set_title(f"{q} drift")
+                [ax.grid("on") for ax in axs[:, col]]
+            axs[0, 0].legend()
+            plt.tight_layout()
+            plotname = os.path.join(savepath, "Histogram_lot_comparison.png")
+            plt.savefig(plotname, bbox_inches="tight")
+            plt.close(fig)
+            print(f"Plot saved as {plotname}")
+
+        self.tables = {"drift": drift, "summary": summary, "outliers": outliers, "coverage": coverage}
+        return self.tables
 
 
 ######################################################################
@@ -531,6 +966,426 @@ def progress_bar(progress, total):
     print(f"\r|{bar} | {percent:.2f}%", end="\r")
 
 
+def moments_table(data, keys, quantities):
+    """
+    Reduces the data to the sufficient statistics of each quantity for every group of keys: non-NaN count, sum, sum of squares, min and max.
+    The quantities are centered on their global mean before summing to keep the variance evaluation numerically stable.
+    The resulting table can be rolled up to any coarser grouping with summary_stats().
+
+    Args:
+    ----------
+        data (pandas.DataFrame): DataFrame containing the keys, the quantities and an "unfit" column of 0/1 flags.
+        keys (list): The columns identifying the finest groups.
+        quantities (list): The columns to reduce.
+
+    Returns:
+    ----------
+        base (pandas.DataFrame): One row per group with the n_files, n_unfit and {quantity}_n/_s/_ss/_min/_max columns, plus a "center" attribute.
+    """
+    center = {q: np.nanmean(data[q].to_numpy(dtype=float)) if data[q].notna().any() else 0.0 for q in quantities}
+    reduced = data[keys + ["unfit"]].copy()
+    aggs = {"n_files": ("unfit", "size"), "n_unfit": ("unfit", "sum")}
+    for q in quantities:
+        values = data[q].to_numpy(dtype=float) - center[q]
+        reduced[q] = values
+        reduced[f"{q}_sq"] = values**2
+        aggs[f"{q}_n"] = (q, "count")
+        aggs[f"{q}_s"] = (q, "sum")
+        aggs[f"{q}_ss"] = (f"{q}_sq", "sum")
+        aggs[f"{q}_min"] = (q, "min")
+        aggs[f"{q}_max"] = (q, "max")
+    base = reduced.groupby(keys, sort=True).agg(**aggs).reset_index()
+    base.attrs["center"] = center
+    return base
+
+
+def summary_stats(base, keys, quantities):
+    """
+    Rolls up a moments_table() to the given keys and evaluates count, mean, std (ddof=1), min, max of each quantity and the unfit fraction.
+
+    Args:
+    ----------
+        base (pandas.DataFrame): The output of moments_table().
+        keys (list): The columns to group by, a subset of the keys used to build base.
+        quantities (list): The quantities to summarize.
+
+    Returns:
+    ----------
+        table (pandas.DataFrame): One row per group with the n_files, unfit_fraction and {quantity}_count/_mean/_std/_min/_max columns.
+    """
+    center = base.attrs["center"]
+    sums = [c for c in base.columns if c.endswith(("_n", "_s", "_ss")) or c in ("n_files", "n_unfit")]
+    aggs = {c: (c, "sum") for c in sums}
+    aggs.update({f"{q}_min": (f"{q}_min", "min") for q in quantities})
+    aggs.update({f"{q}_max": (f"{q}_max", "max") for q in quantities})
+    rolled = base.groupby(keys, sort=True).agg(**aggs).reset_index()
+
+    table = rolled[keys].copy()
+    table["n_files"] = rolled["n_files"]
+    table["unfit_fraction"] = rolled["n_unfit"] / rolled["n_files"]
+    for q in quantities:
+        n = rolled[f"{q}_n"].to_numpy(dtype=float)
+        s = rolled[f"{q}_s"].to_numpy(dtype=float)
+        ss = rolled[f"{q}_ss"].to_numpy(dtype=float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = s / n
+            var = np.clip(ss - s * mean, 0, None) / (n - 1)
+        table[f"{q}_count"] = n.astype(int)
+        table[f"{q}_mean"] = np.where(n > 0, mean + center[q], np.nan)
+        table[f"{q}_std"] = np.where(n > 1, np.sqrt(var), np.nan)
+        table[f"{q}_min"] = rolled[f"{q}_min"] + center[q]
+        table[f"{q}_max"] = rolled[f"{q}_max"] + center[q]
+    return table
+
+
+def chip_heatmap(fig, ax, chips, column):
+    """
+    Draws the chips of a station on a square grid, colored by the chosen column and labelled with the chip number.
+
+    Args:
+    ----------
+        fig (matplotlib.figure): Figure hosting the colorbar.
+        ax (matplotlib.axes): Axes to draw the heatmap on.
+        chips (pandas.DataFrame): Per-chip summary table of a single station.
+        column (str): The column of chips to color the grid with.
+
+    Returns:
+    ----------
+        None
+    """
+    n_chips = len(chips)
+    n_cols = int(np.ceil(np.sqrt(n_chips)))
+    n_rows = int(np.ceil(n_chips / n_cols))
+    grid = np.full(n_rows * n_cols, np.nan)
+    grid[:n_chips] = chips[column].to_numpy(dtype=float)
+
+    image = ax.imshow(np.ma.masked_invalid(grid.reshape(n_rows, n_cols)), cmap="viridis")
+    for idx, chip in enumerate(chips["Chip"]):
+        ax.text(idx % n_cols, idx // n_cols, chip, ha="center", va="center", fontsize=5, color="white")
+    ax.set_xticks([])
+    ax.set_yticks([])
+    fig.colorbar(image, ax=ax, label=column)
+
+
+def chip_loader(folder, files=None):
+    """
+    Loads all the channel/offset curves of a chip (the Ch_N_offset_M_Chip_XXX.txt files of its S_curve directory) as one array block.
+    The directory is listed once and the data lines of all the good files are parsed together; files whose first line contains letters are bad files.
+
+    Args:
+    ----------
+        folder (str): the S_curve directory of the chip.
+        files (list, optional): the paths of the files to load, if None all the matching files of folder are loaded. Defaults to None.
+
+    Returns:
+    ----------
+        block (dict): A dictionary containing the following information:
+            info (pandas.DataFrame): Station, Chip, Channel, Offset, Amplitude, T_point, Width and path of each good file.
+            x, y (numpy.ndarray): (curve x point) arrays of the ADC values and counts, NaN-padded.
+            bad (list): the paths of the bad files.
+    """
+    if files is None:
+        files = sorted(entry.path for entry in os.scandir(folder) if fnmatch.fnmatch(entry.name, "Ch_*_offset_*_Chip_*.txt"))
+
+    rows, lines, counts, bad = [], [], [], []
+    for path in files:
+        with open(path, "r") as chip:
+            text = chip.read().split("\n")
+        if re.search("[a-zA-Z]", text[0]):
+            bad.append(path)
+            continue
+        header = text[0].split("\t")
+        data = [line for line in text[2:] if line.strip()]
+        station = re.search(".+Station_1__(.+?)_Summary.+", path)
+        rows.append(
+            [
+                station.group(1) if station else "?",  # Station missing if given a single file to read
+                re.search(".+Chip_(.+?).txt", path).group(1),
+                re.search(".+Ch_(.+?)_.+", path).group(1),
+                re.search(".+_offset_(.+?)_.+", path).group(1),
+                float(header[0]),
+                float(header[1]),
+                np.abs(float(header[2])),
+                path,
+            ]
+        )
+        lines += data
+        counts.append(len(data))
+
+    info = pd.DataFrame(rows, columns=["Station", "Chip", "Channel", "Offset", "Amplitude", "T_point", "Width", "path"])
+    values = np.loadtxt(lines, delimiter="\t", usecols=(0, 1), ndmin=2) if lines else np.empty((0, 2))
+    x = np.full((len(rows), max(counts, default=0)), np.nan)
+    y = np.full_like(x, np.nan)
+    mask = np.arange(x.shape[1])[None, :] < np.array(counts, dtype=int)[:, None]
+    x[mask] = values[:, 0]
+    y[mask] = values[:, 1]
+    return {"info": info, "x": x, "y": y, "bad": bad}
+
+
+def chip_fitter(folder, files=None, erf_guess=None):
+    """
+    The unit of work of MultiAnalyzer.chip_analyzer: loads a chip with chip_loader() and fits all its curves at once with erf_batch_fit().
+    Defined at module level so that it can be dispatched to worker processes.
+
+    Args:
+    ----------
+        folder (str): the S_curve directory of the chip.
+        files (list, optional): the paths of the files to load, see chip_loader(). Defaults to None.
+        erf_guess (list, optional): the first guesses for the height, t_point and width of all the curves, if None the values of each file are used. Defaults to None.
+
+    Returns:
+    ----------
+        results (dict): fits (the chip_loader info with the erf_t_point and std_erf_t_point columns, std NaN if the fit did not converge)
+            and bad (the paths of the bad files).
+    """
+    block = chip_loader(folder, files)
+    fits = block["info"]
+    guess = fits[["Amplitude", "T_point", "Width"]].to_numpy(dtype=float)
+    if erf_guess is not None:
+        guess = np.tile(np.asarray(erf_guess, dtype=float), (len(fits), 1))
+    params, std = erf_batch_fit(block["x"], block["y"], guess)
+
+    fits.insert(7, "erf_t_point", params[:, 1])
+    fits.insert(8, "std_erf_t_point", std[:, 1])
+    return {"fits": fits, "bad": block["bad"]}
+
+
+def erf_batch_fit(x, y, guess, max_iter=200, tol=1e-10):
+    """
+    Levenberg-Marquardt fit of modified_erf on many curves at once, the batched equivalent of Claro.fit_erf().
+    The Jacobians of all the curves are stacked as (curve x point x 3) arrays and the damped normal equations are solved together;
+    the standard deviations are evaluated as in curve_fit (covariance scaled by the reduced chi square).
+    Only the fits that converged through the relative decrease of the squared residuals are kept: the curves that stalled
+    (no step decreases the residuals any more), hit a singular system or ran out of iterations, and the degenerate fits
+    (width below one DAC step, e.g. step-shaped curves, or ill-conditioned J^T J) are refitted one by one
+    with optimize.curve_fit exactly as in Claro.fit_erf().
+
+    Args:
+    ----------
+        x, y (numpy.ndarray): (curve x point) arrays of the data, NaN-padded.
+        guess (numpy.ndarray): (curve x 3) first guesses of the height, t_point and width.
+        max_iter (int, optional): the maximum number of iterations. Defaults to 200.
+        tol (float, optional): the relative decrease of the squared residuals below which a fit has converged. Defaults to 1e-10.
+
+    Returns:
+    ----------
+        (params, std): (curve x 3) arrays of the fitted height, t_point and width and of their standard deviations,
+            std is NaN where the fit did not converge or the covariance could not be estimated.
+    """
+    valid = np.isfinite(x) & np.isfinite(y)
+    x = np.where(valid, x, 0)
+    y = np.where(valid, y, 0)
+    guess = np.array(guess, dtype=float).reshape(-1, 3)
+    params = guess.copy()
+    damping = np.full(len(params), 1e-3)
+    converged = np.zeros(len(params), dtype=bool)  # Relative decrease of the squared residuals below tol
+    stalled = np.zeros(len(params), dtype=bool)  # Singular system or damping blown up, refitted with curve_fit
+
+    def residuals_jacobian(p):
+        height, a, b = p[:, :1], p[:, 1:2], p[:, 2:]
+        with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+            z = (x - a) / (b / 2 * np.sqrt(2))
+            gauss = np.exp(-(z**2)) / np.sqrt(np.pi)
+            jacobian = np.stack([(1 + special.erf(z)) / 2, -height * gauss * np.sqrt(2) / b, -height * gauss * z / b], axis=2)
+            residuals = np.where(valid, y - modified_erf(x, height, a, b), 0)
+        return residuals, jacobian * valid[..., None]
+
+    residuals, jacobian = residuals_jacobian(params)
+    cost = (residuals**2).sum(axis=1)
+    eye = np.eye(3)
+    for _ in range(max_iter):
+        active = ~converged & ~stalled & np.isfinite(cost)
+        if not active.any():
+            break
+        jtj = np.einsum("cnk,cnl->ckl", jacobian[active], jacobian[active])
+        jtr = np.einsum("cnk,cn->ck", jacobian[active], residuals[active])
+        damped = jtj + damping[active, None, None] * jtj * eye
+        with np.errstate(invalid="ignore"):
+            solvable = np.isfinite(damped).all(axis=(1, 2)) & (np.abs(np.linalg.det(np.where(np.isfinite(damped), damped, 0))) > 0)
+        step = np.zeros((active.sum(), 3))
+        step[solvable] = np.linalg.solve(damped[solvable], jtr[solvable][..., None])[..., 0]
+
+        trial = params.copy()
+        trial[active] += step
+        trial_residuals, trial_jacobian = residuals_jacobian(trial)
+        trial_cost = (trial_residuals**2).sum(axis=1)
+
+        idx = np.flatnonzero(active)
+        better = solvable & (trial_cost[idx] <= cost[idx])
+        improved = idx[better]
+        converged[improved] = (cost[improved] - trial_cost[improved]) <= tol * cost[improved]
+        stalled[idx[~solvable]] = True
+        params[improved] = trial[improved]
+        residuals[improved], jacobian[improved] = trial_residuals[improved], trial_jacobian[improved]
+        cost[improved] = trial_cost[improved]
+        damping[improved] /= 3
+        damping[idx[~better]] *= 2
+        stalled[idx[~better & (damping[idx] > 1e10)]] = True  # No step decreases the residuals any more
+
+    # Covariance as in curve_fit: inverse of J^T J scaled by the reduced chi square
+    n_points = valid.sum(axis=1)
+    jtj = np.einsum("cnk,cnl->ckl", jacobian, jacobian)
+    std = np.full_like(params, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        finite = np.isfinite(jtj).all(axis=(1, 2)) & (n_points > 3)
+        finite[finite] &= np.linalg.det(jtj[finite]) != 0
+        covariance = np.linalg.inv(jtj[finite]) * (cost[finite] / (n_points[finite] - 3))[:, None, None]
+        std[finite] = np.sqrt(np.diagonal(covariance, axis1=1, axis2=2))
+    std[~(std[:, 1] > 0) | ~np.isfinite(std).all(axis=1)] = np.nan  # e.g. flat curves, fitted exactly by a step far from the data
+
+    # Degenerate fits: a width below one DAC step (step-shaped curves) or an ill-conditioned J^T J. The finite-difference Jacobian of
+    # curve_fit vanishes there and its covariance can't be estimated, while the analytic one is tiny but not zero: leave them to curve_fit
+    with np.errstate(invalid="ignore"):
+        dac_step = np.nanmin(np.where(np.diff(np.where(valid, x, np.nan), axis=1) > 0, np.diff(x, axis=1), np.nan), axis=1, initial=np.inf)
+        degenerate = ~(np.abs(params[:, 2]) >= dac_step)
+        degenerate[finite] |= np.linalg.cond(jtj[finite]) > 1 / np.finfo(float).eps
+
+    # Fallback: refit the curves that did not converge, or are degenerate, with curve_fit as Claro.fit_erf() does
+    for c in np.flatnonzero(~converged | degenerate):
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", message="Covariance of the parameters could not be estimated")
+            warnings.filterwarnings("ignore", message="invalid value encountered in sqrt")
+            try:
+                params[c], covar = optimize.curve_fit(modified_erf, x[c, valid[c]], y[c, valid[c]], guess[c], maxfev=10000)
+            except (RuntimeError, ValueError, TypeError):  # No convergence within maxfev or fewer points than parameters
+                std[c] = np.nan
+                continue
+            std[c] = np.sqrt(np.diag(covar))
+        if np.isinf(std[c, 1]) or np.isnan(std[c, 1]):
+            std[c] = np.nan
+    return params, std
+
+
+def offset_slopes(fits):
+    """
+    Per-chip derived quantities: the linear fit of the erf transition point versus the offset of every channel of every chip.
+
+    Args:
+    ----------
+        fits (pandas.DataFrame): the fit results, with the Station, Chip, Channel, Offset and erf_t_point columns.
+
+    Returns:
+    ----------
+        slopes (pandas.DataFrame): One row per Station, Chip and Channel with n_offsets, the slope and intercept of the transition point vs offset,
+            NaN with fewer than 2 offsets.
+    """
+    data = pd.DataFrame(
+        {
+            "Station": fits["Station"].astype(str),
+            "Chip": fits["Chip"].astype(str),
+            "Channel": fits["Channel"].astype(str),
+            "x": pd.to_numeric(fits["Offset"], errors="coerce"),
+            "y": fits["erf_t_point"].to_numpy(dtype=float),
+        }
+    ).dropna()
+    data["xx"] = data["x"] ** 2
+    data["xy"] = data["x"] * data["y"]
+    sums = data.groupby(["Station", "Chip", "Channel"], sort=True).agg(
+        n_offsets=("x", "size"), x=("x", "sum"), y=("y", "sum"), xx=("xx", "sum"), xy=("xy", "sum")
+    ).reset_index()
+
+    n = sums["n_offsets"].to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (n * sums["xy"] - sums["x"] * sums["y"]) / (n * sums["xx"] - sums["x"] ** 2)
+        intercept = (sums["y"] - slope * sums["x"]) / n
+    slopes = sums[["Station", "Chip", "Channel", "n_offsets"]].copy()
+    slopes["t_point_offset_slope"] = np.where(n > 1, slope, np.nan)
+    slopes["t_point_offset_intercept"] = np.where(n > 1, intercept, np.nan)
+    return slopes
+
+
+def stratified_estimate(values, strata, sizes, ci=0.95):
+    """
+    Stratified estimate of the mean of a quantity over a population, from a random sample drawn within each stratum.
+    Only part of each stratum is eligible (e.g. the T_point exists only for the good, fitted files), so the stratum means are weighted
+    by the estimated eligible sizes M_h = N_h e_h / m_h (ratio estimator: e_h eligible values out of m_h sampled files) and the variance
+    includes the finite population correction of the same population: var = sum_h (M_h / M)^2 (1 - e_h / M_h) s_h^2 / e_h,
+    with the pooled sample variance in place of s_h^2 for the strata with a single value.
+    Strata without values are left out (and the weights renormalized).
+
+    Args:
+    ----------
+        values (numpy.ndarray): the sampled values, NaN for the values not eligible (e.g. the T_point of the bad files).
+        strata (numpy.ndarray): the stratum index of each value.
+        sizes (numpy.ndarray): the population size of each stratum.
+        ci (float, optional): the confidence level of the (normal) interval. Defaults to 0.95.
+
+    Returns:
+    ----------
+        (estimate, ci_low, ci_high): the estimated mean and its confidence interval, NaN without values.
+    """
+    keep = np.isfinite(values)
+    drawn = np.bincount(strata, minlength=len(sizes)).astype(float)
+    values, strata = values[keep], strata[keep]
+    if len(values) == 0:
+        return np.nan, np.nan, np.nan
+
+    n = np.bincount(strata, minlength=len(sizes)).astype(float)
+    sums = np.bincount(strata, weights=values, minlength=len(sizes))
+    sampled = n > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / n
+        var = np.bincount(strata, weights=(values - means[strata]) ** 2, minlength=len(sizes)) / (n - 1)
+    pooled = np.var(values, ddof=1) if len(values) > 1 else 0.0
+    var = np.where(n > 1, var, pooled)
+
+    eligible = np.where(sampled, sizes * n / np.where(sampled, drawn, 1), 0)
+    weights = eligible / eligible.sum()
+    estimate = (weights[sampled] * means[sampled]).sum()
+    variance = (weights[sampled] ** 2 * np.clip(1 - n[sampled] / eligible[sampled], 0, None) * var[sampled] / n[sampled]).sum()
+    half = stats.norm.ppf(0.5 + ci / 2) * np.sqrt(variance)
+    return estimate, estimate - half, estimate + half
+
+
+def quicklook_hist(sample, n_sampled, n_files, plotname):
+    """
+    Saves the preliminary histograms of the quick look: the transition points and the erf discrepancies of the sampled files.
+
+    Args:
+    ----------
+        sample (pandas.DataFrame): the sampled files, with the T_point and Discrepancy columns.
+        n_sampled (int): the number of sampled files.
+        n_files (int): the number of files of the lot.
+        plotname (str): the path of the .png file.
+
+    Returns:
+    ----------
+        None
+    """
+    fig, axs = plt.subplots(2)
+    fig.suptitle(f"Quick look: {n_sampled} of {n_files} files")
+    [ax.grid("on") for ax in axs]
+    axs[0].hist(sample["T_point"].dropna(), bins=50, color="darkturquoise")
+    axs[1].hist(sample["Discrepancy"].dropna(), bins=50, color="darkblue")
+    axs[0].set_title("Read T. point")
+    axs[1].set_title("Discrepancy")
+    plt.tight_layout()
+    plt.savefig(plotname, bbox_inches="tight")
+    plt.close(fig)
+
+
+def pack_keys(table):
+    """
+    Packs the Station, Chip, Channel and Offset of each row into a single int64 key (16 bits each), so that the results can be sorted and joined
+    as integers instead of strings. A missing Offset column (results of MultiAnalyzer.analyzer) counts as offset 0 and non-numeric or out of range values
+    (e.g. the "?" station) as 0xFFFF, so that different such values share the key (see the collapsed rows of LotComparison).
+
+    Args:
+    ----------
+        table (pandas.DataFrame): the results, with the Station, Chip, Channel and (optionally) Offset columns.
+
+    Returns:
+    ----------
+        keys (numpy.ndarray): the int64 key of each row.
+    """
+    keys = np.zeros(len(table), dtype=np.int64)
+    for column in LotComparison.KEYS:
+        values = pd.to_numeric(table[column], errors="coerce") if column in table else pd.Series(np.zeros(len(table)))
+        values = np.where(values.between(0, 0xFFFE), values.fillna(0xFFFF), 0xFFFF).astype(np.int64)
+        keys = (keys << 16) | values
+    return keys
+
+
 def modified_erf(x, height, a, b):
     """
     Calculate the modified error function with specified parameters.
@@ -10,6 +10,22 @@ generates histograms of the fit parameters, and stores the information in a summ
 Usage: 
 ----------
     $ python .\claro_main.py <input_file/input_directory>
+    $ python .\claro_main.py <command> <input_file/input_directory>
+    $ python .\claro_main.py compare <baseline_results.csv> <results.csv> [<results.csv> ...]
+
+Commands:
+----------
+    (none): the whole analysis described above.
+    discover: list the Claro files to read (claro_allfiles.txt), without reading them.
+    fit: fit the data and save the results (and the summary tables), without plots.
+    plot: plot a single file, or the summary heatmaps from the saved results (after "fit").
+    histogram: plot the histograms from the saved results (after "fit").
+    quicklook: fit a stratified random sample of the files of each chip and estimate the lot transition point, erf discrepancy and bad/unfit fractions
+        with confidence intervals, refining them with more files until Ctrl+C or until all the files are fitted.
+    compare: compare claro_processed_chips.csv files with the first one, saving the per-channel drift of the transition point and width,
+        its per-chip summary, the outlier channels and the overlay histograms.
+    pandas, scipy and matplotlib are imported only by the commands that use them, and the plots are rendered headless (Agg backend)
+    unless MPLBACKEND is set (e.g. MPLBACKEND=TkAgg to show them).
 
 Inputs:
 ----------
@@ -23,6 +39,7 @@ Outputs:
         Plot of the data with the fits, saved in the working directory.
     (multiple file analysis)
         Summary dataframe, stored in the working directory.
+        Slopes of the transition point versus the offset of every channel of every chip, stored in the working directory.
         Histograms of the fit parameters, saved in the working directory.
 
 Dependencies:
@@ -55,32 +72,60 @@ def isSingle(path):
     return fnmatch.fnmatch(path, singlename)
 
 
+# Subcommands, each loading only the modules it needs (pandas, scipy and matplotlib are imported by claro_class on first use)
+COMMANDS = ["discover", "fit", "plot", "histogram", "quicklook"]
+
+# Lot comparison: two or more claro_processed_chips.csv files, the first one is the baseline
+if len(sys.argv) >= 4 and sys.argv[1] == "compare":
+    print(f"Comparing {len(sys.argv) - 3} result sets with {sys.argv[2]}...\n")
+    comparison = cl.LotComparison(sys.argv[2:])  # default arguments: (labels=None)
+    comparison.compare()  # default arguments: (savepath=os.getcwd(), z_cut=3.5, min_spread=1e-3, saveplot=True)
+    sys.exit(0)
+
 # check if path has been given
-if len(sys.argv) != 2:
-    print("\nUsage: insert a valid directory or filename\n")
+if len(sys.argv) == 3 and sys.argv[1] in COMMANDS:
+    command, path = sys.argv[1], sys.argv[2]
+elif len(sys.argv) == 2:
+    command, path = "analyze", sys.argv[1]
+else:
+    print(f"\nUsage: insert a valid directory or filename, optionally after a command ({', '.join(COMMANDS)})\n")
     sys.exit(1)
 
-path = sys.argv[1]
 
-
-# Apply class method based on the input file
+# Single Claro file
 if isSingle(path):
+    if command == "discover":
+        print(f"{path} is a single Claro file")
+        sys.exit(0)
+
     print(f"Provided a single Claro file, analyzing...\n")
     single = cl.Claro(path)
     single.fit_erf()    # default arguments: (fit_guess = None)
-    single.print_data() 
-    single.plotter()  # default arguments: (scatter=True, show_lin=True, show_erf=True, saveplot=False)
+    if command in ["analyze", "fit"]:
+        single.print_data()
+    if command in ["analyze", "plot"]:
+        single.plotter(saveplot=True)  # default arguments: (scatter=True, show_lin=True, show_erf=True, saveplot=False), saved since the plots are rendered headless
     sys.exit(0)  # the program ends here if given a single file
 
+
+multi = cl.MultiAnalyzer(path)
+if command in ["plot", "histogram"]:
+    print(f"Reading the saved results...\n")
+    multi.load_processed()  # default arguments: (savepath=os.getcwd())
 elif os.path.isdir(path):
     print(f"Provided a directory, analyzing...\n")
-    multi = cl.MultiAnalyzer(path)
     multi.dir_walker_texas_ranger()
-
 else:
     print(f"provided a list of directories, analyzing...\n")
-    multi = cl.MultiAnalyzer(path)
-    multi.list_reader()
-
-multi.analyzer()  # default arguments: (discard_unfit=True, savepath=os.getcwd() ,erf_guess=None)
-multi.histograms()  # default arguments: (saveplot=True)
+    print(f"found {len(multi.list_reader())} files to read...")
+
+if command == "quicklook":
+    multi.quick_look(rounds=None)  # default arguments: (per_chip=2, rounds=1, savepath=os.getcwd(), ci=0.95, seed=0, erf_guess=None, saveplot=True), refines until Ctrl+C or the full run
+    sys.exit(0)
+
+if command in ["analyze", "fit"]:
+    multi.chip_analyzer()  # default arguments: (discard_unfit=True, savepath=os.getcwd() ,erf_guess=None, workers=1), fits the files one chip at a time
+if command in ["analyze", "histogram"]:
+    multi.histograms()  # default arguments: (saveplot=True)
+if command in ["analyze", "fit", "plot"]:
+    multi.summary(saveplot=command != "fit")  # default arguments: (savepath=os.getcwd(), heatmap="T_point_std", saveplot=True)
@@ -0,0 +1,408 @@
+import SiPM_class as sipm
+import sys
+import os
+import time
+import json
+import platform
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+import scipy
+import matplotlib
+from scipy import special
+
+
+"""
+This program benchmarks the SiPM analysis.
+
+Peak mode benchmark: for every reverse ARDU file found in the given path, the breakdown voltage is evaluated with both peak modes of sipm.rev_engine:
+- "gauss": gaussian curve_fit around the polynomial peak (the default analysis);
+- "analytic": roots of the polynomial derivative and curvature at the peak.
+The run times of the two modes and the agreement of their V_bd are printed on terminal and saved as a .csv file.
+
+Benchmark suite: synthetic ARDU files are generated with known R_q and V_bd (see synthetic_curves) for any number of SiPMs, steps and boards.
+The reading, forward and reverse fits, .csv writing, PDF rendering, histograms and the whole DirReader.dir_analyzer are timed separately,
+and the recovered R_q and V_bd are checked against the injected values. The report is saved as .json, to be compared run over run.
+
+Autostart benchmark: the forward starts found by sipm.fwd_autostart on synthetic curves (see synthetic_curves) are compared with the fixed starts
+of the analysis (1.55 V in LN2, 0.75 V at room temperature): mean start and bias and error of the recovered R_q against the injected values.
+
+Import time benchmark: the start-up times of SiPM_class, claro_class and of the "discover" command of both main programs are measured in fresh interpreters,
+together with the heavy modules (pandas, scipy, matplotlib) each of them loads, and compared with importing those modules up front.
+
+Usage:
+----------
+    $ python .\SiPM_benchmark.py <input_file/input_directory>
+    $ python .\SiPM_benchmark.py suite [n_sipm] [n_steps] [n_boards] [output]
+    $ python .\SiPM_benchmark.py autostart [output]
+    $ python .\SiPM_benchmark.py imports [output]
+
+Inputs:
+----------
+    input_file/input_directory: str
+        Path to a single ARDU file or a directory containing ARDU files.
+    n_sipm, n_steps, n_boards: int, optional
+        Size of the synthetic datasets: SiPMs per board, steps per sweep and boards per dataset. Default: 30, 200, 2.
+    output: str, optional
+        Path of the report. Default: "sipm_benchmark.json" (suite), "autostart_benchmark.csv" (autostart), "sipm_import_times.json" (imports).
+
+Outputs:
+----------
+    "peak_mode_benchmark.csv" in the working directory, with one row for each reverse file.
+    (suite) the .json report, with the configuration, the environment, the timings of each stage and the accuracy of the results.
+    (autostart) the .csv report, with one row for each temperature, number of steps and start (fixed or auto).
+    (imports) the .json report, with the best start-up time and the loaded heavy modules of each command.
+
+Dependencies:
+----------
+    SiPM_class.py
+    sys
+    os
+    time
+    json
+    platform
+    tempfile
+    subprocess
+"""
+
+
+def best_time(func, repeat):
+    """
+    Run func repeat times and return the fastest run time together with the last result.
+
+    Args:
+    ----------
+        func (callable): function without arguments to time.
+        repeat (int): number of runs.
+
+    Returns:
+    ----------
+        (float, object): the best run time in seconds and the result of func.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def peak_mode_benchmark(files, peak_width=10, repeat=3):
+    """
+    Compare speed and agreement of the "gauss" and "analytic" peak modes on the given reverse ARDU files.
+
+    Args:
+    ----------
+        files (list): paths of the ARDU files, forward files are skipped.
+        peak_width (int, optional): The width of the reverse analysis peak. Defaults to 10.
+        repeat (int, optional): number of timed runs of each mode, the fastest is kept. Defaults to 3.
+
+    Returns:
+    ----------
+        bench (pandas.DataFrame): one row per file with the number of SiPMs, the run time of each mode, the speedup
+            and the max/median absolute difference of V_bd and V_bd_std between the two modes.
+    """
+    rows = []
+    for file in files:
+        single = sipm.Single(file)
+        single.reader()
+        if single.fileinfo["direction"] == "f":
+            continue
+
+        t_gauss, gauss = best_time(lambda: sipm.rev_engine(single.df_sorted, peak_width, "gauss", single.cache), repeat)
+        t_analytic, analytic = best_time(lambda: sipm.rev_engine(single.df_sorted, peak_width, "analytic", single.cache), repeat)
+        diff = (gauss["V_bd"] - analytic["V_bd"]).abs()
+        diff_std = (gauss["V_bd_std"].abs() - analytic["V_bd_std"]).abs()
+        rows.append(
+            {
+                "file": os.path.basename(file),
+                "n_sipm": len(gauss),
+                "t_gauss": t_gauss,
+                "t_analytic": t_analytic,
+                "speedup": t_gauss / t_analytic,
+                "V_bd_max_diff": diff.max(),
+                "V_bd_median_diff": diff.median(),
+                "V_bd_std_max_diff": diff_std.max(),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def synthetic_curves(direction, temp, n_sipm, n_steps, rng, noise=0.005):
+    """
+    Generate realistic IV curves with known R_q or V_bd.
+    - Forward: diode knee (at 0.5 V at room temperature, 1.2 V in LN2) followed by a linear tail of slope 1000 / R_q, with R_q in 350-450.
+    - Reverse: exponential breakdown, where d(ln I)/dV is a gaussian of mean V_bd (in 41-43 V) and sigma 0.5 V,
+      so that V_bd is the quantity the reverse analysis looks for.
+    A relative gaussian noise is added to the currents.
+
+    Args:
+    ----------
+        direction (str): "f" or "r".
+        temp (str): "LN2" or "roomT".
+        n_sipm (int): number of SiPMs.
+        n_steps (int): number of steps of each sweep.
+        rng (numpy.random.Generator): the random generator.
+        noise (float, optional): relative noise of the currents. Defaults to 0.005.
+
+    Returns:
+    ----------
+        (V, I, truth): the (step) voltages, the (SiPM x step) currents and the injected R_q or V_bd of each SiPM.
+    """
+    if direction == "f":
+        V = np.linspace(0, 2.5, n_steps)
+        truth = rng.uniform(350, 450, n_sipm)
+        knee = 1.2 if temp == "LN2" else 0.5
+        I = 1000 / truth[:, None] * 0.05 * np.logaddexp(0, (V - knee) / 0.05)
+    else:
+        V = np.linspace(34, 50, n_steps)
+        truth = rng.uniform(41, 43, n_sipm)
+        sigma, gain = 0.5, 8  # the current grows by exp(gain) across the breakdown
+        I = 1e-3 * np.exp(gain / 2 * (1 + special.erf((V - truth[:, None]) / (sigma * np.sqrt(2)))))
+    I = I * (1 + rng.normal(0, noise, I.shape))
+    return V, I, truth
+
+
+def synthetic_dataset(root, n_sipm=30, n_steps=200, n_boards=2, seed=0, noise=0.005):
+    """
+    Write two synthetic datasets (LN2 and room temperature) in root, each with a forward (test 272) and a reverse (test 273) ARDU file per board.
+    The rows of each file are shuffled and the SiPM numbers written as floats, as in the files produced by the boards.
+
+    Args:
+    ----------
+        root (str): the folder of the datasets.
+        n_sipm (int, optional): SiPMs per board. Defaults to 30.
+        n_steps (int, optional): steps per sweep. Defaults to 200.
+        n_boards (int, optional): boards per dataset. Defaults to 2.
+        seed (int, optional): seed of the random generator. Defaults to 0.
+        noise (float, optional): relative noise of the currents. Defaults to 0.005.
+
+    Returns:
+    ----------
+        truth (pandas.DataFrame): the injected values, with columns dataset, ardu, test, temp, direction, SiPM and truth.
+    """
+    rng = np.random.default_rng(seed)
+    tables = []
+    for dataset, temp in [("SYN_LN2_08_06_2022", "LN2"), ("SYN_roomT_22_04_2022", "roomT")]:
+        os.makedirs(os.path.join(root, dataset), exist_ok=True)
+        for ardu in range(n_boards):
+            for test, direction in [("272", "f"), ("273", "r")]:
+                V, I, truth = synthetic_curves(direction, temp, n_sipm, n_steps, rng, noise)
+                data = pd.DataFrame(
+                    {
+                        "SiPM": np.repeat(np.arange(n_sipm), n_steps).astype(float),
+                        "Step": np.tile(np.arange(n_steps), n_sipm),
+                        "V": np.tile(V, n_sipm),
+                        "I": I.ravel(),
+                        "I_err": 0.01 * np.abs(I.ravel()) + 1e-7,
+                    }
+                )
+                path = os.path.join(root, dataset, f"ARDU_{ardu}_Test_{test}_{direction}_{temp}_dataframe.csv")
+                data.sample(frac=1, random_state=rng.integers(2**31)).to_csv(path, index=False)
+                tables.append(pd.DataFrame({"dataset": dataset, "ardu": str(ardu), "test": test, "temp": temp, "direction": direction,
+                                            "SiPM": np.arange(n_sipm), "truth": truth}))
+    return pd.concat(tables, ignore_index=True)
+
+
+def benchmark_suite(n_sipm=30, n_steps=200, n_boards=2, repeat=3, peak_mode="gauss", seed=0):
+    """
+    Time each stage of the analysis on synthetic datasets and check the results against the injected values.
+    Each stage is timed repeat times on every file and the fastest runs are summed; PDF rendering, histograms and dir_analyzer are run once.
+
+    Args:
+    ----------
+        n_sipm, n_steps, n_boards (int, optional): size of the synthetic datasets, see synthetic_dataset(). Defaults to 30, 200, 2.
+        repeat (int, optional): number of timed runs of the fast stages. Defaults to 3.
+        peak_mode (str, optional): peak mode of the reverse analysis. Defaults to "gauss".
+        seed (int, optional): seed of the synthetic data. Defaults to 0.
+
+    Returns:
+    ----------
+        report (dict): config, environment, timings (seconds per stage) and accuracy (errors of R_q and V_bd).
+    """
+    timings = dict.fromkeys(["read", "fit_forward", "fit_reverse", "csv_write", "pdf_render", "histograms", "dir_analyzer"], 0.0)
+    with tempfile.TemporaryDirectory() as root:
+        data_dir = os.path.join(root, "data")
+        truth = synthetic_dataset(data_dir, n_sipm, n_steps, n_boards, seed)
+        directory = sipm.DirReader(data_dir)
+        files = directory.dir_walker()
+
+        tables = []
+        for file in files:
+            single = sipm.Single(file)
+            t_read, _ = best_time(lambda: single.reader(cache=False), repeat)
+            timings["read"] += t_read
+            direction = single.fileinfo["direction"]
+            if direction == "f":
+                start = 1.55 if single.fileinfo["temp"] == "LN2" else 0.75
+                t_fit, results = best_time(lambda: sipm.fwd_engine(single.df_sorted, start), repeat)
+                timings["fit_forward"] += t_fit
+            else:
+                t_fit, results = best_time(lambda: sipm.rev_engine(single.df_sorted, 10, peak_mode), repeat)
+                timings["fit_reverse"] += t_fit
+                single.peak_mode = peak_mode
+            single.results = results
+
+            savepath = sipm.results_savepath(file, os.path.join(root, "single"))
+            os.makedirs(savepath, exist_ok=True)
+            res_path = os.path.join(savepath, f"{single.output_name()}_results.csv")
+            t_csv, _ = best_time(lambda: sipm.results_table(results, direction, peak_mode).to_csv(res_path, index=False), repeat)
+            timings["csv_write"] += t_csv
+            t_pdf, _ = best_time(lambda: single.plotter(savepath, "pdf"), 1)
+            timings["pdf_render"] += t_pdf
+            tables.append(single.tagged_results(sipm.dataset_name(file)))
+
+        results = sipm.split_directions(pd.concat(tables, ignore_index=True))
+        timings["histograms"], _ = best_time(lambda: directory.histograms(results=results, root_savepath=os.path.join(root, "single")), 1)
+        timings["dir_analyzer"], _ = best_time(
+            lambda: directory.dir_analyzer(root_savepath=os.path.join(root, "full"), incremental=False, peak_mode=peak_mode), 1)
+
+    accuracy = {}
+    for direction, quantity in [("forward", "R_quenching"), ("reverse", "V_bd")]:
+        merged = results[direction].merge(truth, on=sipm.ResultsStore.KEYS + ["SiPM"])
+        error = merged[quantity] - merged["truth"]
+        if quantity == "R_quenching":
+            error = error / merged["truth"]  # relative error
+        accuracy[quantity] = {
+            "n": int(len(merged)),
+            "median_error": float(error.median()),
+            "max_abs_error": float(error.abs().max()),
+            "missing": int(merged[quantity].isna().sum()),
+        }
+    accuracy["R_quenching"]["passed"] = accuracy["R_quenching"]["max_abs_error"] < 0.01 and accuracy["R_quenching"]["missing"] == 0
+    accuracy["V_bd"]["passed"] = abs(accuracy["V_bd"]["median_error"]) < 0.1 and accuracy["V_bd"]["missing"] == 0
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"n_sipm": n_sipm, "n_steps": n_steps, "n_boards": n_boards, "repeat": repeat, "peak_mode": peak_mode, "seed": seed},
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "scipy": scipy.__version__,
+            "matplotlib": matplotlib.__version__,
+            "code_version": sipm.code_version(),
+        },
+        "timings": timings,
+        "accuracy": accuracy,
+    }
+
+
+def autostart_benchmark(n_sipm=200, steps=(100, 200, 400), seed=0, noise=0.005):
+    """
+    Check sipm.fwd_autostart against the ground truth of synthetic forward curves, compared with the fixed starts of the analysis.
+
+    Args:
+    ----------
+        n_sipm (int, optional): SiPMs of each set of curves. Defaults to 200.
+        steps (tuple, optional): the numbers of steps per sweep to test. Defaults to (100, 200, 400).
+        seed (int, optional): seed of the random generator. Defaults to 0.
+        noise (float, optional): relative noise of the currents. Defaults to 0.005.
+
+    Returns:
+    ----------
+        bench (pandas.DataFrame): one row per temperature, number of steps and start ("fixed" or "auto"), with the mean start,
+            and the mean relative bias and the mean absolute relative error of R_q (in %).
+    """
+    rows = []
+    for temp, fixed in (("LN2", 1.55), ("roomT", 0.75)):
+        for n_steps in steps:
+            V, I, truth = synthetic_curves("f", temp, n_sipm, n_steps, np.random.default_rng(seed), noise)
+            x = np.tile(V, (n_sipm, 1))
+            for start, starts in (("fixed", np.full(n_sipm, fixed)), ("auto", sipm.fwd_autostart(x, I))):
+                error = (sipm.fwd_fit(x, I, [starts])[0][0] - truth) / truth * 100
+                rows.append(
+                    {
+                        "temp": temp,
+                        "n_steps": n_steps,
+                        "start": start,
+                        "mean_start": np.nanmean(starts),
+                        "R_q_bias_%": np.nanmean(error),
+                        "R_q_error_%": np.nanmean(np.abs(error)),
+                    }
+                )
+    return pd.DataFrame(rows)
+
+
+def import_times(repeat=5):
+    """
+    Measure the start-up time of the analysis modules and of the "discover" commands, each in a fresh interpreter, and the heavy modules they load.
+    The up-front import of pandas, scipy and matplotlib (what the modules did before the lazy imports) is measured as a reference.
+
+    Args:
+    ----------
+        repeat (int, optional): number of runs of each command, the fastest is kept. Defaults to 5.
+
+    Returns:
+    ----------
+        report (dict): for each command, the best time in seconds and the heavy modules loaded.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    claro = os.path.join(os.path.dirname(here), "Claro")
+    heavy = "; import sys; print('heavy_modules:' + ','.join(m for m in ['pandas', 'scipy', 'matplotlib'] if m in sys.modules))"
+    run_main = "import os, sys, runpy; sys.argv = sys.argv[1:]; sys.path.insert(0, os.path.dirname(sys.argv[0])); runpy.run_path(sys.argv[0], run_name='__main__')"
+
+    with tempfile.TemporaryDirectory() as root:
+        synthetic_dataset(root, n_sipm=2, n_steps=10, n_boards=1)
+        commands = {
+            "eager_imports": ["-c", "import pandas, scipy.optimize, scipy.stats, scipy.signal, matplotlib.pyplot" + heavy],
+            "SiPM_class": ["-c", f"import sys; sys.path.insert(0, {here!r}); import SiPM_class" + heavy],
+            "claro_class": ["-c", f"import sys; sys.path.insert(0, {claro!r}); import claro_class" + heavy],
+            "SiPM_main discover": ["-c", run_main + heavy, os.path.join(here, "SiPM_main.py"), "discover", root],
+            "claro_main discover": ["-c", run_main + heavy, os.path.join(claro, "claro_main.py"), "discover", root],
+        }
+
+        report = {}
+        for name, args in commands.items():
+            run = lambda: subprocess.run([sys.executable, *args], cwd=root, capture_output=True, text=True, check=True)
+            seconds, result = best_time(run, repeat)
+            modules = result.stdout.splitlines()[-1].split(":", 1)[1]
+            report[name] = {"seconds": seconds, "heavy_modules": [module for module in modules.split(",") if module]}
+            print(f"{name}: {seconds:.3f} s, heavy modules: {modules or 'none'}")
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "suite":
+        args = sys.argv[2:]
+        n_sipm, n_steps, n_boards = [int(arg) for arg in args[:3]] + [30, 200, 2][len(args[:3]):]
+        output = args[3] if len(args) > 3 else "sipm_benchmark.json"
+        report = benchmark_suite(n_sipm, n_steps, n_boards)  # Default arguments: (n_sipm=30, n_steps=200, n_boards=2, repeat=3, peak_mode="gauss", seed=0)
+        print(json.dumps(report, indent=2))
+        with open(output, "w") as file:
+            json.dump(report, file, indent=2)
+        sys.exit(0)
+
+    if len(sys.argv) >= 2 and sys.argv[1] == "autostart":
+        output = sys.argv[2] if len(sys.argv) > 2 else "autostart_benchmark.csv"
+        bench = autostart_benchmark()  # Default arguments: (n_sipm=200, steps=(100, 200, 400), seed=0, noise=0.005)
+        print(bench.to_string(index=False))
+        bench.to_csv(output, index=False)
+        sys.exit(0)
+
+    if len(sys.argv) >= 2 and sys.argv[1] == "imports":
+        output = sys.argv[2] if len(sys.argv) > 2 else "sipm_import_times.json"
+        report = import_times()  # Default arguments: (repeat=5)
+        with open(output, "w") as file:
+            json.dump(report, file, indent=2)
+        sys.exit(0)
+
+    if len(sys.argv) != 2:
+        print("\nUsage: insert a valid path to a .csv file or directory, \"suite\" for the synthetic benchmark suite, \"autostart\" for the forward start benchmark"
+              + " or \"imports\" for the import time benchmark\n")
+        sys.exit(1)
+
+    path = sys.argv[1]
+    if os.path.isdir(path):
+        directory = sipm.DirReader(path)
+        files = directory.dir_walker()
+    else:
+        files = [path]
+
+    bench = peak_mode_benchmark(files)  # Default arguments: (peak_width=10, repeat=3)
+    print(bench.to_string(index=False))
+    print(f"\nTotal speedup: {bench['t_gauss'].sum() / bench['t_analytic'].sum():.1f}x, "
+          + f"max V_bd difference: {bench['V_bd_max_diff'].max():.4f} V")
+    bench.to_csv("peak_mode_benchmark.csv", index=False)
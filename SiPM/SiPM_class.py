@@ -1,14 +1,86 @@
-import pandas as pd
 import fnmatch
 import os
-import sys
 import re
+import importlib
 import numpy as np
 from numpy.polynomial import Polynomial
-import matplotlib.pyplot as plt
-import matplotlib
-from matplotlib.backends.backend_pdf import PdfPages
-from scipy import stats, signal, optimize
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import sqlite3
+import json
+import hashlib
+import inspect
+import sys
+import time
+import socket
+import tempfile
+import contextlib
+import warnings
+import threading
+import queue
+
+try:
+    import resource  # peak memory of the profiles, not available on Windows
+except ImportError:
+    resource = None
+
+
+class LazyModule:
+    """
+    A module imported on first use, so that the command line tools only load pandas, scipy and matplotlib when they need them
+    (e.g. listing the ARDU files needs none of them).
+
+    Parameters:
+    ----------
+        name (str): the name of the module.
+        setup (callable, optional): called once before importing the module. Defaults to None.
+    """
+
+    def __init__(self, name, setup=None):
+        """
+        Initialize the LazyModule without importing the module.
+        """
+        self._name = name
+        self._setup = setup
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            if self._setup is not None:
+                self._setup()
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def headless_backend():
+    """
+    Use the non-interactive Agg backend (the plots are only saved to file), unless a backend is set by MPLBACKEND or pyplot is already in use.
+    """
+    if "MPLBACKEND" not in os.environ and "matplotlib.pyplot" not in sys.modules:
+        importlib.import_module("matplotlib").use("Agg")
+
+
+pd = LazyModule("pandas")
+matplotlib = LazyModule("matplotlib")
+plt = LazyModule("matplotlib.pyplot", setup=headless_backend)
+backend_pdf = LazyModule("matplotlib.backends.backend_pdf", setup=headless_backend)
+backend_agg = LazyModule("matplotlib.backends.backend_agg")
+figure = LazyModule("matplotlib.figure")
+signal = LazyModule("scipy.signal")
+optimize = LazyModule("scipy.optimize")
+
+
+# Fixed-width columns of the reverse results: 5th-degree polynomial coefficients and gaussian parameters
+COEF_COLUMNS = [f"coef_{k}" for k in range(6)]
+GAUSS_COLUMNS = ["gauss_H", "gauss_A", "gauss_mu", "gauss_sigma"]
+
+# Column types of the ARDU files
+ARDU_DTYPES = {"SiPM": "int16", "Step": "int32", "V": "float64", "I": "float64", "I_err": "float64"}
+
+# Peak modes of the reverse analysis (see rev_analyzer)
+PEAK_MODES = ("gauss", "analytic")
+
+# Version of the binary cache format of the ARDU files (see write_cache), caches of other versions are ignored
+CACHE_VERSION = 1
 
 
 ###############################################################################
@@ -34,8 +106,14 @@ class Single:
     Methods:
     ----------
         get_fileinfo(): Extracts metadata about the file from the file path.
-        reader(): Reads the data from the csv file, sorts it, and groups it by SiPM.
+        reader(): Reads the data from the csv file (or its binary cache), sorts it, and groups it by SiPM.
+        to_cache(): Save the data as a memory-mappable binary cache next to the csv file.
         analyzer(): Analyze the SiPM data in either forward or reverse direction and save the results.
+        batch_analyzer(): Memory-bounded analysis of the file in batches of SiPMs, used by analyzer() when batch_rows is given.
+        plotter(): Render the plot pages of the SiPMs, from the analyzer() results or the saved results .csv file.
+        sweep(): Evaluate R_q or V_bd of all the SiPMs for a grid of analysis settings.
+        load_results(): Load the results of a previous analysis from the results .csv file.
+        tagged_results(): Return the main results together with the file metadata.
 
     """
 
@@ -52,6 +130,9 @@ class Single:
         self.path = path
         self.fileinfo = {}
         self.df_grouped = {}
+        self.df_sorted = None
+        self.cache = None
+        self.results = None
 
     def get_fileinfo(self):
         """
@@ -78,33 +159,46 @@ class Single:
         }
         return self.fileinfo
 
-    def reader(self):
+    def reader(self, engine="c", cache=True):
         """
         Reads the data from the csv file, sorts it, and groups it by SiPM.
+        If an up-to-date binary cache of the file exists (see to_cache), the data is memory-mapped from it instead of parsing the csv
+        and the (SiPM x step) arrays are kept in self.cache, so that the fits use them without copies (see sipm_matrix).
+
+        Args:
+        ----------
+            engine (str, optional): the pandas csv engine, "c" or "pyarrow" (if installed). Defaults to "c".
+            cache (bool, optional): If True, load the binary cache when available. Defaults to True.
 
         Returns:
             df_grouped (pandas.DataFrame): The sorted data, grouped by SiPM.
 
         """
-        path = self.path
-        self.get_fileinfo()
-
-        # Skip rows until header (useful if the file contains comments on top)
-        def header_finder(path):
-            with open(path, "r") as file:
-                for num, line in enumerate(file, 0):
-                    if "SiPM" in line:
-                        return num
-                    else:
-                        print("Error : header not found")
-                        sys.exit(1)
-
-        df = pd.read_csv(path, header=header_finder(path))
-        self.df_sorted = df.sort_values(by=["SiPM", "Step"], ignore_index=True)
+        with profile_stage("read"):
+            cached = load_cache(self.path) if cache else None
+            if cached is None:
+                self.get_fileinfo()
+                self.df_sorted = read_ardu(self.path, engine)
+                self.cache = None
+            else:
+                self.fileinfo, self.df_sorted, self.cache = cached
         self.df_grouped = self.df_sorted.groupby("SiPM")
         return self.df_grouped
 
-    def analyzer(self, room_f_start=0.75, ln2_f_start=1.55, peak_width=10, savepath=os.getcwd(), hide_progress=False):
+    def to_cache(self):
+        """
+        Save the data of the file as a binary cache next to it (see write_cache), reading the csv if reader() was not called.
+
+        Returns:
+        ----------
+            array_path (str): the path of the .npy cache.
+        """
+        if self.df_sorted is None:
+            self.reader(cache=False)
+        return write_cache(self.path, self.df_sorted, self.fileinfo)
+
+    def analyzer(self, room_f_start=0.75, ln2_f_start=1.55, peak_width=10, savepath=os.getcwd(), hide_progress=False, peak_mode="gauss",
+                 plots="pdf", plot_workers=1, batch_rows=None, bootstrap=0, ci=0.95, writer=None):
         """
         Analyze the SiPM data in either forward or reverse direction and save the results.
 
@@ -112,63 +206,279 @@ class Single:
         ----------
             room_f_start (float): The starting voltage for room temperature forward analysis. Default is 0.75.
             ln2_f_start (float): The starting voltage for LN2 temperature forward analysis. Default is 1.55.
+                Either can be "auto" to find the start of each SiPM from its data (see fwd_autostart), saved in the start column of the results.
             peak_width (int): The width of the reverse analysis peak. Default is 10.
             savepath (str): The path to save the results. Default is the current working directory.
             hide_progress (bool): If set to True, progress information will not be printed on terminal. Default is False.
+            peak_mode (str): How V_bd is evaluated from the polynomial peak: "gauss" (gaussian curve_fit) or "analytic" (roots of the polynomial derivative).
+                The mode is recorded in the V_bd_method column of the results, any other value raises a ValueError. Default is "gauss".
+            plots (str): "pdf", "png" or None for a results-only analysis (the plots can be rendered later with plotter()). Default is "pdf".
+            plot_workers (int): number of processes rendering the plot pages, see plotter(). Default is 1.
+            batch_rows (int): If given, the file is analyzed in batches of SiPMs of at most batch_rows rows by batch_analyzer(),
+                without calling reader() first and with bounded memory. Default is None.
+            bootstrap (int): The number of bootstrap resamples of the confidence intervals of R_q or V_bd (see bootstrap_engine), 0 to skip them.
+                The intervals are saved in the <quantity>_ci_low and <quantity>_ci_high columns of the results. Default is 0.
+            ci (float): The confidence level of the bootstrap intervals. Default is 0.95.
+            writer (WriteBehind): If given, the results .csv file and the plots are written by its background thread (the batch analysis writes them itself).
+                The data of this Single must not be modified until writer.flush(). Default is None.
 
         Returns:
         ----------
             None
         """
+        if peak_mode not in PEAK_MODES:
+            raise ValueError(f"peak_mode must be one of {PEAK_MODES}, got {peak_mode!r}")
+        if not self.fileinfo:
+            self.get_fileinfo()
         if self.fileinfo["temp"] == "LN2":
             start = ln2_f_start
         else:
             start = room_f_start
 
-        # Create the savepath folder if it doesn't exist
-        if not os.path.exists(savepath):
-            os.makedirs(savepath)
+        # Create the savepath folder if it doesn't exist (exist_ok: parallel workers may create it at the same time)
+        os.makedirs(savepath, exist_ok=True)
+
+        if batch_rows:
+            return self.batch_analyzer(batch_rows, start, peak_width, savepath, hide_progress, peak_mode, plots, bootstrap=bootstrap, ci=ci)
 
         # Forward analyzer
         if self.fileinfo["direction"] == "f":
-            results = self.df_grouped.apply(fwd_analyzer, start)
-            joined_df = self.df_sorted.join(results, on="SiPM")
+            with profile_stage("fit_forward"):
+                self.results = fwd_engine(self.df_sorted, start, self.cache)
 
-            out_df = joined_df[["SiPM", "R_quenching", "R_quenching_std"]].drop_duplicates(subset="SiPM")
-            res_fname = rf"Arduino{self.fileinfo['ardu']}_Test{self.fileinfo['test']}_Temp{self.fileinfo['temp']}_Forward_results.csv"
-            out_df.to_csv(os.path.join(savepath, res_fname), index=False)
+        # Reverse analyzer
+        else:
+            self.peak_mode = peak_mode
+            with profile_stage("fit_reverse"):
+                self.results = rev_engine(self.df_sorted, peak_width, peak_mode, self.cache)
+        if bootstrap:
+            with profile_stage("bootstrap"):
+                self.results = self.results.join(
+                    bootstrap_engine(
+                        self.df_sorted, self.fileinfo["direction"], self.results.get("start", start), peak_width, n_resamples=bootstrap, ci=ci, cache=self.cache
+                    )
+                )
+        out_df = results_table(self.results, self.fileinfo["direction"], peak_mode)
+
+        # The fit parameters are saved after the main results, so that the plots can be rendered later on from the .csv file
+        res_fname = f"{self.output_name()}_results.csv"
+        if writer is not None:
+            with profile_stage("write_queue"):
+                writer.submit(out_df.to_csv, os.path.join(savepath, res_fname), index=False, label=self.path)
+                if plots:
+                    writer.submit(self.plotter, savepath, plots, plot_workers, label=self.path)
             if hide_progress is False:
-                print(f"Results saved as {savepath}\{res_fname}")
+                print(f"Results and plots queued for writing in {savepath}")
+            return
 
+        with profile_stage("write_results"):
+            out_df.to_csv(os.path.join(savepath, res_fname), index=False)
+        if hide_progress is False:
+            print(f"Results saved as {savepath}\{res_fname}")
+
+        if plots:
             if hide_progress is False:
                 print("Plotting...")
-            pdf_name = f"Arduino{self.fileinfo['ardu']}_Test{self.fileinfo['test']}_Temp{self.fileinfo['temp']}_Forward.pdf"
-            pdf_fwd = PdfPages(os.path.join(savepath, pdf_name))
-            joined_df.groupby("SiPM").apply(fwd_plotter, pdf_fwd)
+            with profile_stage("render"):
+                plot_name = self.plotter(savepath, plots, plot_workers)
             if hide_progress is False:
-                print(f"Plot saved as {savepath}\{pdf_name}.")
-            pdf_fwd.close()
+                print(f"Plot saved as {savepath}\{plot_name}.")
 
-        # Reverse analyzer
+    def sweep(self, room_f_start=(0.75,), ln2_f_start=(1.55,), peak_width=(10,), peak_mode="gauss"):
+        """
+        Evaluate R_q (forward) or V_bd (reverse) of all the SiPMs for a grid of analysis settings, without saving results or plots.
+        The file is read once by reader() and each grid is evaluated in a vectorized pass (see fwd_sweep and rev_sweep).
+
+        Args:
+        ----------
+            room_f_start (list, optional): The starting voltages for room temperature forward analysis. Defaults to (0.75,).
+            ln2_f_start (list, optional): The starting voltages for LN2 temperature forward analysis. Defaults to (1.55,).
+            peak_width (list, optional): The widths of the reverse analysis peak. Defaults to (10,).
+            peak_mode (str, optional): "gauss" or "analytic", see analyzer(). Defaults to "gauss".
+
+        Returns:
+        ----------
+            sweep (pandas.DataFrame): tidy table with one row per setting and SiPM and columns
+                SiPM, parameter (the name of the swept analyzer argument), setting, quantity (R_quenching or V_bd), value and std.
+        """
+        if self.fileinfo["direction"] == "f":
+            parameter = "ln2_f_start" if self.fileinfo["temp"] == "LN2" else "room_f_start"
+            sweep = fwd_sweep(self.df_sorted, ln2_f_start if parameter == "ln2_f_start" else room_f_start, self.cache)
+            quantity = "R_quenching"
         else:
-            results = self.df_grouped.apply(rev_analyzer, peak_width)
-            joined_df = self.df_sorted.join(results, on="SiPM")
+            parameter = "peak_width"
+            sweep = rev_sweep(self.df_sorted, peak_width, peak_mode, self.cache)
+            quantity = "V_bd"
+        sweep.insert(1, "parameter", parameter)
+        sweep.insert(3, "quantity", quantity)
+        return sweep
+
+    def batch_analyzer(self, batch_rows, start, peak_width, savepath=os.getcwd(), hide_progress=False, peak_mode="gauss", plots="pdf", dpi=100,
+                       bootstrap=0, ci=0.95):
+        """
+        Memory-bounded version of analyzer() for files with many SiPMs: the file is read in batches of whole SiPMs (see read_ardu_batches)
+        and the results rows and plot pages of each batch are written out before reading the next one.
+        The outputs are the same of analyzer(); the results are not kept in memory (see load_results()) and the pages are rendered by a single process.
 
-            out_df = joined_df[["SiPM", "V_bd", "V_bd_std"]].drop_duplicates(subset="SiPM")
-            res_fname = rf"Arduino{self.fileinfo['ardu']}_Test{self.fileinfo['test']}_Temp{self.fileinfo['temp']}_Reverse_results.csv"
-            out_df.to_csv(os.path.join(savepath, res_fname), index=False)
-            if hide_progress is False:
-                print(f"Results saved as {savepath}\{res_fname}")
+        Args:
+        ----------
+            batch_rows (int): the maximum number of rows of a batch.
+            start (float or str): the starting voltage of the forward analysis, or "auto".
+            peak_width, savepath, hide_progress, peak_mode, plots: see analyzer().
+            dpi (int, optional): resolution of the PNG pages. Defaults to 100.
+            bootstrap, ci: see analyzer(), the resamples of each batch are seeded alike.
 
-            if hide_progress is False:
-                print("Plotting...")
-            pdf_name = f"Arduino{self.fileinfo['ardu']}_Test{self.fileinfo['test']}_Temp{self.fileinfo['temp']}_Reverse.pdf"
-            pdf_rev = PdfPages(os.path.join(savepath, pdf_name))
-            joined_df.groupby("SiPM").apply(rev_plotter, pdf_rev)
-            if hide_progress is False:
-                print(f"Plot saved as {savepath}\{pdf_name}.")
-            pdf_rev.close()
+        Returns:
+        ----------
+            None
+        """
+        direction = self.fileinfo["direction"]
+        if direction != "f":
+            self.peak_mode = peak_mode
+        res_fname = f"{self.output_name()}_results.csv"
+        plot_name = self.output_name() if plots == "png" else f"{self.output_name()}.pdf"
+        if plots == "png" and not os.path.exists(os.path.join(savepath, plot_name)):
+            os.makedirs(os.path.join(savepath, plot_name))
+
+        with open(os.path.join(savepath, res_fname), "w", newline="") as res_file:
+            pdf = backend_pdf.PdfPages(os.path.join(savepath, plot_name)) if plots and plots != "png" else None
+            try:
+                n_sipm = 0
+                for idx, (batch, cache) in enumerate(read_ardu_batches(self.path, batch_rows)):
+                    if direction == "f":
+                        with profile_stage("fit_forward"):
+                            results = fwd_engine(batch, start, cache)
+                    else:
+                        with profile_stage("fit_reverse"):
+                            results = rev_engine(batch, peak_width, peak_mode, cache)
+                    if bootstrap:
+                        with profile_stage("bootstrap"):
+                            results = results.join(
+                                bootstrap_engine(batch, direction, results.get("start", start), peak_width, n_resamples=bootstrap, ci=ci, cache=cache)
+                            )
+                    with profile_stage("write_results"):
+                        results_table(results, direction, peak_mode).to_csv(res_file, index=False, header=(idx == 0))
+                    if plots:
+                        with profile_stage("render"):
+                            render_pages(direction, batch, results, pdf if pdf is not None else os.path.join(savepath, plot_name), dpi)
+                    n_sipm += len(results)
+                    if hide_progress is False:
+                        print(f"Batch {idx + 1}: {n_sipm} SiPMs analyzed", end="\r")
+            finally:
+                if pdf is not None:
+                    pdf.close()
+        self.results = None
+        if hide_progress is False:
+            print(f"\nResults saved as {savepath}\{res_fname}")
+            if plots:
+                print(f"Plot saved as {savepath}\{plot_name}.")
+
+    def load_results(self, savepath=os.getcwd()):
+        """
+        Load the results of a previous analysis from the results .csv file in savepath.
+
+        Args:
+        ----------
+            savepath (str, optional): The folder of the results. Defaults to the current working directory.
+
+        Returns:
+        ----------
+            results (pandas.DataFrame): the results, indexed by SiPM.
+        """
+        if not self.fileinfo:
+            self.get_fileinfo()
+        self.results = pd.read_csv(os.path.join(savepath, f"{self.output_name()}_results.csv"), index_col="SiPM")
+        if "V_bd_method" in self.results:
+            self.peak_mode = self.results["V_bd_method"].iloc[0]
+        return self.results
+
+    def tagged_results(self, dataset=""):
+        """
+        Returns the main results of the analysis (R_q or V_bd for each SiPM) together with the dataset, ardu, test, temp and direction of the file,
+        in the format of the ResultsStore tables.
+
+        Args:
+        ----------
+            dataset (str, optional): the name of the dataset (e.g. the subfolder of the file). Defaults to "".
+
+        Returns:
+        ----------
+            table (pandas.DataFrame): one row for each SiPM.
+        """
+        intervals = [column for column in self.results.columns if column.endswith(("_ci_low", "_ci_high"))]
+        if self.fileinfo["direction"] == "f":
+            table = self.results[["R_quenching", "R_quenching_std"] + intervals].reset_index()
+        else:
+            table = self.results[["V_bd", "V_bd_std"] + intervals].reset_index()
+            table["V_bd_method"] = getattr(self, "peak_mode", "gauss")
+        meta = {"dataset": dataset, **{key: self.fileinfo[key] for key in ["ardu", "test", "temp", "direction"]}}
+        return table.assign(**meta)[list(meta) + list(table.columns)]
+
+    def output_name(self):
+        """
+        Returns the base name of the output files of this ARDU file, e.g. "Arduino0_Test272_TempLN2_Forward".
+        """
+        direction = "Forward" if self.fileinfo["direction"] == "f" else "Reverse"
+        return f"Arduino{self.fileinfo['ardu']}_Test{self.fileinfo['test']}_Temp{self.fileinfo['temp']}_{direction}"
+
+    def plotter(self, savepath=os.getcwd(), plots="pdf", plot_workers=1, dpi=100):
+        """
+        Render a plot page for each SiPM, either from the results of analyzer() or, if the analysis was run in a previous session,
+        from the results .csv file in savepath.
+        With plot_workers > 1 the SiPMs are split among a pool of processes: PNG pages are written by the workers directly,
+        while PDF pages are rendered as raster images by the workers and collected in the PDF by the parent process.
+
+        Args:
+        ----------
+            savepath (str, optional): The folder of the results, where the plots are saved. Defaults to the current working directory.
+            plots (str, optional): "pdf" for a single PDF file, "png" for a folder with a (rasterized) PNG for each SiPM. Defaults to "pdf".
+            plot_workers (int, optional): number of processes rendering the pages. Defaults to 1.
+            dpi (int, optional): resolution of the rasterized pages. Defaults to 100.
 
+        Returns:
+        ----------
+            plot_name (str): the name of the PDF file or PNG folder created in savepath.
+        """
+        if self.results is None:
+            self.load_results(savepath)
+
+        direction = self.fileinfo["direction"]
+        plot_name = self.output_name() if plots == "png" else f"{self.output_name()}.pdf"
+        target = os.path.join(savepath, plot_name)
+        if plots == "png" and not os.path.exists(target):
+            os.makedirs(target)
+
+        if plot_workers <= 1:
+            if plots == "png":
+                render_pages(direction, self.df_sorted, self.results, target, dpi)
+            else:
+                with backend_pdf.PdfPages(target) as pdf:
+                    render_pages(direction, self.df_sorted, self.results, pdf, dpi)
+            return plot_name
+
+        chunks = np.array_split(self.df_sorted["SiPM"].unique(), plot_workers)
+        with ProcessPoolExecutor(max_workers=plot_workers, initializer=matplotlib.use, initargs=("Agg",)) as pool:
+            futures = [
+                pool.submit(
+                    render_pages,
+                    direction,
+                    self.df_sorted[self.df_sorted["SiPM"].isin(chunk)],
+                    self.results.loc[chunk],
+                    target if plots == "png" else None,
+                    dpi,
+                )
+                for chunk in chunks
+                if len(chunk) > 0
+            ]
+            if plots == "png":
+                [future.result() for future in futures]
+            else:
+                with backend_pdf.PdfPages(target) as pdf:
+                    page = None
+                    for future in futures:  # In submission order, to keep the pages sorted by SiPM
+                        for image in future.result():
+                            page = raster_page(pdf, image, dpi, page)
+        return plot_name
 
 
 ###############################################################################
@@ -195,8 +505,11 @@ class DirReader:
     Methods:
     ----------
         dir_walker(): Walk the directory to find all the files that match the correct pattern.
-        dir_analyzer(root_savepath = os.getcwd()): Analyze each file in the file list and save the results.
-        histograms(compare_temp=True, compare_day=True): Plot histograms of R_q and V_bd.
+        dir_cache(): Convert each file to a memory-mappable binary cache, read in place of the csv by the other methods.
+        dir_analyzer(root_savepath = os.getcwd(), workers=1, store="sipm_results.sqlite", incremental=True, profile=False):
+            Analyze each file in the file list (optionally in parallel) and save the results.
+        dir_sweep(root_savepath=os.getcwd(), workers=1, filename="sipm_sweep.csv", **grid): Evaluate R_q and V_bd of each file for a grid of analysis settings.
+        histograms(compare_temp=True, compare_day=True, store=None, results=None, comparisons=None): Plot histograms of R_q and V_bd.
     """
 
     def __init__(self, dir):
@@ -230,68 +543,235 @@ class DirReader:
                     self._file_list.append(full_path)
         return self._file_list
 
-    def dir_analyzer(self, root_savepath=os.getcwd()):
+    def dir_cache(self):
+        """
+        Convert each file in the file list to a binary cache (see Single.to_cache), skipping the files whose cache is up to date.
+        The later readings of the files (e.g. by dir_analyzer and dir_sweep) memory-map the caches instead of parsing the csv files.
+
+        Returns:
+        ----------
+            converted (list): the paths of the converted files.
+        """
+        converted = []
+        for idx, file in enumerate(self._file_list):
+            if load_cache(file) is None:
+                Single(file).to_cache()
+                converted.append(file)
+            progress_bar(idx + 1, len(self._file_list))
+        print("\n")
+        print(f"{len(converted)} files converted, {len(self._file_list) - len(converted)} caches already up to date")
+        return converted
+
+    def dir_analyzer(self, root_savepath=os.getcwd(), workers=1, store="sipm_results.sqlite", incremental=True, profile=False, write_behind=False,
+                     **analyzer_args):
         """
         Analyze each file in the file list and save the results to the root_savepath/results folder.
+        The ARDU files are independent, so with workers > 1 each one is dispatched to a process pool.
+        Every worker runs on the Agg backend and writes to its own results/<subfolder> outputs, while the parent collects progress and errors.
+        The results of every file are also collected in memory (self.results, used by histograms()) and appended to a consolidated ResultsStore.
+        With incremental=True a Manifest of the input files, analysis parameters and code version is kept in root_savepath/results,
+        and the files whose results and plots are already up to date are not analyzed again (their results are read from the .csv files).
 
         Args:
         ----------
             root_savepath (str, optional): the root directory for saving the analysis results, defaults to current working directory.
+            workers (int, optional): number of processes analyzing the files in parallel. Defaults to 1 (sequential analysis).
+            store (str, optional): file name of the ResultsStore in root_savepath/results, None to skip it. Defaults to "sipm_results.sqlite".
+            incremental (bool, optional): If True, skip the files that are already analyzed with the same parameters and code. Defaults to True.
+            profile (bool, optional): If True, record the wall and CPU time of each stage of each file, the curve fit evaluations, the page render times
+                and the peak memory (see Profiler), save them as sipm_profile.json/.csv in root_savepath/results and print a summary
+                in place of the progress bar. Defaults to False.
+            write_behind (bool, optional): If True, the sequential analysis (workers=1, without profile) hands the results .csv files, the plots,
+                the store and the manifest updates of each file to a WriteBehind thread, and analyzes the next file meanwhile.
+                The errors of the outputs are then raised when the next job is queued or at the end of the run. Defaults to False.
+            **analyzer_args: keyword arguments forwarded to Single.analyzer (e.g. peak_mode="analytic").
 
         Returns:
         ----------
-            None
+            failed (dict): the files whose analysis raised an error, with the error message.
         """
 
-        for idx, file in enumerate(self._file_list):
-            try:
-                subfolder = re.search(".+\\\\(.+?)\\\\ARDU_.+", file).group(1)
-            except AttributeError:
-                subfolder = ""
+        self.failed = {}
+        self.root_savepath = root_savepath
+        tables = []
+        results_store = ResultsStore(os.path.join(root_savepath, "results", store)) if store else None
+        matplotlib.use("Agg")  # Introduced to solve memory issues when dealing with big folders
+
+        manifest = Manifest(os.path.join(root_savepath, "results", "sipm_manifest.json"), analysis_params(analyzer_args))
+        plots = manifest.params["plots"]
+        profiler = Profiler() if profile else None
+        analyze = profiled_file_analyzer if profile else file_analyzer
+        writer = None
+
+        def record(file, table):
+            if results_store is not None:
+                results_store.append(table)
+            manifest.update(file, expected_outputs(file, root_savepath, plots))
+
+        def collect(file, table):
+            if profile and isinstance(table, tuple):
+                table, records = table
+                profiler.records.extend(records)
+            tables.append(table)
+            if writer is not None:  # After the outputs of the file, so that the manifest only records complete outputs
+                writer.submit(record, file, table, label=file)
+                return
+            with profiler.stage("store", file) if profile else contextlib.nullcontext():
+                record(file, table)
+
+        def progress(done, total):
+            if not profile:  # the profiles are summarized at the end of the run
+                progress_bar(done, total)
+
+        to_analyze = []
+        for file in self._file_list:
+            savepath = results_savepath(file, root_savepath)
+            if incremental and manifest.is_current(file, expected_outputs(file, root_savepath, plots)):
+                sipm = Single(file)
+                sipm.load_results(savepath)
+                collect(file, sipm.tagged_results(dataset_name(file)))
+            else:
+                to_analyze.append(file)
+        if len(to_analyze) < len(self._file_list):
+            print(f"{len(self._file_list) - len(to_analyze)} files already up to date, analyzing {len(to_analyze)} files...")
+
+        try:
+            if workers <= 1:
+                if write_behind and not profile and to_analyze:
+                    writer = WriteBehind()
+                    analyzer_args = {**analyzer_args, "writer": writer}
+                for idx, file in enumerate(to_analyze):
+                    try:
+                        collect(file, analyze(file, results_savepath(file, root_savepath), **analyzer_args))
+                    except Exception as err:
+                        if writer is not None and writer.error is not None:
+                            raise  # The outputs can't be written any more (see WriteBehind), not an error of this file
+                        self.failed[file] = f"{type(err).__name__}: {err}"
+                    progress(idx + 1, len(to_analyze))
+                if writer is not None:
+                    writer.close()
+                    writer = None  # Closed: nothing left to abort
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=matplotlib.use, initargs=("Agg",)) as pool:
+                    futures = {
+                        pool.submit(analyze, file, results_savepath(file, root_savepath), **analyzer_args): file
+                        for file in to_analyze
+                    }
+                    for idx, future in enumerate(as_completed(futures)):
+                        try:
+                            collect(futures[future], future.result())
+                        except Exception as err:
+                            self.failed[futures[future]] = f"{type(err).__name__}: {err}"
+                        progress(idx + 1, len(to_analyze))
+        finally:
+            if writer is not None:  # Interrupted run: the jobs already queued are completed before saving the manifest
+                writer.abort()
+            manifest.save()  # Keeps the progress of interrupted runs
+        print("\n")
 
-            sipm = Single(file)
-            sipm.reader()
-            matplotlib.use("Agg")  # Introduced to solve memory issues when dealing with big folders
+        if profile:
+            self.profile = profiler
+            print(profiler.summary().to_string())
+            print(f"Profile saved as {profiler.save(os.path.join(root_savepath, 'results'))}")
 
-            sipm.analyzer(
-                savepath=os.path.join(root_savepath, "results", subfolder),  # Creates a "results" subdir in the "root_savepath" directory
-                hide_progress=True)  # hide_progress set to True to have a cleaner look on the terminal
-            progress_bar(idx + 1, len(self._file_list))
-        print("\n")
+        self.results = split_directions(pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=ResultsStore.KEYS))
+        if self.failed:
+            print(f"{len(self.failed)} files could not be analyzed:")
+            for file, err in self.failed.items():
+                print(f"{file} -> {err}")
+        return self.failed
+
+    def dir_sweep(self, root_savepath=os.getcwd(), workers=1, filename="sipm_sweep.csv", **grid):
+        """
+        Evaluate the analysis of each file in the file list for a grid of settings (see Single.sweep), without saving the single results or plots.
+        Each file is read once; with workers > 1 the files are dispatched to a process pool as in dir_analyzer.
+
+        Args:
+        ----------
+            root_savepath (str, optional): The root directory for saving the sweep table. Defaults to the current working directory.
+            workers (int, optional): number of processes analyzing the files in parallel. Defaults to 1.
+            filename (str, optional): file name of the sweep table in root_savepath/results, None to skip saving it. Defaults to "sipm_sweep.csv".
+            **grid: the lists of settings forwarded to Single.sweep (room_f_start, ln2_f_start, peak_width, peak_mode).
 
-    def histograms(self, compare_temp=True, compare_day=True):
+        Returns:
+        ----------
+            sweep (pandas.DataFrame): the tidy tables of Single.sweep of all the files, with the columns dataset, ardu, test, temp and direction in front.
+        """
+        tables = []
+        self.failed = {}
+        if workers <= 1:
+            for idx, file in enumerate(self._file_list):
+                try:
+                    tables.append(file_sweep(file, **grid))
+                except Exception as err:
+                    self.failed[file] = f"{type(err).__name__}: {err}"
+                progress_bar(idx + 1, len(self._file_list))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(file_sweep, file, **grid): file for file in self._file_list}
+                for idx, future in enumerate(as_completed(futures)):
+                    try:
+                        tables.append(future.result())
+                    except Exception as err:
+                        self.failed[futures[future]] = f"{type(err).__name__}: {err}"
+                    progress_bar(idx + 1, len(self._file_list))
+        print("\n")
+        if self.failed:
+            print(f"{len(self.failed)} files could not be analyzed:")
+            for file, err in self.failed.items():
+                print(f"{file} -> {err}")
+
+        self.sweep = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+        if filename:
+            savepath = os.path.join(root_savepath, "results")
+            if not os.path.exists(savepath):
+                os.makedirs(savepath)
+            self.sweep.to_csv(os.path.join(savepath, filename), index=False)
+            print(f"Sweep saved as {savepath}\\{filename}")
+        return self.sweep
+
+    def histograms(self, compare_temp=True, compare_day=True, store=None, results=None, root_savepath=None, comparisons=None):
         """
         Plot histograms of R_q and V_bd.
+        The results are taken, in order of preference, from the given store or in-memory results, from the results of the last dir_analyzer() call,
+        or from the *_results.csv files in the root_savepath/results folder, and indexed in a Catalog (saved as self.catalog)
+        from which the datasets of each comparison are selected.
 
         Args:
         ----------
             compare_temp (bool, optional): If True, produce an histogram that compares the LN2 measures. Defaults to True
             compare_day (bool, optional): If True, produce an histogram that compares the analysis of the 22/23 of April. Defaults to True
+            store (str or ResultsStore, optional): a results store (or its path) to read the results from. Defaults to None.
+            results (dict, optional): in-memory results as {"forward": DataFrame, "reverse": DataFrame} in the ResultsStore format. Defaults to None.
+            root_savepath (str, optional): the root directory of the "results" folder where the histograms are saved.
+                Defaults to the one used by dir_analyzer() or the current working directory.
+            comparisons (list, optional): additional comparisons as (title, filters, plot file name) tuples, where filters is a dict
+                of Catalog.select() filters, e.g. ("Arduino 0", {"ardu": 0}, "Arduino0_comparison_hist.png"). Defaults to None.
 
         Returns:
         ----------
             None
         """
 
-        top = os.path.join(os.getcwd(), "results")
-        fwd_all = []
-        rev_all = []
-
-        for subdir, dirs, files in os.walk(top):
-            for dir in dirs:
-                subdir_path = os.path.join(subdir, dir)
+        if root_savepath is None:
+            root_savepath = getattr(self, "root_savepath", os.getcwd())
+        top = os.path.join(root_savepath, "results")
 
-                # Retrieve all the data of fwd and rev
-                forward_data = df_join(subdir_path, "Forward")
-                reverse_data = df_join(subdir_path, "Reverse")
+        if store is not None:
+            store = ResultsStore(store) if isinstance(store, str) else store
+            results = {"forward": store.load("forward"), "reverse": store.load("reverse")}
+        elif results is None:
+            results = getattr(self, "results", None) or results_from_csv(top)
+        self.catalog = Catalog(results)
 
-                if (compare_day == True or compare_temp == True):  # Create the full df only if needed
-                    fwd_all.append(forward_data)
-                    rev_all.append(reverse_data)
+        # Plot R_q and V_bd hist for each dataset
+        for dataset in self.catalog.datasets():
+            forward_data = self.catalog.select("forward", dataset=dataset)
+            reverse_data = self.catalog.select("reverse", dataset=dataset)
 
-                # Plot R_q and V_bd hist for each subfolder
-                fig, axs = plt.subplots(2)
-                hist_params(fig, axs, dir)
+            fig, axs = plt.subplots(2)
+            hist_params(fig, axs, dataset)
+            if len(forward_data) > 0:
                 forward_data.plot.hist(
                     column=["R_quenching"],
                     ax=axs[0],
@@ -300,6 +780,7 @@ class DirReader:
                     color="darkgreen",
                     alpha=0.7,
                 )
+            if len(reverse_data) > 0:
                 reverse_data.plot.hist(
                     column=["V_bd"],
                     ax=axs[1],
@@ -308,255 +789,2206 @@ class DirReader:
                     color="darkorange",
                     alpha=0.7,
                 )
-                plt.tight_layout()  # Prevents titles and axes from overlapping
-                plotname = f"Histograms_{dir}.png"
-                plt.savefig(os.path.join(top, plotname), bbox_inches="tight")
-                plt.close()
-                print(f"Plot saved as {top}\{plotname}")
-
-        if compare_temp == True or compare_day == True:
-            # Merge all the fwd and rev dataframes
-            fwd_all = pd.concat(fwd_all)
-            rev_all = pd.concat(rev_all)
-
-        if compare_temp == True:
-            ln2_fwd = fwd_all[fwd_all["subdir"].str.contains("LN2")]
-            ln2_rev = rev_all[fwd_all["subdir"].str.contains("LN2")]
-
-            fig, axs = plt.subplots(2)
-            hist_params(fig, axs, "Liquid Nitrogen comparison")
-            for subdir, group in ln2_fwd.groupby("subdir"):
-                group["R_quenching"].hist(ax=axs[0], label=subdir, bins=15, alpha=0.6)
-            for subdir, group in ln2_rev.groupby("subdir"):
-                group["V_bd"].hist(ax=axs[1], label=subdir, bins=15, alpha=0.6)
-            [ax.legend() for ax in axs]
-            plt.tight_layout()
-            plotname = f"LN2_comparison_hist.png"
+            plt.tight_layout()  # Prevents titles and axes from overlapping
+            plotname = f"Histograms_{dataset}.png"
             plt.savefig(os.path.join(top, plotname), bbox_inches="tight")
             plt.close()
             print(f"Plot saved as {top}\{plotname}")
 
+        comparisons = list(comparisons or [])
+        if compare_temp == True:
+            comparisons.insert(0, ("Liquid Nitrogen comparison", {"temp": "LN2"}, "LN2_comparison_hist.png"))
         if compare_day == True:
-            fwd_april = fwd_all[fwd_all["subdir"].str.contains("_04_")]
-            rev_april = rev_all[fwd_all["subdir"].str.contains("_04_")]
-
-            fig, axs = plt.subplots(2)
-            hist_params(fig, axs, "April data comparison")
-            for subdir, group in fwd_april.groupby("subdir"):
-                group["R_quenching"].hist(ax=axs[0], label=subdir, bins=15, alpha=0.6)
-            for subdir, group in rev_april.groupby("subdir"):
-                group["V_bd"].hist(ax=axs[1], label=subdir, bins=15, alpha=0.6)
-            [ax.legend() for ax in axs]
-            plt.tight_layout()
-            plotname = f"April_data_comparison_hist.png"
-            plt.savefig(os.path.join(top, plotname), bbox_inches="tight")
-            plt.close()
-            print(f"Plot saved as {top}\{plotname}")
+            comparisons.insert(int(compare_temp == True), ("April data comparison", {"date": lambda date: date.month == 4}, "April_data_comparison_hist.png"))
 
+        for title, filters, plotname in comparisons:
+            comparison_hist(
+                self.catalog.select("forward", **filters),
+                self.catalog.select("reverse", **filters),
+                title,
+                os.path.join(top, plotname),
+            )
 
 
-######################################################################
-#           Mathematical functions and other static methods          #
-######################################################################
+###############################################################################
+#                                Streaming analyzer                           #
+###############################################################################
 
 
-@staticmethod
-def fwd_analyzer(data, starting_point):
+class Stream:
     """
-    Analyze the forward IV Curve by fitting a line on the linear part of the data.
+    Online analysis of the rows (SiPM, Step, V, I, I_err) of an ARDU measurement while it is being taken.
+    - Forward: the linear fit of each SiPM is updated in O(1) for every new point with V >= start (see OnlineLine),
+      so R_quenching is available at any time.
+    - Reverse: the points of each SiPM are buffered and rev_engine runs as soon as its sweep is complete.
+    A sweep is complete when n_steps points of the SiPM have arrived or, if n_steps is None, when the stream is closed.
 
-    Args:
+    Parameters:
     ----------
-        data (pandas.DataFrame): pd DataFrame containing the values of V, I and I_err.
-        starting_point (float): specifies the starting point from where to isolate the linear data.
+        name (str): the ARDU file name of the measurement (e.g. ARDU_0_Test_272_f_LN2_dataframe.csv), used for the metadata (see Single.get_fileinfo).
+        room_f_start, ln2_f_start, peak_width, peak_mode: see Single.analyzer, except that the forward start cannot be "auto".
+        n_steps (int, optional): the number of steps of each sweep. Defaults to None.
+        on_result (callable, optional): called as on_result(sipm, result) when the sweep of a SiPM is complete. Defaults to None.
 
-    Returns:
+    Methods:
     ----------
-        values (pandas.Series): A pandas Series containing the following values:
-            R_quenching (float): the quenching resistance of the system calculated using linear regression.
-            R_quenching_std (float), an overestimation of the standard deviation of R_quenching.
-            start (float), the starting point used to isolate the linear data.
-            m (float), the slope of the regression line.
-            q (float), the intercept of the regression line.
+        push(sipm, step, v, i, i_err): Add a point.
+        consume(lines): Add the points of an iterable of csv lines, e.g. from stream_lines().
+        results(): Return the current results of all the SiPMs.
+        close(): Complete the pending sweeps and return the results.
+        save(savepath): Save the results as the analyzer() results .csv file.
     """
-    x = data["V"].to_numpy()
-    y = data["I"].to_numpy()
-    # isolate the linear data
-    x_lin = x[x >= starting_point]
-    y_lin = y[x >= starting_point]
-
-    # linear regression
-    model = stats.linregress(x_lin, y_lin)
-    m = model.slope
-    q = model.intercept
-    R_quenching = 1000 / m
-    R_quenching_std = max(model.stderr, 0.03 * R_quenching)  # overestimation of the R standard dev
-
-    values = pd.Series(
-        {
-            "R_quenching": R_quenching,
-            "R_quenching_std": R_quenching_std,
-            "start": starting_point,
-            "m": m,
-            "q": q,
-        }
-    )
-    return values
 
+    def __init__(self, name, room_f_start=0.75, ln2_f_start=1.55, peak_width=10, peak_mode="gauss", n_steps=None, on_result=None):
+        """
+        Initialize the Stream from the metadata of the measurement and the analysis parameters.
 
-@staticmethod
-def fwd_plotter(data, pdf):
-    """
-    Plots the data and results of the forward IV curve.
+        Args:
+        ----------
+            name (str): the ARDU file name of the measurement.
+            room_f_start, ln2_f_start, peak_width, peak_mode: see Single.analyzer. The forward start must be a number:
+                "auto" needs the complete sweep (see fwd_autostart) and raises a ValueError, use Single.analyzer on the saved file instead.
+            n_steps (int, optional): the number of steps of each sweep. Defaults to None.
+            on_result (callable, optional): called as on_result(sipm, result) when the sweep of a SiPM is complete. Defaults to None.
+        """
+        self.single = Single(os.path.join(os.curdir, os.path.basename(name)))  # get_fileinfo expects a path, not a bare file name
+        self.fileinfo = self.single.get_fileinfo()
+        self.direction = self.fileinfo["direction"]
+        self.start = ln2_f_start if self.fileinfo["temp"] == "LN2" else room_f_start
+        if self.direction == "f" and isinstance(self.start, str):
+            raise ValueError(f"Stream needs a numeric forward start, got {self.start!r}: fwd_autostart needs the complete sweep")
+        self.peak_width = peak_width
+        self.peak_mode = peak_mode
+        self.n_steps = n_steps
+        self.on_result = on_result
+        self.columns = ["SiPM", "Step", "V", "I", "I_err"]
+        self.points = {}  # SiPM -> list of (Step, V, I, I_err)
+        self.lines = {}  # SiPM -> OnlineLine (forward)
+        self.done = {}  # SiPM -> results of the complete sweeps
+
+    def push(self, sipm, step, v, i, i_err=np.nan):
+        """
+        Add a point of a SiPM sweep, running the analysis of the SiPM if its sweep is complete.
 
-    Args:
-    ----------
-        data (pandas.DataFrame): pd DataFrame containing the metadata, data and regression results for each SiPM analysis.
-        pdf ( matplotlib.backends.backend_pdf.PdfPages): A PdfPages object used to save the pdf.
+        Args:
+        ----------
+            sipm (int): the SiPM number.
+            step, v, i, i_err (float): the values of the point.
 
-    Returns:
-    ----------
-    None
-    """
+        Returns:
+        ----------
+            result (pandas.Series): the result of the SiPM if its sweep was completed by this point, else None.
+        """
+        sipm = int(sipm)
+        points = self.points.setdefault(sipm, [])
+        points.append((step, v, i, i_err))
+        if self.direction == "f" and v >= self.start:
+            self.lines.setdefault(sipm, OnlineLine()).update(v, i)
+        if self.n_steps is not None and len(points) >= self.n_steps:
+            return self._complete(sipm)
+        return None
+
+    def consume(self, lines):
+        """
+        Add the points of an iterable of csv lines. Empty lines and lines before the header are skipped,
+        and the column order is taken from the header if there is one.
 
-    data["y_lin"] = (data["m"] * data["V"] + data["q"])  # Find y values via linear regression
-    lin_x = data[data["V"] >= data["start"]]["V"]  # The conditions are there to plot only on the linear part of the curve
-    lin_y = data[data["V"] >= data["start"]]["y_lin"]
+        Args:
+        ----------
+            lines (iterable): the csv lines, e.g. from stream_lines().
 
-    fig, ax = plt.subplots()
-    sipm_number = list(data["SiPM"].drop_duplicates())[0]
-    fig.suptitle(f"Forward IV curve: SiPM {sipm_number}")
-    ax.set_xlabel("Voltage (V)")
-    ax.set_ylabel("Current(mA)")
-    ax.grid("on")
+        Returns:
+        ----------
+            None
+        """
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if "SiPM" in line:
+                self.columns = [name.strip() for name in line.split(",")]
+                continue
+            try:
+                values = dict(zip(self.columns, map(float, line.split(","))))
+            except ValueError:  # comments or partial lines
+                continue
+            if "SiPM" in values and "Step" in values and "V" in values and "I" in values:
+                self.push(values["SiPM"], values["Step"], values["V"], values["I"], values.get("I_err", np.nan))
 
-    ax.errorbar(data["V"], data["I"], data["I_err"], marker=".", zorder=1)
-    ax.plot(
-        lin_x,
-        lin_y,
-        color="darkorange",
-        linewidth=1.2,
-        label=f'Linear fit: Rq = ({data["R_quenching"].iloc[0]:.2f} $\pm$ {data["R_quenching_std"].iloc[0]:.2f}) $\Omega$',
-        zorder=2,
-    )
+    def results(self):
+        """
+        Return the results of the complete sweeps together with the current forward fits of the pending ones.
 
-    ax.legend(loc="upper left")
-    pdf.savefig()
-    plt.close()
+        Returns:
+        ----------
+            results (pandas.DataFrame): the results indexed by SiPM, with the same columns as fwd_engine or rev_engine.
+        """
+        rows = dict(self.done)
+        if self.direction == "f":
+            for sipm, line in self.lines.items():
+                rows.setdefault(sipm, self._fwd_result(line))
+        if not rows:
+            return pd.DataFrame()
+        results = pd.DataFrame.from_dict(rows, orient="index").sort_index()
+        results.index.name = "SiPM"
+        return results
+
+    def close(self):
+        """
+        Complete the sweeps of all the SiPMs still pending and return the results.
 
+        Returns:
+        ----------
+            results (pandas.DataFrame): see results().
+        """
+        for sipm in list(self.points):
+            self._complete(sipm)
+        return self.results()
 
-@staticmethod
-def rev_analyzer(data, peak_width):
-    """
-    Analyze the reverse IV Curve by fitting a 5th-degree polynomial on the data derivative and a gaussian curve on the poly peak.
+    def save(self, savepath=os.getcwd()):
+        """
+        Save the results in the same .csv file written by Single.analyzer for the whole measurement.
 
-    Args:
-    ----------
-        data (pandas.DataFrame): pd DataFrame containing the values of V, I and I_err.
-        peak_width (int): The width of the peak to search.
+        Args:
+        ----------
+            savepath (str, optional): The path to save the results. Defaults to the current working directory.
 
-    Returns:
-    ----------
-        values (pandas.Series): A pandas Series containing the following values:
-            V_bd (float): The breakdown voltage, evaluated as the mean of the gaussian curve.
-            V_bd_std (float): The breakdown voltage standard deviation, evaluated as the standard deviation of the gaussian curve.
-            width (float): the FWHM of the gaussian curve.
-            coefs (list) : list of the 5th-degree polynomial coefficients.
-            params (list): the parameters of the curve fit of the gaussian.
-    """
+        Returns:
+        ----------
+            res_path (str): the path of the results .csv file.
+        """
+        if not os.path.exists(savepath):
+            os.makedirs(savepath)
+        res_path = os.path.join(savepath, f"{self.single.output_name()}_results.csv")
+        results_table(self.results(), self.direction, self.peak_mode).to_csv(res_path, index=False)
+        return res_path
+
+    def _complete(self, sipm):
+        points = np.array(self.points.pop(sipm), dtype=float)
+        if self.direction == "f":
+            result = self._fwd_result(self.lines.pop(sipm, OnlineLine()))
+        else:
+            data = pd.DataFrame(points[np.argsort(points[:, 0], kind="stable")], columns=["Step", "V", "I", "I_err"])
+            data.insert(0, "SiPM", sipm)
+            try:
+                result = rev_engine(data, self.peak_width, self.peak_mode).iloc[0]
+            except (ValueError, IndexError, RuntimeError, np.linalg.LinAlgError):  # e.g. too few points for the fit
+                result = pd.Series(np.nan, index=["V_bd", "V_bd_std", "width"] + COEF_COLUMNS + GAUSS_COLUMNS)
+        result = result.rename(sipm)
+        self.done[sipm] = result
+        if self.on_result is not None:
+            self.on_result(sipm, result)
+        return result
 
-    x = data["V"].to_numpy()
-    y = data["I"].to_numpy()
+    def _fwd_result(self, line):
+        R_quenching, R_quenching_std, m, q = line.result()
+        return pd.Series({"R_quenching": R_quenching, "R_quenching_std": R_quenching_std, "start": float(self.start), "m": m, "q": q})
 
-    # Evaluation of the 1st derivative
-    derivative = norm_derivative(x, y)
 
-    # 5th degree polynomial fit
-    fifth_poly = Polynomial.fit(x, derivative, 5)
-    coefs = fifth_poly.convert().coef
-    y_fit = fifth_poly(x)
+class OnlineLine:
+    """
+    Running least squares of a line, updated in O(1) per point with Welford's algorithm.
+    It gives the same results as fwd_fit on the same points.
 
-    # Peak finder
-    peaks = signal.find_peaks(fifth_poly(x), width=peak_width)[0]  # width parameter to discard smaller peaks
-    idx_max = peaks[np.argmax(fifth_poly(x)[peaks])]
-    x_max = x[idx_max]
-    fwhm = x[int(idx_max + peak_width / 2)] - x[int(idx_max - peak_width / 2)]
-    
-    # Gaussian fit around the peak
-    x_gauss = x[np.logical_and(x >= (x_max - fwhm / 2), x <= (x_max + fwhm / 2))]
-    y_gauss = y_fit[np.logical_and(x >= (x_max - fwhm / 2), x <= (x_max + fwhm / 2))]
+    Methods:
+    ----------
+        update(x, y): Add a point.
+        result(): Return R_quenching, R_quenching_std, m and q.
+    """
 
-    fit_guess = [0, 1, x_max, fwhm/2]
-    params, covar = optimize.curve_fit(gauss, x_gauss, y_gauss, fit_guess, maxfev=20000)
+    def __init__(self):
+        """
+        Initialize the running sums.
+        """
+        self.n = 0
+        self.x_mean = 0.0
+        self.y_mean = 0.0
+        self.ss_xx = 0.0
+        self.ss_xy = 0.0
+        self.ss_yy = 0.0
+
+    def update(self, x, y):
+        """
+        Add a point (x, y) to the fit.
+        """
+        if not np.isfinite(y):
+            return
+        self.n += 1
+        dx = x - self.x_mean
+        dy = y - self.y_mean
+        self.x_mean += dx / self.n
+        self.y_mean += dy / self.n
+        self.ss_xx += dx * (x - self.x_mean)
+        self.ss_xy += dx * (y - self.y_mean)
+        self.ss_yy += dy * (y - self.y_mean)
+
+    def result(self):
+        """
+        Return the fit results, with the same definitions of fwd_fit.
 
-    # Returning the values
-    values = pd.Series(
-        {
-            "V_bd": params[2],
-            "V_bd_std": params[3],
-            "width": fwhm,
-            "coefs": coefs,
-            "params": params,
-        }
-    )
-    return values
+        Returns:
+        ----------
+            (R_quenching, R_quenching_std, m, q) (float)
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            n, ss_xx = np.float64(self.n), np.float64(self.ss_xx)
+            m = self.ss_xy / ss_xx
+            q = self.y_mean - m * self.x_mean
+            stderr = np.sqrt(max(self.ss_yy - self.ss_xy * m, 0) / (n - 2) / ss_xx)
+            R_quenching = 1000 / m
+            R_quenching_std = np.fmax(stderr, 0.03 * R_quenching)
+        return R_quenching, R_quenching_std, m, q
 
 
-@staticmethod
-def rev_plotter(data, pdf):
-    """Plots the data and results of the forward IV curve.
+def stream_lines(source, follow=True, idle_timeout=10, poll=0.2):
+    """
+    Yield the lines of a live ARDU measurement.
 
     Args:
     ----------
-        data (pandas.DataFrame): pd DataFrame containing the metadata, data and fit results for each SiPM analysis.
-        pdf ( matplotlib.backends.backend_pdf.PdfPages): A PdfPages object used to save the pdf.
+        source (str): "-" for the standard input (e.g. a pipe), "host:port" to connect to a socket, otherwise the path of a file being appended.
+        follow (bool, optional): for files, keep waiting for new lines (as tail -f). Defaults to True.
+        idle_timeout (float, optional): for followed files, seconds without new lines after which the measurement is considered finished. Defaults to 10.
+        poll (float, optional): for followed files, seconds between the checks for new lines. Defaults to 0.2.
 
     Returns:
     ----------
-    None
+        lines (generator): the lines, until the end of the stream.
+    """
+    if source == "-":
+        yield from sys.stdin
+    elif re.fullmatch(r"[\w.\-]+:\d+", source) and not os.path.exists(source):
+        host, port = source.rsplit(":", 1)
+        with socket.create_connection((host, int(port))) as connection:
+            yield from connection.makefile("r")
+    else:
+        with open(source, "r") as file:
+            partial = ""
+            last_line = time.monotonic()
+            while True:
+                line = file.readline()
+                if line:
+                    partial += line
+                    if partial.endswith("\n"):  # a line still being written is completed on the next read
+                        yield partial
+                        partial = ""
+                        last_line = time.monotonic()
+                elif not follow or time.monotonic() - last_line > idle_timeout:
+                    if partial:
+                        yield partial
+                    return
+                else:
+                    time.sleep(poll)
+
+
+def replay_rows(path, rate=0):
+    """
+    Yield the lines of an existing ARDU file in measurement order (all the SiPMs at each step, one step after the other),
+    as a local stand-in for a board during the tests of the streaming analysis.
+
+    Args:
+    ----------
+        path (str): the path of the ARDU file.
+        rate (float, optional): the number of rows per second, 0 for no delay. Defaults to 0.
+
+    Returns:
+    ----------
+        lines (generator): the csv lines, header included.
+    """
+    data = read_ardu(path).sort_values(["Step", "SiPM"], kind="stable")
+    yield ",".join(data.columns) + "\n"
+    start = time.monotonic()
+    for idx, row in enumerate(data.itertuples(index=False)):
+        if rate > 0:
+            delay = start + idx / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        yield ",".join(str(value) for value in row) + "\n"
+
+
+###############################################################################
+#                                Instrumentation                              #
+###############################################################################
+
+
+class Profiler:
+    """
+    Opt-in instrumentation of the analysis (see DirReader.dir_analyzer(profile=True)).
+    While a Profiler is active, the stages wrapped in profile_stage() (reading, fits, curve_fit calls, results writing, rendering of each page, ...)
+    are recorded with their wall and CPU time and the file being analyzed; when inactive, profile_stage() does nothing.
+
+    Methods:
+    ----------
+        start(file): Make this Profiler the active one, recording the stages of file.
+        stop(): Stop recording.
+        stage(name, file): Context manager recording a stage.
+        summary(): Return the statistics of each stage.
+        file_summary(): Return the wall time of each stage of each file.
+        save(folder): Save the profile as sipm_profile.json and sipm_profile.csv.
+    """
+
+    active = None  # the Profiler recording in this process
+
+    def __init__(self):
+        """
+        Initialize an empty profile.
+        """
+        self.records = []
+        self.file = ""
+
+    def start(self, file=""):
+        """
+        Make this Profiler the active one, recording the stages of the given file.
+        """
+        self.file = file
+        Profiler.active = self
+        return self
+
+    def stop(self):
+        """
+        Stop recording.
+        """
+        Profiler.active = None
+
+    @contextlib.contextmanager
+    def stage(self, name, file=None):
+        """
+        Context manager recording the wall and CPU time of a stage. It yields the record, where additional statistics can be added
+        (e.g. the function evaluations of curve_fit).
+
+        Args:
+        ----------
+            name (str): the name of the stage.
+            file (str, optional): the file being analyzed. Defaults to the one given to start().
+        """
+        record = {"file": self.file if file is None else file, "stage": name}
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = time.perf_counter() - wall
+            record["cpu_s"] = time.process_time() - cpu
+            self.records.append(record)
+
+    def summary(self):
+        """
+        Returns the statistics of each stage: number of calls, total and mean wall time, total CPU time
+        and, for the curve fits, the mean and max number of function evaluations.
+        """
+        records = pd.DataFrame(self.records, columns=["file", "stage", "wall_s", "cpu_s", "nfev"])
+        summary = records.groupby("stage").agg(
+            calls=("wall_s", "size"),
+            wall_s=("wall_s", "sum"),
+            mean_wall_s=("wall_s", "mean"),
+            cpu_s=("cpu_s", "sum"),
+            mean_nfev=("nfev", "mean"),
+            max_nfev=("nfev", "max"),
+        )
+        return summary.sort_values("wall_s", ascending=False).dropna(axis=1, how="all")
+
+    def file_summary(self):
+        """
+        Returns the wall time of each stage (columns, "total" for the whole file) of each file (rows), with the peak memory of the process analyzing it.
+        """
+        records = pd.DataFrame(self.records, columns=["file", "stage", "wall_s", "peak_memory_mb"])
+        files = records.pivot_table(index="file", columns="stage", values="wall_s", aggfunc="sum").rename(columns={"file": "total"})
+        files.columns.name = None
+        files["peak_memory_mb"] = records.groupby("file")["peak_memory_mb"].max()
+        return files
+
+    def save(self, folder):
+        """
+        Save the summaries as sipm_profile.json and every record as sipm_profile.csv in folder.
+
+        Args:
+        ----------
+            folder (str): the destination folder.
+
+        Returns:
+        ----------
+            json_path (str): the path of the .json profile.
+        """
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        pd.DataFrame(self.records).to_csv(os.path.join(folder, "sipm_profile.csv"), index=False)
+        profile = {
+            "stages": json.loads(self.summary().reset_index().to_json(orient="records")),
+            "files": json.loads(self.file_summary().reset_index().to_json(orient="records")),
+            "peak_memory_mb": peak_memory_mb(),
+        }
+        json_path = os.path.join(folder, "sipm_profile.json")
+        with open(json_path, "w") as file:
+            json.dump(profile, file, indent=1)
+        return json_path
+
+
+def profile_stage(name):
+    """
+    Returns a context manager recording the stage in the active Profiler, or doing nothing if no Profiler is active.
+    In both cases it yields a dict where additional statistics of the stage can be stored.
+    """
+    if Profiler.active is None:
+        return contextlib.nullcontext({})
+    return Profiler.active.stage(name)
+
+
+def profiled_file_analyzer(file, savepath, **analyzer_args):
+    """
+    file_analyzer() with an active Profiler, for DirReader.dir_analyzer(profile=True) (also in the worker processes).
+
+    Returns:
+    ----------
+        (table, records): the results of the file (see file_analyzer) and the profile records of its analysis.
+    """
+    profiler = Profiler().start(file)
+    try:
+        with profiler.stage("file") as record:
+            table = file_analyzer(file, savepath, **analyzer_args)
+        record["peak_memory_mb"] = peak_memory_mb()
+    finally:
+        profiler.stop()
+    return table, profiler.records
+
+
+def peak_memory_mb():
+    """
+    Returns the peak resident memory of the process in MB, None where it is not available (Windows).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10  # bytes on macOS, kB on Linux
+
+
+###############################################################################
+#                                Results store                                #
+###############################################################################
+
+
+class Manifest:
+    """
+    JSON manifest of the analyzed ARDU files, used by DirReader.dir_analyzer to re-analyze only new or changed files.
+    For each file it records the size, modification time and sha256 hash of the input, the analysis parameters, the code version and the produced outputs.
+
+    Parameters:
+    ----------
+        path (str): the path of the manifest (created on save if missing).
+        params (dict): the analysis parameters of the current run.
+
+    Methods:
+    ----------
+        is_current(file, outputs): Check if a file was already analyzed with the current parameters and code, and its outputs still exist.
+        update(file, outputs): Record a file as analyzed.
+        save(): Write the manifest.
+    """
+
+    def __init__(self, path, params):
+        """
+        Load the manifest from path, if it exists.
+
+        Args:
+        ----------
+            path (str): the path of the manifest.
+            params (dict): the analysis parameters of the current run.
+        """
+        self.path = path
+        self.params = params
+        self.code_version = code_version()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r") as manifest:
+                self.entries = json.load(manifest)
+
+    def is_current(self, file, outputs):
+        """
+        Check if a file was already analyzed with the current parameters and code version, and its outputs still exist.
+        The input hash is evaluated only when the size or modification time of the file changed.
+
+        Args:
+        ----------
+            file (str): the path of the ARDU file.
+            outputs (list): the paths of the results and plots of the file.
+
+        Returns:
+        ----------
+            bool: True if the file doesn't need to be analyzed again.
+        """
+        entry = self.entries.get(os.path.abspath(file))
+        if entry is None or entry["params"] != self.params or entry["code_version"] != self.code_version:
+            return False
+        if not all(os.path.exists(output) for output in outputs):
+            return False
+        stat = os.stat(file)
+        if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return True
+        return entry["size"] == stat.st_size and entry["sha256"] == file_hash(file)
+
+    def update(self, file, outputs):
+        """
+        Record a file as analyzed with the current parameters and code version.
+
+        Args:
+        ----------
+            file (str): the path of the ARDU file.
+            outputs (list): the paths of the results and plots of the file.
+
+        Returns:
+        ----------
+            None
+        """
+        stat = os.stat(file)
+        entry = self.entries.get(os.path.abspath(file), {})
+        if entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+            sha256 = entry["sha256"]  # Unchanged file, no need to hash it again
+        else:
+            sha256 = file_hash(file)
+        self.entries[os.path.abspath(file)] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": sha256,
+            "params": self.params,
+            "code_version": self.code_version,
+            "outputs": [os.path.abspath(output) for output in outputs],
+        }
+
+    def save(self):
+        """
+        Write the manifest.
+        """
+        folder = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(self.path, "w") as manifest:
+            json.dump(self.entries, manifest, indent=1)
+
+
+class ResultsStore:
+    """
+    Consolidated SQLite store of the SiPM results, with a "forward" and a "reverse" table.
+    Each row is a SiPM result tagged with the dataset, ardu, test, temp and direction of its file (see Single.tagged_results),
+    so that comparisons across campaigns don't need to re-read the single *_results.csv files.
+
+    Parameters:
+    ----------
+        path (str): the path of the SQLite file (created if missing).
+
+    Methods:
+    ----------
+        append(table): Add the results of a file, replacing any previous result of the same file.
+        load(direction): Read a whole table.
+    """
+
+    KEYS = ["dataset", "ardu", "test", "temp", "direction"]
+
+    def __init__(self, path):
+        """
+        Initialize the store with the path of the SQLite file, creating its folder if needed.
+
+        Args:
+        ----------
+            path (str): the path of the SQLite file.
+        """
+        self.path = path
+        folder = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+    @staticmethod
+    def table_name(direction):
+        """
+        Returns the table ("forward" or "reverse") of the given direction.
+        """
+        return "forward" if direction in ("f", "forward") else "reverse"
+
+    def append(self, table):
+        """
+        Add the results of a file, replacing any previous result with the same dataset, ardu, test, temp and direction.
+
+        Args:
+        ----------
+            table (pandas.DataFrame): the tagged results of a single file.
+
+        Returns:
+        ----------
+            None
+        """
+        if len(table) == 0:
+            return
+        name = self.table_name(table["direction"].iloc[0])
+        key = [str(table[column].iloc[0]) for column in self.KEYS]
+
+        with sqlite3.connect(self.path) as con:
+            columns = [row[1] for row in con.execute(f"PRAGMA table_info({name})")]
+            if columns:
+                con.execute(f"DELETE FROM {name} WHERE " + " AND ".join(f"{column} = ?" for column in self.KEYS), key)
+                for column in table.columns:
+                    if column not in columns:  # New result columns are added to the existing table
+                        con.execute(f'ALTER TABLE {name} ADD COLUMN "{column}"')
+            table.astype({column: str for column in self.KEYS}).to_sql(name, con, if_exists="append", index=False)
+            con.execute(f"CREATE INDEX IF NOT EXISTS {name}_keys ON {name} ({', '.join(self.KEYS)}, SiPM)")
+
+    def load(self, direction):
+        """
+        Read a whole table of the store.
+
+        Args:
+        ----------
+            direction (str): "forward" (or "f") for the R_q results, anything else for the V_bd results.
+
+        Returns:
+        ----------
+            table (pandas.DataFrame): the stored results, empty if there are none.
+        """
+        name = self.table_name(direction)
+        with sqlite3.connect(self.path) as con:
+            if not list(con.execute(f"PRAGMA table_info({name})")):
+                return pd.DataFrame(columns=self.KEYS)
+            return pd.read_sql_query(f"SELECT * FROM {name}", con)
+
+
+class Catalog:
+    """
+    Index of the SiPM results by dataset, date, temperature, Arduino, test number, direction and SiPM, built once from a ResultsStore
+    (or from in-memory results) to select the results of any comparison without re-reading them.
+    The date is taken from the dataset name (e.g. HPK_LN2_08_06_2022), and a physical SiPM is identified by its Arduino and SiPM numbers.
+
+    Parameters:
+    ----------
+        results (dict): {"forward": DataFrame, "reverse": DataFrame} in the ResultsStore format.
+
+    Methods:
+    ----------
+        from_store(store): Build the catalog from a ResultsStore or its path.
+        datasets(): Return the datasets in the catalog.
+        select(direction, **filters): Return the results matching the filters.
+        track(quantity, **filters): Return the results of each SiPM across the tests matching the filters.
+    """
+
+    LEVELS = ["dataset", "date", "temp", "ardu", "test", "direction", "SiPM"]
+
+    def __init__(self, results):
+        """
+        Index the forward and reverse results.
+
+        Args:
+        ----------
+            results (dict): {"forward": DataFrame, "reverse": DataFrame} in the ResultsStore format.
+        """
+        self.tables = {name: self.index_table(results.get(name, pd.DataFrame())) for name in ("forward", "reverse")}
+
+    @classmethod
+    def from_store(cls, store):
+        """
+        Build the catalog from a ResultsStore or its path.
+        """
+        store = ResultsStore(store) if isinstance(store, str) else store
+        return cls({"forward": store.load("forward"), "reverse": store.load("reverse")})
+
+    @classmethod
+    def index_table(cls, table):
+        """
+        Returns a copy of a results table indexed (and sorted) by the catalog levels, with numeric ardu, test and SiPM.
+        """
+        table = table.copy()
+        for level in cls.LEVELS:
+            if level not in table:
+                table[level] = np.nan
+        table["date"] = dataset_date(table["dataset"].astype(str))
+        for level in ("ardu", "test", "SiPM"):
+            table[level] = pd.to_numeric(table[level], errors="coerce")
+        return table.set_index(cls.LEVELS).sort_index()
+
+    def datasets(self):
+        """
+        Returns the sorted names of the datasets in the catalog.
+        """
+        return sorted(set().union(*(table.index.unique("dataset") for table in self.tables.values())))
+
+    def select(self, direction, **filters):
+        """
+        Return the results of a direction matching all the filters.
+
+        Args:
+        ----------
+            direction (str): "forward" (or "f") for the R_q results, anything else for the V_bd results.
+            **filters: level=value pairs, where value is a single value, a list of accepted values
+                or a function of the level values returning a mask (e.g. date=lambda date: date.month == 4).
+
+        Returns:
+        ----------
+            selection (pandas.DataFrame): the matching results, with the levels as columns.
+        """
+        table = self.tables[ResultsStore.table_name(direction)]
+        mask = np.ones(len(table), dtype=bool)
+        for level, value in filters.items():
+            values = table.index.get_level_values(level)
+            if callable(value):
+                mask &= np.asarray(value(values), dtype=bool)
+            elif isinstance(value, (list, tuple, set)):
+                mask &= values.isin(list(value))
+            else:
+                mask &= values == value
+        return table[mask].reset_index()
+
+    def track(self, quantity="V_bd", **filters):
+        """
+        Longitudinal view of the SiPMs: join the results of each SiPM (Arduino and SiPM number) across all the tests matching the filters,
+        e.g. track("V_bd", temp="LN2") follows the breakdown voltage of every SiPM over the LN2 campaigns.
+
+        Args:
+        ----------
+            quantity (str, optional): the result to track, "R_quenching" or "V_bd" (or their _std). Defaults to "V_bd".
+            **filters: see select().
+
+        Returns:
+        ----------
+            tracks (pandas.DataFrame): one row per SiPM (indexed by ardu and SiPM) and one column per (date, dataset, test).
+        """
+        direction = "forward" if quantity.startswith("R_quenching") else "reverse"
+        selection = self.select(direction, **filters)
+        return selection.pivot_table(index=["ardu", "SiPM"], columns=["date", "dataset", "test"], values=quantity)
+
+
+###############################################################################
+#                                Output pipeline                              #
+###############################################################################
+
+
+class WriteBehind:
+    """
+    Write-behind stage of the outputs: the results .csv files, the plots and the store updates are queued as jobs
+    and run by a background thread in submission order, so that the next ARDU file can be analyzed while the outputs of the previous one are written.
+    The queue is bounded (submit() waits when max_pending jobs are queued), which also bounds the data kept alive by the pending jobs.
+    The first failed job stops the writing: the error is raised by the next submit(), flush() or close().
+
+    Parameters:
+    ----------
+        max_pending (int, optional): the maximum number of queued jobs. Defaults to 4.
+
+    Methods:
+    ----------
+        submit(func, *args, label="", **kwargs): Queue the call func(*args, **kwargs).
+        flush(): Wait for all the queued jobs to be done.
+        close(): Flush and stop the writer thread.
+        abort(): Stop the writer thread without raising the errors of the jobs.
+    """
+
+    def __init__(self, max_pending=4):
+        """
+        Initialize the queue and start the writer thread.
+        """
+        self.jobs = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="WriteBehind", daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:  # Stop the writer without hiding the original error
+            self.abort()
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                if job is None:
+                    return
+                func, args, kwargs, label = job
+                if self.error is None:  # After a failure the remaining jobs are dropped
+                    try:
+                        func(*args, **kwargs)
+                    except Exception as err:
+                        self.error = (label, err)
+            finally:
+                self.jobs.task_done()
+
+    def raise_error(self):
+        """
+        Raise the error of the first failed job, if any.
+        """
+        if self.error is not None:
+            label, err = self.error
+            raise RuntimeError(f"Writing the outputs of {label or 'a job'} failed: {type(err).__name__}: {err}") from err
+
+    def submit(self, func, *args, label="", **kwargs):
+        """
+        Queue the call func(*args, **kwargs), waiting if the queue is full.
+
+        Args:
+        ----------
+            func (callable): the job.
+            *args, **kwargs: the arguments of func, that must not be modified after the submission.
+            label (str, optional): a name of the job (e.g. the ARDU file), reported if it fails. Defaults to "".
+
+        Returns:
+        ----------
+            None
+        """
+        self.raise_error()
+        if not self.thread.is_alive():
+            raise RuntimeError("The WriteBehind writer is closed")
+        self.jobs.put((func, args, kwargs, label))
+
+    def flush(self):
+        """
+        Wait for all the queued jobs to be done, then raise the error of the first failed job, if any.
+        """
+        self.jobs.join()
+        self.raise_error()
+
+    def close(self):
+        """
+        Flush the queued jobs and stop the writer thread.
+        """
+        self.abort()
+        self.raise_error()
+
+    def abort(self):
+        """
+        Stop the writer thread after the jobs already queued, without raising their errors (e.g. when the run is interrupted by another error).
+        """
+        if self.thread.is_alive():
+            self.jobs.put(None)
+            self.thread.join()
+
+
+######################################################################
+#                             Plot rendering                         #
+######################################################################
+
+
+def page_figure(**kwargs):
+    """
+    Create a figure with its own Agg canvas, outside pyplot: the pages can be rendered by any thread (e.g. a WriteBehind)
+    whatever the pyplot backend, and the figure is freed as soon as it is no longer referenced.
+
+    Args:
+    ----------
+        **kwargs: keyword arguments forwarded to matplotlib.figure.Figure (e.g. figsize, dpi).
+
+    Returns:
+    ----------
+        fig (matplotlib.figure.Figure): the new figure.
+    """
+    fig = figure.Figure(**kwargs)
+    backend_agg.FigureCanvasAgg(fig)
+    return fig
+
+
+class PageRenderer:
+    """
+    Draws the forward or reverse IV curve page of a SiPM on a single figure (see page_figure) that is reused for every SiPM:
+    the artists are created once and only their data, labels and axis limits are updated for each page.
+
+    Parameters:
+    ----------
+        direction (str): "f" for forward curves, anything else for reverse curves.
+
+    Attributes:
+    ----------
+        fig (matplotlib.figure.Figure): the reused figure.
+
+    Methods:
+    ----------
+        draw(data, result): Update the figure with the data and fit results of a SiPM.
+        close(): Release the figure.
+    """
+
+    def __init__(self, direction):
+        """
+        Create the figure and the (empty) artists of the page.
+
+        Args:
+        ----------
+            direction (str): "f" for forward curves, anything else for reverse curves.
+        """
+        self.forward = direction == "f"
+        self.fig = page_figure()
+        self.ax = self.fig.subplots()
+        self.ax.set_xlabel("Voltage (V)")
+        self.ax.set_ylabel("Current(mA)")
+        self.ax.grid("on")
+
+        if self.forward:
+            self.data = self.ax.errorbar([], [], [], marker=".", zorder=1)
+            (self.fit,) = self.ax.plot([], [], color="darkorange", linewidth=1.2, zorder=2)
+        else:
+            self.ax.set_yscale("log")
+            self.data = self.ax.errorbar([], [], [], marker=".", label="Data")
+            self.ax.legend(loc="upper right")
+
+            self.ax2 = self.ax.twinx()
+            self.ax2.tick_params(axis="y", colors="darkgreen")
+            self.ax2.set_ylabel(r"$I^{-1} \frac{dI}{dV}$", color="darkgreen")
+            self.derivative = self.ax2.scatter([], [], marker="o", s=5, color="darkgreen", label="Derivative")
+            (self.poly,) = self.ax2.plot([], [], color="darkturquoise", label="5th-deg polynomial")
+            (self.gauss,) = self.ax2.plot([], [], color="darkorange", label="Gaussian around peak")
+            self.v_bd = self.ax2.axvline(0, color="gold")
+
+    def draw(self, data, result):
+        """
+        Update the figure with the data and fit results of a SiPM.
+
+        Args:
+        ----------
+            data (pandas.DataFrame): pd DataFrame containing the data of a single SiPM.
+            result (pandas.Series): the row of the fwd_engine/rev_engine results of the SiPM (named after the SiPM number).
+
+        Returns:
+        ----------
+            fig (matplotlib.figure.Figure): the updated figure.
+        """
+        x = data["V"].to_numpy(dtype=float)
+        y = data["I"].to_numpy(dtype=float)
+        y_err = data["I_err"].to_numpy(dtype=float)
+        data_line, caplines, (bars, *_) = self.data.lines
+        data_line.set_data(x, y)
+        bars.set_segments(np.stack([np.column_stack([x, y - y_err]), np.column_stack([x, y + y_err])], axis=1))
+
+        if self.forward:
+            self.fig.suptitle(f"Forward IV curve: SiPM {result.name}")
+            lin_x = x[x >= result["start"]]  # The conditions are there to plot only on the linear part of the curve
+            self.fit.set_data(lin_x, result["m"] * lin_x + result["q"])  # Find y values via linear regression
+            self.fit.set_label(f'Linear fit: Rq = ({result["R_quenching"]:.2f} $\pm$ {result["R_quenching_std"]:.2f}) $\Omega$')
+            self.ax.legend(loc="upper left")
+        else:
+            self.fig.suptitle(f"Reverse IV curve: SiPM {result.name}")
+            V_bd = result["V_bd"]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                derivative = norm_derivative(x, y)
+            x_gauss = x[np.logical_and(x >= (V_bd - result["width"] / 2), x <= (V_bd + result["width"] / 2))]
+
+            self.derivative.set_offsets(np.column_stack([x, derivative]))
+            self.poly.set_data(x, np.polynomial.polynomial.polyval(x, result[COEF_COLUMNS].to_numpy(dtype=float)))
+            self.gauss.set_data(x_gauss, gauss(x_gauss, *result[GAUSS_COLUMNS].to_numpy(dtype=float)))
+            self.v_bd.set_xdata([V_bd, V_bd])
+            self.v_bd.set_label(f"$V_{{Bd}}$ = {V_bd:.2f} $\pm$ {abs(result['V_bd_std']):.2f} V")
+            self.ax2.legend(loc="upper left")
+
+            finite = np.isfinite(derivative)
+            rescale(self.ax2, [np.column_stack([x[finite], derivative[finite]])])
+
+        rescale(self.ax, [np.column_stack([x, y - y_err]), np.column_stack([x, y + y_err])])
+        return self.fig
+
+    def close(self):
+        """
+        Release the figure.
+        """
+        self.fig.clear()
+
+
+def render_pages(direction, data, results, output, dpi=100):
+    """
+    Render the pages of the given SiPMs with a single PageRenderer.
+
+    Args:
+    ----------
+        direction (str): "f" for forward curves, anything else for reverse curves.
+        data (pandas.DataFrame): the data of the SiPMs, sorted by SiPM and Step.
+        results (pandas.DataFrame): the fwd_engine/rev_engine results, indexed by SiPM.
+        output (matplotlib.backends.backend_pdf.PdfPages, str or None): the PdfPages where to save the pages, the folder where to save one PNG for each SiPM,
+            or None to return the pages as images.
+        dpi (int, optional): resolution of the PNG and raster pages. Defaults to 100.
+
+    Returns:
+    ----------
+        images (list): the RGBA arrays of the pages if output is None, otherwise an empty list.
+    """
+    renderer = PageRenderer(direction)
+    images = []
+    for sipm_number, sipm_data in data.groupby("SiPM"):
+        with profile_stage("render_page"):
+            fig = renderer.draw(sipm_data, results.loc[sipm_number])
+            if isinstance(output, backend_pdf.PdfPages):
+                output.savefig(fig)
+            elif output is not None:
+                fig.savefig(os.path.join(output, f"SiPM_{sipm_number}.png"), dpi=dpi)
+            else:
+                fig.set_dpi(dpi)
+                fig.canvas.draw()
+                images.append(np.asarray(fig.canvas.buffer_rgba()).copy())
+    renderer.close()
+    return images
+
+
+def raster_page(pdf, image, dpi, page=None):
+    """
+    Add a page rendered as an image to a PdfPages, reusing the figure of the previous page if given.
+
+    Args:
+    ----------
+        pdf (matplotlib.backends.backend_pdf.PdfPages): the PdfPages where to save the page.
+        image (numpy.ndarray): the RGBA array of the page.
+        dpi (int): resolution of the image.
+        page (matplotlib.image.FigureImage, optional): the image artist returned for the previous page. Defaults to None.
+
+    Returns:
+    ----------
+        page (matplotlib.image.FigureImage): the image artist, to be passed again for the next page.
+    """
+    if page is None:
+        fig = page_figure(figsize=(image.shape[1] / dpi, image.shape[0] / dpi), dpi=dpi)
+        page = fig.figimage(image)
+    else:
+        page.set_data(image)
+    pdf.savefig(page.figure, dpi=dpi)
+    return page
+
+
+def rescale(ax, points):
+    """
+    Recompute the data limits of ax from its lines and the given points (needed for collections, which are ignored by Axes.relim), and autoscale it.
+
+    Args:
+    ----------
+        ax (matplotlib.axes.Axes): the axes to rescale.
+        points (list): (N x 2) arrays of x, y points to include in the limits.
+
+    Returns:
+    ----------
+        None
+    """
+    ax.relim()
+    for xy in points:
+        if len(xy) > 0:
+            ax.update_datalim(xy)
+    ax.autoscale_view()
+
+
+######################################################################
+#           Mathematical functions and other static methods          #
+######################################################################
+
+
+def read_ardu(path, engine="c"):
+    """
+    Read an ARDU file in a single pass with explicit dtypes (SiPM and Step as small ints, V, I and I_err as float64).
+    The lines before the header (e.g. comments on top of the file) are skipped and the data is sorted by SiPM and Step only if it is not already ordered.
+
+    Args:
+    ----------
+        path (str): the path of the ARDU file.
+        engine (str, optional): the pandas csv engine, "c" or "pyarrow". Falls back to "c" (with a warning) if pyarrow is not installed. Defaults to "c".
+
+    Returns:
+    ----------
+        df_sorted (pandas.DataFrame): the data sorted by SiPM and Step.
+    """
+    if engine == "pyarrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            warnings.warn("pyarrow not installed, using the default csv engine")
+            engine = "c"
+
+    with open(path, "r") as file:
+        columns, header_row = find_header(file, path)
+        dtypes = {name: dtype for name, dtype in ARDU_DTYPES.items() if name in columns}
+        data_start = file.tell()
+
+        def read(dtype):
+            if engine == "pyarrow":
+                return pd.read_csv(path, skiprows=header_row, dtype=dtype, engine="pyarrow")
+            file.seek(data_start)
+            return pd.read_csv(file, header=None, names=columns, dtype=dtype)
+
+        try:
+            df = read(dtypes)
+        except ValueError:  # SiPM or Step written as floats (e.g. "0.0") or missing, pyarrow's ArrowInvalid is a ValueError too
+            df = read(dict.fromkeys(dtypes, "float64"))
+            for name in ("SiPM", "Step"):
+                values = df[name].to_numpy()
+                if name in dtypes and np.isfinite(values).all() and (values == np.round(values)).all():
+                    df[name] = values.astype(ARDU_DTYPES[name])
+
+    sipm = df["SiPM"].to_numpy()
+    step = df["Step"].to_numpy()
+    ordered = np.all((sipm[1:] > sipm[:-1]) | ((sipm[1:] == sipm[:-1]) & (step[1:] > step[:-1])))
+    if not ordered:
+        df = df.sort_values(by=["SiPM", "Step"], ignore_index=True)
+    return df
+
+
+def find_header(file, path):
+    """
+    Skip the lines of an open ARDU file until the header (useful if the file contains comments on top), leaving the file at the first data row.
+
+    Args:
+    ----------
+        file (file object): the open ARDU file.
+        path (str): the path of the ARDU file, for the error message.
+
+    Returns:
+    ----------
+        (columns, header_row): the column names and the line number of the header.
+    """
+    header_row = 0
+    line = file.readline()
+    while line and "SiPM" not in line:
+        header_row += 1
+        line = file.readline()
+    if not line:
+        raise ValueError(f"Header not found in {path}")
+    return [name.strip() for name in line.split(",")], header_row
+
+
+def cache_paths(path):
+    """
+    Returns the paths of the binary cache of an ARDU file: the .npy array and the .json sidecar, next to the csv file.
+    """
+    base = os.path.splitext(path)[0]
+    return f"{base}.npy", f"{base}.json"
+
+
+def write_cache(path, df_sorted, fileinfo):
+    """
+    Save the sorted data of an ARDU file as a (SiPM x step x column) float64 .npy array, NaN-padded like sipm_matrix(),
+    with a .json sidecar holding the file metadata, the SiPM numbers, their number of steps and the size and modification time of the csv file.
+    The sidecar is written last, so a cache without it is never read.
+
+    Args:
+    ----------
+        path (str): the path of the ARDU file.
+        df_sorted (pandas.DataFrame): the data sorted by SiPM and Step.
+        fileinfo (dict): the metadata of the file (see Single.get_fileinfo).
+
+    Returns:
+    ----------
+        array_path (str): the path of the .npy cache.
+    """
+    array_path, sidecar_path = cache_paths(path)
+    columns = [column for column in ARDU_DTYPES if column in df_sorted and column != "SiPM"]
+    sipms, arrays = sipm_matrix(df_sorted, columns)
+    np.save(array_path, np.stack(arrays, axis=2))
+
+    stat = os.stat(path)
+    sidecar = {
+        "version": CACHE_VERSION,
+        "source": {"size": stat.st_size, "mtime": stat.st_mtime},
+        "fileinfo": fileinfo,
+        "columns": columns,
+        "sipms": sipms.tolist(),
+        "n_steps": df_sorted.groupby("SiPM", sort=True).size().tolist(),
+    }
+    with open(sidecar_path, "w") as file:
+        json.dump(sidecar, file)
+    return array_path
+
+
+def load_cache(path):
+    """
+    Memory-map the binary cache of an ARDU file, if it exists and is up to date (same size and modification time of the csv file).
+
+    Args:
+    ----------
+        path (str): the path of the ARDU file.
+
+    Returns:
+    ----------
+        (fileinfo, df_sorted, cache): the metadata, the sorted data of the file and its (SiPM x step) arrays (see cache_frame),
+            None if there is no valid cache.
+    """
+    cache = open_cache(path)
+    if cache is None:
+        return None
+    sidecar, array = cache
+    return (sidecar["fileinfo"], *cache_frame(sidecar, array))
+
+
+def open_cache(path):
+    """
+    Memory-map the .npy array of the binary cache of an ARDU file, if the cache exists and is up to date.
+
+    Args:
+    ----------
+        path (str): the path of the ARDU file.
+
+    Returns:
+    ----------
+        (sidecar, array): the content of the .json sidecar and the memory-mapped array, None if there is no valid cache.
+    """
+    array_path, sidecar_path = cache_paths(path)
+    if not (os.path.exists(array_path) and os.path.exists(sidecar_path)):
+        return None
+    with open(sidecar_path, "r") as file:
+        sidecar = json.load(file)
+    if sidecar.get("version") != CACHE_VERSION:
+        return None
+    if os.path.exists(path):
+        stat = os.stat(path)
+        if sidecar["source"] != {"size": stat.st_size, "mtime": stat.st_mtime}:
+            return None  # stale cache, the csv was modified
+    return sidecar, np.load(array_path, mmap_mode="r")
+
+
+def cache_frame(sidecar, array, first=0, last=None):
+    """
+    Build the sorted data of the SiPMs first:last of a binary cache, together with a reference to their rows of the memory-mapped array.
+
+    Args:
+    ----------
+        sidecar (dict): the content of the .json sidecar.
+        array (numpy.memmap): the memory-mapped array.
+        first (int, optional): position of the first SiPM. Defaults to 0.
+        last (int, optional): position after the last SiPM, None for all the SiPMs. Defaults to None.
+
+    Returns:
+    ----------
+        (df_sorted, cache): the data sorted by SiPM and Step and a dict with the SiPM numbers, the columns and the memory-mapped rows,
+            to be passed to sipm_matrix() together with this df_sorted.
+    """
+    array = array[first:last]
+    sipms = np.asarray(sidecar["sipms"][first:last])
+    n_steps = np.asarray(sidecar["n_steps"][first:last])
+    rows = np.arange(array.shape[1]) < n_steps[:, None]
+    df_sorted = pd.DataFrame({"SiPM": np.repeat(sipms, n_steps).astype(ARDU_DTYPES["SiPM"])})
+    for k, column in enumerate(sidecar["columns"]):
+        df_sorted[column] = array[:, :, k][rows].astype(ARDU_DTYPES[column])
+    return df_sorted, {"sipms": sipms, "columns": sidecar["columns"], "array": array, "rows": len(df_sorted)}
+
+
+def read_ardu_batches(path, batch_rows=500000, chunk_rows=500000):
+    """
+    Read an ARDU file as a sequence of batches of whole SiPMs, each with at most batch_rows rows (a SiPM with more rows has its own batch),
+    so that the memory used doesn't depend on the number of SiPMs in the file.
+    - From a binary cache (see write_cache), each batch is a slice of the memory-mapped array.
+    - From the csv file, a first pass counts the rows of each SiPM and a second pass writes the rows of each batch to a temporary
+      binary file; both passes read chunk_rows rows at a time. Files that fit in a single batch are read at once by read_ardu().
+
+    Args:
+    ----------
+        path (str): the path of the ARDU file.
+        batch_rows (int, optional): the maximum number of rows of a batch. Defaults to 500000.
+        chunk_rows (int, optional): the number of rows read at a time from the csv file. Defaults to 500000.
+
+    Returns:
+    ----------
+        batches (generator): (df_sorted, cache) for each batch: the data sorted by SiPM and Step and, from a binary cache,
+            its (SiPM x step) arrays (see cache_frame), else None.
+    """
+    cache = open_cache(path)
+    if cache is not None:
+        sidecar, array = cache
+        for first, last in batch_bounds(np.asarray(sidecar["n_steps"]), batch_rows):
+            yield cache_frame(sidecar, array, first, last)
+        return
+
+    # First pass: rows of each SiPM
+    counts = pd.Series(dtype="int64")
+    with open(path, "r") as file:
+        columns, _ = find_header(file, path)
+        for chunk in pd.read_csv(file, header=None, names=columns, usecols=["SiPM"], dtype="float64", chunksize=chunk_rows):
+            counts = counts.add(chunk["SiPM"].value_counts(), fill_value=0)
+    counts = counts.sort_index().astype("int64")
+    bounds = batch_bounds(counts.to_numpy(), batch_rows)
+    if len(bounds) <= 1:
+        yield read_ardu(path), None
+        return
+
+    # Second pass: rows of each batch to a temporary binary file
+    batch_of = pd.Series(np.repeat(np.arange(len(bounds)), [last - first for first, last in bounds]), index=counts.index)
+    with tempfile.TemporaryDirectory() as spill_dir:
+        with open(path, "r") as file:
+            find_header(file, path)
+            for chunk in pd.read_csv(file, header=None, names=columns, dtype="float64", chunksize=chunk_rows):
+                batch = batch_of.loc[chunk["SiPM"]].to_numpy()
+                for idx in np.unique(batch):
+                    with open(os.path.join(spill_dir, f"batch_{idx}.bin"), "ab") as spill:
+                        chunk.to_numpy()[batch == idx].tofile(spill)
+
+        for idx in range(len(bounds)):
+            spill_path = os.path.join(spill_dir, f"batch_{idx}.bin")
+            df = pd.DataFrame(np.fromfile(spill_path).reshape(-1, len(columns)), columns=columns)
+            os.remove(spill_path)
+            for name in columns:
+                if name in ARDU_DTYPES:
+                    df[name] = df[name].astype(ARDU_DTYPES[name])
+            yield df.sort_values(by=["SiPM", "Step"], ignore_index=True), None
+
+
+def batch_bounds(rows, batch_rows):
+    """
+    Group consecutive SiPMs in batches of at most batch_rows rows (a SiPM with more rows has its own batch).
+
+    Args:
+    ----------
+        rows (numpy.ndarray): the number of rows of each SiPM.
+        batch_rows (int): the maximum number of rows of a batch.
+
+    Returns:
+    ----------
+        bounds (list): the (first, last) positions of the SiPMs of each batch, last excluded.
+    """
+    bounds = []
+    first, total = 0, 0
+    for idx, n in enumerate(rows):
+        if total + n > batch_rows and idx > first:
+            bounds.append((first, idx))
+            first, total = idx, 0
+        total += n
+    if len(rows) > first:
+        bounds.append((first, len(rows)))
+    return bounds
+
+
+def results_table(results, direction, peak_mode="gauss"):
+    """
+    Returns the table saved in the results .csv file: the main results first, then the fit parameters needed to render the plots.
+
+    Args:
+    ----------
+        results (pandas.DataFrame): the output of fwd_engine or rev_engine, indexed by SiPM.
+        direction (str): "f" or "r".
+        peak_mode (str, optional): the peak mode of the reverse analysis, saved in the V_bd_method column. Defaults to "gauss".
+
+    Returns:
+    ----------
+        out_df (pandas.DataFrame): the table to save.
+    """
+    intervals = [column for column in results.columns if column.endswith(("_ci_low", "_ci_high"))]  # bootstrap_engine columns, if any
+    if direction == "f":
+        return results.reset_index()[["SiPM", "R_quenching", "R_quenching_std"] + intervals + ["start", "m", "q"]]
+    out_df = results.reset_index()[["SiPM", "V_bd", "V_bd_std"] + intervals]
+    out_df["V_bd_method"] = peak_mode
+    return out_df.join(results.reset_index()[["width"] + COEF_COLUMNS + GAUSS_COLUMNS])
+
+
+def file_analyzer(file, savepath, **analyzer_args):
+    """
+    Read and analyze a single ARDU file, saving the results and plots in savepath.
+    Defined at module level so that it can be dispatched to the worker processes of DirReader.dir_analyzer.
+
+    Args:
+    ----------
+        file (str): the path of the ARDU file.
+        savepath (str): the folder where the results are saved.
+        **analyzer_args: keyword arguments forwarded to Single.analyzer.
+
+    Returns:
+    ----------
+        table (pandas.DataFrame): the results of the file, tagged with its metadata (see Single.tagged_results).
+    """
+    sipm = Single(file)
+    if not analyzer_args.get("batch_rows"):
+        sipm.reader()
+    sipm.analyzer(savepath=savepath, hide_progress=True, **analyzer_args)  # hide_progress set to True to have a cleaner look on the terminal
+    if sipm.results is None:  # batch analysis, results not kept in memory
+        sipm.load_results(savepath)
+    return sipm.tagged_results(dataset_name(file))
+
+
+def file_sweep(file, **grid):
+    """
+    Read a single ARDU file and evaluate its analysis for a grid of settings.
+    Defined at module level so that it can be dispatched to the worker processes of DirReader.dir_sweep.
+
+    Args:
+    ----------
+        file (str): the path of the ARDU file.
+        **grid: keyword arguments forwarded to Single.sweep.
+
+    Returns:
+    ----------
+        table (pandas.DataFrame): the sweep table of the file, with the columns dataset, ardu, test, temp and direction in front.
+    """
+    sipm = Single(file)
+    sipm.reader()
+    table = sipm.sweep(**grid)
+    for position, (key, value) in enumerate(
+        [("dataset", dataset_name(file))] + [(key, sipm.fileinfo[key]) for key in ["ardu", "test", "temp", "direction"]]
+    ):
+        table.insert(position, key, value)
+    return table
+
+
+def analysis_params(analyzer_args):
+    """
+    Returns the parameters of Single.analyzer that affect the outputs (the defaults updated with analyzer_args), as recorded in the Manifest.
+
+    Args:
+    ----------
+        analyzer_args (dict): keyword arguments given to Single.analyzer.
+
+    Returns:
+    ----------
+        params (dict): e.g. {"room_f_start": 0.75, "ln2_f_start": 1.55, "peak_width": 10, "peak_mode": "gauss", "plots": "pdf"}
+    """
+    params = {
+        name: parameter.default
+        for name, parameter in inspect.signature(Single.analyzer).parameters.items()
+        if parameter.default is not inspect.Parameter.empty
+    }
+    params.update(analyzer_args)
+    for name in ("savepath", "hide_progress", "plot_workers", "batch_rows", "writer"):
+        params.pop(name, None)
+    return params
+
+
+def expected_outputs(file, root_savepath, plots):
+    """
+    Returns the paths of the results .csv file and of the plots (if any) produced by the analysis of an ARDU file.
+
+    Args:
+    ----------
+        file (str): the path of the ARDU file.
+        root_savepath (str): the root directory for saving the analysis results.
+        plots (str): the plots option of Single.analyzer.
+
+    Returns:
+    ----------
+        outputs (list): the paths of the outputs.
+    """
+    sipm = Single(file)
+    sipm.get_fileinfo()
+    savepath = results_savepath(file, root_savepath)
+    outputs = [os.path.join(savepath, f"{sipm.output_name()}_results.csv")]
+    if plots == "png":
+        outputs.append(os.path.join(savepath, sipm.output_name()))
+    elif plots:
+        outputs.append(os.path.join(savepath, f"{sipm.output_name()}.pdf"))
+    return outputs
+
+
+def file_hash(path):
+    """
+    Returns the sha256 hash of a file, read in 1 MB blocks.
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def code_version():
+    """
+    Returns the version of the analysis code, as the (shortened) hash of this module.
+    """
+    return file_hash(os.path.abspath(__file__))[:16]
+
+
+def dataset_date(datasets):
+    """
+    Returns the dates in the dataset names (e.g. HPK_LN2_08_06_2022 -> 2022-06-08), NaT for the names without a date.
+
+    Args:
+    ----------
+        datasets (pandas.Series): the dataset names.
+
+    Returns:
+    ----------
+        dates (pandas.Series): the dates.
+    """
+    return pd.to_datetime(datasets.str.extract(r"(\d{2}_\d{2}_\d{4})", expand=False), format="%d_%m_%Y", errors="coerce")
+
+
+def dataset_name(file):
+    """
+    Returns the dataset of an ARDU file, i.e. the name of the folder containing it ("" if it can't be found).
+
+    Args:
+    ----------
+        file (str): the path of the ARDU file.
+
+    Returns:
+    ----------
+        subfolder (str): the dataset name.
+    """
+    try:
+        subfolder = re.search(r".+[\\/](.+?)[\\/]ARDU_.+", file).group(1)
+    except AttributeError:
+        subfolder = ""
+    return subfolder
+
+
+def results_savepath(file, root_savepath):
+    """
+    Build the root_savepath/results/<subfolder> path where the results of an ARDU file are saved, <subfolder> being the dataset folder of the file.
+
+    Args:
+    ----------
+        file (str): the path of the ARDU file.
+        root_savepath (str): the root directory for saving the analysis results.
+
+    Returns:
+    ----------
+        savepath (str): the save path of the file results.
+    """
+    return os.path.join(root_savepath, "results", dataset_name(file))  # Creates a "results" subdir in the "root_savepath" directory
+
+
+def sipm_matrix(df_sorted, columns, cache=None):
+    """
+    Reshape the sorted data into (SiPM x step) arrays, one for each of the given columns.
+    SiPMs with fewer steps than the longest one are padded with NaN. With the cache of a binary cache file the arrays are returned without copies.
+
+    Args:
+    ----------
+        df_sorted (pandas.DataFrame): the data sorted by SiPM and Step.
+        columns (list): the columns to reshape (e.g. ["V", "I"]).
+        cache (dict, optional): the arrays of this same df_sorted, as returned by load_cache() (Single.cache), None to build them from df_sorted. Defaults to None.
+
+    Returns:
+    ----------
+        sipms (numpy.ndarray): the SiPM numbers, one for each row of the arrays.
+        arrays (list): a (SiPM x step) numpy.ndarray for each column.
+    """
+    if cache is not None and cache["rows"] == len(df_sorted) and all(column in cache["columns"] for column in columns):
+        # Data loaded from the binary cache: views of the memory-mapped array
+        arrays = [np.asarray(cache["array"][:, :, cache["columns"].index(column)]) for column in columns]
+        return cache["sipms"], arrays
+
+    codes, sipms = pd.factorize(df_sorted["SiPM"], sort=True)
+    group_starts = np.r_[0, np.flatnonzero(np.diff(codes)) + 1]
+    step_idx = np.arange(len(codes)) - group_starts[codes]
+
+    arrays = []
+    for column in columns:
+        array = np.full((len(sipms), step_idx.max() + 1), np.nan)
+        array[codes, step_idx] = df_sorted[column].to_numpy(dtype=float)
+        arrays.append(array)
+    return np.asarray(sipms), arrays
+
+
+def fwd_engine(df_sorted, starting_point, cache=None):
+    """
+    Fits the linear part (V >= starting_point) of the forward IV curve of every SiPM at once,
+    with closed-form masked least squares on the (SiPM x step) arrays.
+
+    Args:
+    ----------
+        df_sorted (pandas.DataFrame): the data sorted by SiPM and Step, containing the values of V and I.
+        starting_point (float or str): specifies the starting point from where to isolate the linear data,
+            or "auto" to find the start of each SiPM with fwd_autostart().
+        cache (dict, optional): the cached arrays of df_sorted, see sipm_matrix(). Defaults to None.
+
+    Returns:
+    ----------
+        results (pandas.DataFrame): A DataFrame indexed by SiPM with columns
+            R_quenching, R_quenching_std, start (the one of each SiPM with "auto"), m and q.
+    """
+    sipms, (x, y) = sipm_matrix(df_sorted, ["V", "I"], cache)
+    if isinstance(starting_point, str) and starting_point == "auto":
+        starting_point = fwd_autostart(x, y)
+    R_quenching, R_quenching_std, m, q = (values[0] for values in fwd_fit(x, y, [starting_point]))
+
+    results = pd.DataFrame(
+        {
+            "R_quenching": R_quenching,
+            "R_quenching_std": R_quenching_std,
+            "start": np.broadcast_to(np.asarray(starting_point, dtype=float), R_quenching.shape),
+            "m": m,
+            "q": q,
+        },
+        index=pd.Index(sipms, name="SiPM"),
+    )
+    return results
+
+
+def fwd_autostart(x, y, min_points=5, t_cut=2.0):
+    """
+    Find the start of the linear part of the forward IV curve of every SiPM, in two stages:
+    - the knee is located with a two-segment least squares: for every candidate breakpoint the data before and from it are fitted by two lines,
+      and the breakpoint with the lowest total residuals is the knee (it falls in the middle of the curved part);
+    - the start is the first point from the knee on where the line fitted from it has settled: the mean residual of its first min_points points
+      is within t_cut standard errors of zero, the noise being estimated locally from the second differences of the currents.
+      The curvature of the knee is much smaller than the noise of the whole tail, but it shows up as a systematic offset of its first points.
+    All the candidates are evaluated at once from the cumulative sums of 1, V, I, V^2, V*I and I^2 of each (SiPM x step) row,
+    so the search is O(steps) for each SiPM. On synthetic curves the R_q errors are the same as with the fixed starts (see autostart_benchmark in SiPM_benchmark.py).
+
+    Args:
+    ----------
+        x (numpy.ndarray): (SiPM x step) array of the voltages, increasing along the steps.
+        y (numpy.ndarray): (SiPM x step) array of the currents, NaN-padded.
+        min_points (int, optional): the minimum number of points of each segment, and of the window of the settling test. Defaults to 5.
+        t_cut (float, optional): the settling threshold on the mean residual of the window, in standard errors. Defaults to 2.0.
+
+    Returns:
+    ----------
+        starts (numpy.ndarray): the voltage of the first point of the linear part of each SiPM (the knee if the line never settles),
+            NaN if there are fewer than 2 * min_points points.
+    """
+    valid = np.isfinite(x) & np.isfinite(y)
+    n_valid = valid.sum(axis=1)
+    with np.errstate(invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # Empty SiPMs
+        x_c = np.where(valid, x - np.nanmean(np.where(valid, x, np.nan), axis=1, keepdims=True), 0)  # Centered, for the precision of the sums
+        y_c = np.where(valid, y - np.nanmean(np.where(valid, y, np.nan), axis=1, keepdims=True), 0)
+
+    # sums[..., k] over the steps before k (prefix) and from k on (suffix)
+    terms = np.stack([valid.astype(float), x_c, y_c, x_c * x_c, x_c * y_c, y_c * y_c])
+    prefix = np.concatenate([np.zeros((6, len(x), 1)), np.cumsum(terms, axis=2)], axis=2)
+    suffix = prefix[:, :, -1:] - prefix
+
+    def residuals(sums):
+        n, sx, sy, sxx, sxy, syy = sums
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ss_xx = sxx - sx * sx / n
+            ss_xy = sxy - sx * sy / n
+            ss_yy = syy - sy * sy / n
+            return np.clip(ss_yy - ss_xy * ss_xy / ss_xx, 0, None)
+
+    k = np.arange(prefix.shape[2])[None, :]
+    candidates = (k >= min_points) & (k <= n_valid[:, None] - min_points)
+    total = np.where(candidates, residuals(prefix) + residuals(suffix), np.inf)
+    knee = total.argmin(axis=1)
+
+    # Mean residual of the window k, ..., k + min_points - 1 from the line fitted on the points from k on
+    n, sx, sy, sxx, sxy, _ = suffix
+    window = prefix[:, :, min_points:] - prefix[:, :, :-min_points]
+    window = np.concatenate([window, np.full(window.shape[:2] + (min_points,), np.nan)], axis=2)
+    # Local noise of the window: mean square of the normalized second differences (their variance is 6 sigma^2 for white noise)
+    second = np.where(valid[:, 2:] & valid[:, 1:-1] & valid[:, :-2], np.diff(np.where(valid, y, 0), 2, axis=1), 0) ** 2 / 6
+    second = np.concatenate([np.zeros((len(x), 1)), np.cumsum(second, axis=1)], axis=1)
+    noise = (second[:, min_points - 2:] - second[:, : second.shape[1] - min_points + 2]) / (min_points - 2)
+    noise = np.concatenate([noise, np.full((len(x), prefix.shape[2] - noise.shape[1]), np.nan)], axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        m = (sxy - sx * sy / n) / (sxx - sx * sx / n)
+        mean_residual = window[2] / window[0] - (sy / n + m * (window[1] / window[0] - sx / n))
+        settled = np.abs(mean_residual) <= t_cut * np.sqrt(noise / min_points)
+    settled &= candidates & (k >= knee[:, None])
+    best = np.where(settled.any(axis=1), settled.argmax(axis=1), knee)
+
+    steps = np.arange(len(x))
+    starts = x[steps, np.clip(best, 0, x.shape[1] - 1)]
+    return np.where(candidates[steps, knee] & np.isfinite(total[steps, knee]), starts, np.nan)
+
+
+def fwd_fit(x, y, starting_points):
+    """
+    Closed-form masked least squares of the forward IV curves, for several starting points of the linear part at once.
+
+    Args:
+    ----------
+        x (numpy.ndarray): (SiPM x step) array of the voltages.
+        y (numpy.ndarray): (SiPM x step) array of the currents, NaN-padded.
+        starting_points (list): the starting points from where to isolate the linear data, each one a float or an array with the start of each SiPM.
+
+    Returns:
+    ----------
+        (R_quenching, R_quenching_std, m, q): (starting point x SiPM) arrays of the fit results.
+    """
+    starts = np.array([np.broadcast_to(np.asarray(start, dtype=float), len(x)) for start in starting_points]).reshape(-1, len(x))
+    mask = (x[None] >= starts[:, :, None]) & np.isfinite(y)[None]
+    n = mask.sum(axis=2)
+    x = np.where(mask, x[None], 0)
+    y = np.where(mask, y[None], 0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = x.sum(axis=2) / n
+        y_mean = y.sum(axis=2) / n
+        dx = np.where(mask, x - x_mean[..., None], 0)
+        dy = np.where(mask, y - y_mean[..., None], 0)
+        ss_xx = (dx * dx).sum(axis=2)
+        ss_yy = (dy * dy).sum(axis=2)
+        ss_xy = (dx * dy).sum(axis=2)
+
+        m = ss_xy / ss_xx
+        q = y_mean - m * x_mean
+        stderr = np.sqrt(np.clip(ss_yy - ss_xy * m, 0, None) / (n - 2) / ss_xx)  # same as stats.linregress stderr
+        R_quenching = 1000 / m
+        R_quenching_std = np.fmax(stderr, 0.03 * R_quenching)  # overestimation of the R standard dev
+    return R_quenching, R_quenching_std, m, q
+
+
+@staticmethod
+def rev_analyzer(data, peak_width, peak_mode="gauss"):
+    """
+    Analyze the reverse IV Curve by fitting a 5th-degree polynomial on the data derivative and a gaussian curve on the poly peak.
+
+    Args:
+    ----------
+        data (pandas.DataFrame): pd DataFrame containing the values of V, I and I_err.
+        peak_width (int): The width of the peak to search.
+        peak_mode (str, optional): "gauss" fits the gaussian curve, "analytic" takes the peak from analytic_peak() instead. Defaults to "gauss".
+
+    Returns:
+    ----------
+        values (pandas.Series): A pandas Series containing the following values:
+            V_bd (float): The breakdown voltage, evaluated as the mean of the gaussian curve.
+            V_bd_std (float): The breakdown voltage standard deviation, evaluated as the standard deviation of the gaussian curve.
+            width (float): the FWHM of the gaussian curve.
+            coef_0, ..., coef_5 (float): the 5th-degree polynomial coefficients.
+            gauss_H, gauss_A, gauss_mu, gauss_sigma (float): the parameters of the curve fit of the gaussian.
     """
 
     x = data["V"].to_numpy()
     y = data["I"].to_numpy()
 
-    V_bd = data["V_bd"].iloc[0]
-    poly_coefs = data["coefs"].iloc[0]
-
+    # Evaluation of the 1st derivative
     derivative = norm_derivative(x, y)
-    y_poly = (
-        poly_coefs[0]
-        + poly_coefs[1] * x
-        + poly_coefs[2] * x**2
-        + poly_coefs[3] * x**3
-        + poly_coefs[4] * x**4
-        + poly_coefs[5] * x**5
+
+    # 5th degree polynomial fit
+    fifth_poly = Polynomial.fit(x, derivative, 5)
+    coefs = fifth_poly.convert().coef
+    y_fit = fifth_poly(x)
+
+    # Peak finder
+    peaks = signal.find_peaks(y_fit, width=peak_width)[0]  # width parameter to discard smaller peaks
+    idx_max = peaks[np.argmax(y_fit[peaks])]
+    x_max = x[idx_max]
+    fwhm = x[int(idx_max + peak_width / 2)] - x[int(idx_max - peak_width / 2)]
+
+    # Gaussian fit around the peak
+    if peak_mode == "analytic":
+        params = analytic_peak(fifth_poly.coef[None, :], fifth_poly.domain[None, :], np.array([x_max]))[0]
+    else:
+        params = gauss_peak_fit(x, y_fit, x_max, fwhm)
+
+    # Returning the values
+    values = pd.Series(
+        np.r_[params[2], params[3], fwhm, np.pad(coefs, (0, 6 - len(coefs))), params],
+        index=["V_bd", "V_bd_std", "width"] + COEF_COLUMNS + GAUSS_COLUMNS,
     )
-    x_gauss = x[np.logical_and(x >= (V_bd - data["width"].iloc[0] / 2), x <= (V_bd + data["width"].iloc[0] / 2))]
-    y_gauss = gauss(x_gauss, *data["params"].iloc[0])
-
-    fig, ax = plt.subplots()
-    sipm_number = list(data["SiPM"].drop_duplicates())[0]
-    fig.suptitle(f"Reverse IV curve: SiPM {sipm_number}")
-    ax.set_xlabel("Voltage (V)")
-    ax.set_ylabel("Current(mA)")
-    ax.grid("on")
-
-    ax.set_yscale("log")
-    ax.errorbar(data["V"], data["I"], data["I_err"], marker=".", label="Data")
-    ax.legend(loc="upper right")
-
-    ax2 = ax.twinx()
-    ax2.tick_params(axis="y", colors="darkgreen")
-
-    ax2.set_ylabel(r"$I^{-1} \frac{dI}{dV}$", color="darkgreen")
-    ax2.scatter(x, derivative, marker="o", s=5, color="darkgreen", label="Derivative")
-    ax2.plot(x, y_poly, color="darkturquoise", label="5th-deg polynomial")
-    ax2.plot(x_gauss, y_gauss, color="darkorange", label="Gaussian around peak")
-    ax2.axvline(V_bd, color="gold", label=f"$V_{{Bd}}$ = {V_bd:.2f} $\pm$ {abs(data['V_bd_std'].iloc[0]):.2f} V")
-    ax2.legend(loc="upper left")
-
-    pdf.savefig()
-    plt.close()
+    return values
+
+
+def rev_engine(df_sorted, peak_width, peak_mode="gauss", cache=None):
+    """
+    Batched version of rev_analyzer for all the SiPMs of a file.
+    The normalized derivatives are evaluated on the (SiPM x step) arrays, the 5th-degree polynomials are solved through a single Vandermonde lstsq
+    when the SiPMs share the voltage grid and the peaks are located with poly_peaks(). Only the gaussian fit around each peak is done one SiPM at a time,
+    while with peak_mode="analytic" the peaks of all the SiPMs are evaluated at once by analytic_peak().
+    SiPMs with a different number of steps or non-finite derivatives (e.g. I = 0) are analyzed by rev_analyzer.
+
+    Args:
+    ----------
+        df_sorted (pandas.DataFrame): the data sorted by SiPM and Step, containing the values of V and I.
+        peak_width (int): The width of the peak to search.
+        peak_mode (str, optional): "gauss" or "analytic", see rev_analyzer, any other value raises a ValueError. Defaults to "gauss".
+        cache (dict, optional): the cached arrays of df_sorted, see sipm_matrix(). Defaults to None.
+
+    Returns:
+    ----------
+        results (pandas.DataFrame): A DataFrame indexed by SiPM with the same columns as the rev_analyzer output:
+            V_bd, V_bd_std, width, coef_0, ..., coef_5 and gauss_H, ..., gauss_sigma. SiPMs without a peak wider than peak_width get NaN values.
+    """
+    if peak_mode not in PEAK_MODES:
+        raise ValueError(f"peak_mode must be one of {PEAK_MODES}, got {peak_mode!r}")
+    sipms, (x, y) = sipm_matrix(df_sorted, ["V", "I"], cache)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        derivative = np.gradient(y, axis=1) / np.gradient(x, axis=1) / y
+
+    batched = np.isfinite(derivative).all(axis=1)
+    rows = []  # SiPMs analyzed one by one
+    for sipm in sipms[~batched]:
+        rows.append(rev_analyzer(df_sorted[df_sorted["SiPM"] == sipm], peak_width, peak_mode).rename(sipm))
+
+    x, derivative = x[batched], derivative[batched]
+    y_fit, coefs, scaled_coefs, domains = rev_polyfit(x, derivative)
+    found, fwhm, params = rev_peak_params(x, y_fit, scaled_coefs, domains, peak_width, peak_mode)
+
+    results = pd.DataFrame(
+        np.column_stack([params[:, 2], params[:, 3], np.where(found, fwhm, np.nan), coefs, params]),
+        columns=["V_bd", "V_bd_std", "width"] + COEF_COLUMNS + GAUSS_COLUMNS,
+        index=sipms[batched],
+    )
+    if rows:
+        results = pd.concat([results, pd.DataFrame(rows)]).sort_index()
+    results.index.name = "SiPM"
+    return results
+
+
+def rev_polyfit(x, derivative):
+    """
+    5th-degree polynomial fit of the normalized derivatives of several SiPMs.
+    When the SiPMs share the voltage grid all the fits are solved through a single Vandermonde lstsq, otherwise with Polynomial.fit one by one.
+
+    Args:
+    ----------
+        x (numpy.ndarray): (SiPM x step) array of the voltages.
+        derivative (numpy.ndarray): (SiPM x step) array of the normalized derivatives.
+
+    Returns:
+    ----------
+        (y_fit, coefs, scaled_coefs, domains): the polynomials evaluated on x, their coefficients (unscaled and in the Polynomial.fit window)
+            and their domains.
+    """
+    n_sipm, n_steps = x.shape
+    if n_sipm > 0 and np.allclose(x, x[0]):
+        # 5th degree polynomial fit, shared Vandermonde matrix (same scaling as Polynomial.fit)
+        domain = [x[0].min(), x[0].max()]
+        van = np.polynomial.polynomial.polyvander((2 * x[0] - domain[0] - domain[1]) / (domain[1] - domain[0]), 5)
+        scale = np.sqrt((van * van).sum(axis=0))
+        scaled_coefs = np.linalg.lstsq(van / scale, derivative.T, rcond=n_steps * np.finfo(float).eps)[0] / scale[:, None]
+        y_fit = (van @ scaled_coefs).T
+        to_unscaled = np.zeros((6, 6))
+        for k in range(6):
+            unscaled = Polynomial(np.eye(6)[k], domain=domain).convert().coef
+            to_unscaled[: len(unscaled), k] = unscaled
+        coefs = (to_unscaled @ scaled_coefs).T
+        scaled_coefs = scaled_coefs.T
+        domains = np.tile(domain, (n_sipm, 1))
+    else:
+        fifth_polys = [Polynomial.fit(x_row, d_row, 5) for x_row, d_row in zip(x, derivative)]
+        y_fit = np.array([poly(x_row) for poly, x_row in zip(fifth_polys, x)]).reshape(n_sipm, n_steps)
+        coefs = np.array([poly.convert().coef for poly in fifth_polys]).reshape(n_sipm, 6)
+        scaled_coefs = np.array([poly.coef for poly in fifth_polys]).reshape(n_sipm, 6)
+        domains = np.array([poly.domain for poly in fifth_polys]).reshape(n_sipm, 2)
+    return y_fit, coefs, scaled_coefs, domains
+
+
+def rev_peak_params(x, y_fit, scaled_coefs, domains, peak_width, peak_mode="gauss"):
+    """
+    Find the peak of each fitted polynomial (see poly_peaks) and evaluate its gaussian parameters.
+
+    Args:
+    ----------
+        x (numpy.ndarray): (SiPM x step) array of the voltages.
+        y_fit, scaled_coefs, domains: the outputs of rev_polyfit.
+        peak_width (int): The width of the peak to search.
+        peak_mode (str, optional): "gauss" or "analytic", see rev_analyzer. Defaults to "gauss".
+
+    Returns:
+    ----------
+        (found, fwhm, params): for each SiPM, if a peak was found, its width and the (H, A, mu, sigma) gaussian parameters (NaN without a peak).
+    """
+    # Peak finder
+    n_sipm, n_steps = x.shape
+    idx_max = poly_peaks(y_fit, peak_width)
+    found = idx_max >= 0
+    steps = np.arange(n_sipm)
+    x_max = x[steps, np.clip(idx_max, 0, None)]
+    # Endpoints truncated as int(idx_max +- peak_width / 2) in rev_analyzer, so that odd widths give the same window
+    fwhm = (x[steps, np.clip(np.trunc(idx_max + peak_width / 2).astype(int), 0, n_steps - 1)]
+            - x[steps, np.clip(np.trunc(idx_max - peak_width / 2).astype(int), 0, n_steps - 1)])
+
+    # Gaussian fit around the peak
+    if peak_mode == "analytic":
+        params = analytic_peak(scaled_coefs, domains, x_max)
+    else:
+        params = np.full((n_sipm, 4), np.nan)
+        for i in np.flatnonzero(found):
+            params[i] = gauss_peak_fit(x[i], y_fit[i], x_max[i], fwhm[i])
+    params[~found] = np.nan
+    return found, fwhm, params
+
+
+def fwd_sweep(df_sorted, starting_points, cache=None):
+    """
+    Forward analysis of all the SiPMs of a file for a grid of starting points, in a single vectorized pass (see fwd_fit).
+
+    Args:
+    ----------
+        df_sorted (pandas.DataFrame): the data sorted by SiPM and Step, containing the values of V and I.
+        starting_points (list): the starting points of the linear part to evaluate.
+        cache (dict, optional): the cached arrays of df_sorted, see sipm_matrix(). Defaults to None.
+
+    Returns:
+    ----------
+        sweep (pandas.DataFrame): one row per starting point and SiPM, with columns SiPM, setting, value (R_quenching) and std (R_quenching_std).
+    """
+    sipms, (x, y) = sipm_matrix(df_sorted, ["V", "I"], cache)
+    R_quenching, R_quenching_std, _, _ = fwd_fit(x, y, starting_points)
+    return pd.DataFrame(
+        {
+            "SiPM": np.tile(sipms, len(starting_points)),
+            "setting": np.repeat(np.asarray(starting_points, dtype=float), len(sipms)),
+            "value": R_quenching.ravel(),
+            "std": R_quenching_std.ravel(),
+        }
+    )
+
+
+def rev_sweep(df_sorted, peak_widths, peak_mode="gauss", cache=None):
+    """
+    Reverse analysis of all the SiPMs of a file for a grid of peak widths.
+    The derivatives and the polynomial fits don't depend on the peak width, so they are evaluated once (see rev_polyfit)
+    and only the peak search and the peak parameters (see rev_peak_params) are repeated for each width.
+
+    Args:
+    ----------
+        df_sorted (pandas.DataFrame): the data sorted by SiPM and Step, containing the values of V and I.
+        peak_widths (list): the peak widths to evaluate.
+        peak_mode (str, optional): "gauss" or "analytic", see rev_analyzer. Defaults to "gauss".
+        cache (dict, optional): the cached arrays of df_sorted, see sipm_matrix(). Defaults to None.
+
+    Returns:
+    ----------
+        sweep (pandas.DataFrame): one row per peak width and SiPM, with columns SiPM, setting, value (V_bd) and std (V_bd_std).
+    """
+    sipms, (x, y) = sipm_matrix(df_sorted, ["V", "I"], cache)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        derivative = np.gradient(y, axis=1) / np.gradient(x, axis=1) / y
+    batched = np.isfinite(derivative).all(axis=1)
+    y_fit, _, scaled_coefs, domains = rev_polyfit(x[batched], derivative[batched])
+
+    tables = []
+    for peak_width in peak_widths:
+        _, _, params = rev_peak_params(x[batched], y_fit, scaled_coefs, domains, peak_width, peak_mode)
+        table = pd.DataFrame({"SiPM": sipms[batched], "setting": peak_width, "value": params[:, 2], "std": params[:, 3]})
+        for sipm in sipms[~batched]:  # SiPMs analyzed one by one, as in rev_engine
+            result = rev_analyzer(df_sorted[df_sorted["SiPM"] == sipm], peak_width, peak_mode)
+            table.loc[len(table)] = [sipm, peak_width, result["V_bd"], result["V_bd_std"]]
+        tables.append(table.sort_values("SiPM"))
+    return pd.concat(tables, ignore_index=True)
+
+
+def bootstrap_engine(df_sorted, direction, start=None, peak_width=10, n_resamples=200, ci=0.95, seed=0, max_elements=2**22, cache=None):
+    """
+    Bootstrap confidence intervals of R_quenching (forward) or V_bd (reverse) for all the SiPMs of a file.
+    The resamples of all the SiPMs are drawn as (resample x SiPM x step) arrays and analyzed with batched estimators (see fwd_bootstrap and rev_bootstrap),
+    in blocks of resamples of at most max_elements values to bound the memory.
+
+    Args:
+    ----------
+        df_sorted (pandas.DataFrame): the data sorted by SiPM and Step, containing the values of V and I.
+        direction (str): "f" or "r".
+        start (float or numpy.ndarray, optional): the starting point of the linear part, or the start of each SiPM (forward only). Defaults to None.
+        peak_width (int, optional): The width of the peak to search (reverse only). Defaults to 10.
+        n_resamples (int, optional): the number of bootstrap resamples. Defaults to 200.
+        ci (float, optional): the confidence level of the percentile intervals. Defaults to 0.95.
+        seed (int, optional): seed of the resamples, so that the intervals are reproducible. Defaults to 0.
+        max_elements (int, optional): the maximum size of the resample arrays of a block. Defaults to 2**22.
+        cache (dict, optional): the cached arrays of df_sorted, see sipm_matrix(). Defaults to None.
+
+    Returns:
+    ----------
+        intervals (pandas.DataFrame): A DataFrame indexed by SiPM with columns <quantity>_ci_low and <quantity>_ci_high (quantity is R_quenching or V_bd).
+            SiPMs analyzed one by one by rev_engine (non-finite derivatives) get NaN values.
+    """
+    sipms, (x, y) = sipm_matrix(df_sorted, ["V", "I"], cache)
+    rng = np.random.default_rng(seed)
+    block = max(1, min(n_resamples, max_elements // max(x.size, 1)))
+
+    samples = []
+    for first in range(0, n_resamples, block):
+        n_block = min(block, n_resamples - first)
+        if direction == "f":
+            samples.append(fwd_bootstrap(x, y, start, n_block, rng))
+        else:
+            samples.append(rev_bootstrap(x, y, peak_width, n_block, rng))
+    samples = np.concatenate(samples)
+
+    quantity = "R_quenching" if direction == "f" else "V_bd"
+    with np.errstate(invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN SiPMs
+        low, high = np.nanpercentile(samples, [50 * (1 - ci), 50 * (1 + ci)], axis=0)
+    return pd.DataFrame({f"{quantity}_ci_low": low, f"{quantity}_ci_high": high}, index=pd.Index(sipms, name="SiPM"))
+
+
+def fwd_bootstrap(x, y, starting_point, n_resamples, rng):
+    """
+    Pairs bootstrap of the forward linear fit: the (V, I) points of the linear part of each SiPM are resampled with replacement
+    and all the resamples are fitted at once with the closed-form least squares of fwd_fit, on (resample x SiPM x point) arrays.
+
+    Args:
+    ----------
+        x (numpy.ndarray): (SiPM x step) array of the voltages.
+        y (numpy.ndarray): (SiPM x step) array of the currents, NaN-padded.
+        starting_point (float or numpy.ndarray): the starting point of the linear part, or the start of each SiPM.
+        n_resamples (int): the number of resamples.
+        rng (numpy.random.Generator): the random generator.
+
+    Returns:
+    ----------
+        R_quenching (numpy.ndarray): (resample x SiPM) array of the resampled R_quenching.
+    """
+    mask = (x >= np.asarray(starting_point, dtype=float).reshape(-1, 1)) & np.isfinite(y)
+    n = mask.sum(axis=1)
+    order = np.argsort(~mask, axis=1, kind="stable")  # Steps of the linear part first
+    width = max(int(n.max(initial=0)), 1)
+
+    rows = np.arange(len(x))[None, :, None]
+    picks = order[rows, (rng.random((n_resamples, len(x), width)) * n[None, :, None]).astype(int)]
+    weights = np.arange(width)[None, None, :] < n[None, :, None]  # Only the first n draws of each SiPM are used
+    xs = np.where(weights, x[rows, picks], 0)
+    ys = np.where(weights, y[rows, picks], 0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dx = np.where(weights, xs - (xs.sum(axis=2) / n)[..., None], 0)
+        dy = np.where(weights, ys - (ys.sum(axis=2) / n)[..., None], 0)
+        return 1000 * (dx * dx).sum(axis=2) / (dx * dy).sum(axis=2)
+
+
+def rev_bootstrap(x, y, peak_width, n_resamples, rng):
+    """
+    Residual bootstrap of the reverse polynomial-peak estimator: the residuals of the 5th-degree polynomial fit of each normalized derivative
+    are resampled with replacement and added back to the fit, then all the resamples are refitted through a stack of pseudo-inverses
+    of the Vandermonde matrices and their peaks are located by poly_peaks and analytic_peak, on (resample x SiPM x step) arrays.
+    The resampled V_bd is the polynomial peak for both peak modes (a gaussian curve_fit for every resample would be too slow).
+
+    Args:
+    ----------
+        x (numpy.ndarray): (SiPM x step) array of the voltages.
+        y (numpy.ndarray): (SiPM x step) array of the currents.
+        peak_width (int): The width of the peak to search.
+        n_resamples (int): the number of resamples.
+        rng (numpy.random.Generator): the random generator.
+
+    Returns:
+    ----------
+        V_bd (numpy.ndarray): (resample x SiPM) array of the resampled V_bd, NaN where no peak is found or the derivative is not finite.
+    """
+    n_sipm, n_steps = x.shape
+    V_bd = np.full((n_resamples, n_sipm), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        derivative = np.gradient(y, axis=1) / np.gradient(x, axis=1) / y
+    batched = np.flatnonzero(np.isfinite(derivative).all(axis=1) & np.isfinite(x).all(axis=1))
+    if len(batched) == 0 or n_steps < 6:
+        return V_bd
+    x, derivative = x[batched], derivative[batched]
+
+    # 5th degree polynomial fits in the window of Polynomial.fit, one Vandermonde matrix per SiPM
+    domains = np.column_stack([x.min(axis=1), x.max(axis=1)])
+    van = np.polynomial.polynomial.polyvander((2 * x - domains[:, :1] - domains[:, 1:]) / (domains[:, 1:] - domains[:, :1]), 5)
+    pinv = np.linalg.pinv(van)
+    y_fit = np.einsum("snk,sk->sn", van, np.einsum("skn,sn->sk", pinv, derivative))
+    residuals = derivative - y_fit
+
+    # Resampled derivatives and their polynomial fits
+    rows = np.arange(len(batched))[None, :, None]
+    resampled = y_fit[None] + residuals[rows, rng.integers(0, n_steps, (n_resamples, len(batched), n_steps))]
+    scaled_coefs = np.einsum("skn,rsn->rsk", pinv, resampled)
+    y_boot = np.einsum("snk,rsk->rsn", van, scaled_coefs)
+
+    # Peaks of all the resamples at once
+    idx_max = poly_peaks(y_boot.reshape(-1, n_steps), peak_width)
+    x_all = np.broadcast_to(x, (n_resamples, *x.shape)).reshape(-1, n_steps)
+    x_max = x_all[np.arange(len(x_all)), np.clip(idx_max, 0, None)]
+    params = analytic_peak(scaled_coefs.reshape(-1, 6), np.tile(domains, (n_resamples, 1)), x_max)
+    V_bd[:, batched] = np.where(idx_max >= 0, params[:, 2], np.nan).reshape(n_resamples, len(batched))
+    return V_bd
+
+
+def poly_peaks(y, peak_width):
+    """
+    Vectorized equivalent of taking the highest of signal.find_peaks(y_row, width=peak_width) for every row of y.
+    Local maxima, their prominences and their widths at half prominence are evaluated with the same rules as scipy, but on all the rows at once.
+
+    Args:
+    ----------
+        y (numpy.ndarray): (SiPM x step) array of the curves where to look for the peaks.
+        peak_width (int): The minimum width (in steps) of the peaks.
+
+    Returns:
+    ----------
+        idx_max (numpy.ndarray): for each row, the step index of the highest peak wider than peak_width, -1 if there is none.
+    """
+    n_rows, n = y.shape
+    idx_max = np.full(n_rows, -1)
+    rows, peaks = np.nonzero((y[:, 1:-1] > y[:, :-2]) & (y[:, 1:-1] > y[:, 2:]))
+    if len(rows) == 0:
+        return idx_max
+    peaks += 1
+
+    Y = y[rows]
+    P = np.arange(len(rows))
+    height = Y[P, peaks]
+    j = np.arange(n)[None, :]
+    pk = peaks[:, None]
+
+    # Prominence: lowest point on each side before reaching a higher value
+    higher = Y > height[:, None]
+    left_limit = np.where(higher & (j < pk), j, -1).max(axis=1)
+    right_limit = np.where(higher & (j > pk), j, n).min(axis=1)
+    left_side = np.where((j > left_limit[:, None]) & (j <= pk), Y, np.inf)
+    right_side = np.where((j >= pk) & (j < right_limit[:, None]), Y, np.inf)
+    left_base = left_side.argmin(axis=1)
+    right_base = right_side.argmin(axis=1)
+    prominence = height - np.maximum(left_side.min(axis=1), right_side.min(axis=1))
+
+    # Width at half prominence, linearly interpolated between the steps
+    half = (height - prominence / 2)[:, None]
+    below = Y <= half
+    left_cross = np.where(below & (j > left_base[:, None]) & (j <= pk), j, -1).max(axis=1)
+    left_cross = np.where(left_cross < 0, left_base, left_cross)
+    right_cross = np.where(below & (j >= pk) & (j < right_base[:, None]), j, n).min(axis=1)
+    right_cross = np.where(right_cross == n, right_base, right_cross)
+
+    y_left = Y[P, left_cross]
+    y_right = Y[P, right_cross]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        left_ip = left_cross + np.where(
+            y_left < half[:, 0], (half[:, 0] - y_left) / (Y[P, np.clip(left_cross + 1, 0, n - 1)] - y_left), 0)
+        right_ip = right_cross - np.where(
+            y_right < half[:, 0], (half[:, 0] - y_right) / (Y[P, np.clip(right_cross - 1, 0, n - 1)] - y_right), 0)
+    wide = (right_ip - left_ip) >= peak_width
+
+    # Highest wide peak of each row
+    order = np.lexsort((np.where(wide, height, -np.inf), rows))
+    last = order[np.r_[rows[order][1:] != rows[order][:-1], True]]
+    last = last[wide[last]]
+    idx_max[rows[last]] = peaks[last]
+    return idx_max
+
+
+def analytic_peak(scaled_coefs, domains, x_max):
+    """
+    Fast alternative to gauss_peak_fit, evaluated for many polynomials at once.
+    V_bd is the real root of the polynomial derivative (inside the voltage range, with negative curvature) closest to the peak x_max found on the steps,
+    and its standard deviation is the sigma of the gaussian with the same height and curvature at the peak, sqrt(-p / p'').
+    The roots of all the derivatives are found as the eigenvalues of a stack of companion matrices, in the [-1, 1] window of Polynomial.fit.
+
+    Args:
+    ----------
+        scaled_coefs (numpy.ndarray): (SiPM x 6) coefficients of the 5th-degree polynomials in the window coordinates (Polynomial.coef).
+        domains (numpy.ndarray): (SiPM x 2) voltage domains of the polynomials (Polynomial.domain).
+        x_max (numpy.ndarray): the peak positions found on the steps, used to pick the root.
+
+    Returns:
+    ----------
+        params (numpy.ndarray): (SiPM x 4) parameters H, A, mu and sigma of the equivalent gaussian (H = 0), NaN where no maximum is found.
+    """
+    n_sipm = len(scaled_coefs)
+    half = (domains[:, 1] - domains[:, 0]) / 2
+    center = (domains[:, 1] + domains[:, 0]) / 2
+    d1 = scaled_coefs[:, 1:] * np.arange(1, 6)  # coefficients of p'
+    d2 = d1[:, 1:] * np.arange(1, 5)  # coefficients of p''
+
+    # Roots of p' as the eigenvalues of its companion matrices
+    companion = np.zeros((n_sipm, 4, 4))
+    companion[:, np.arange(1, 4), np.arange(3)] = 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        companion[:, :, -1] = -d1[:, :4] / d1[:, 4:]
+    finite = np.isfinite(companion).all(axis=(1, 2))
+    roots = np.full((n_sipm, 4), np.nan, dtype=complex)
+    roots[finite] = np.linalg.eigvals(companion[finite])
+
+    t = roots.real
+    curvature = np.polynomial.polynomial.polyval(t.T, d2.T, tensor=False).T
+    valid = (np.abs(roots.imag) <= 1e-6 * (1 + np.abs(t))) & (np.abs(t) <= 1) & (curvature < 0)
+    t_max = (x_max - center) / half
+    nearest = np.where(valid, np.abs(t - t_max[:, None]), np.inf).argmin(axis=1)
+
+    steps = np.arange(n_sipm)
+    found = valid[steps, nearest]
+    t_peak = t[steps, nearest]
+    height = np.polynomial.polynomial.polyval(t_peak, scaled_coefs.T, tensor=False)
+    with np.errstate(invalid="ignore"):
+        sigma = np.sqrt(-height / curvature[steps, nearest]) * half
+
+    params = np.column_stack([np.zeros(n_sipm), height, center + t_peak * half, sigma])
+    params[~found] = np.nan
+    return params
+
+
+def gauss_peak_fit(x, y_fit, x_max, fwhm):
+    """
+    Fit a gaussian curve on the polynomial fit y_fit in the [x_max - fwhm/2, x_max + fwhm/2] window.
+
+    Args:
+    ----------
+        x (numpy.ndarray): the voltage values.
+        y_fit (numpy.ndarray): the 5th-degree polynomial evaluated on x.
+        x_max (float): the position of the polynomial peak.
+        fwhm (float): the width of the window around the peak.
+
+    Returns:
+    ----------
+        params (numpy.ndarray): the parameters H, A, mu and sigma of the gaussian.
+    """
+    window = np.logical_and(x >= (x_max - fwhm / 2), x <= (x_max + fwhm / 2))
+    fit_guess = [0, 1, x_max, fwhm / 2]
+    with profile_stage("curve_fit") as record:
+        params, covar, info, _, _ = optimize.curve_fit(gauss, x[window], y_fit[window], fit_guess, maxfev=20000, full_output=True)
+        record["nfev"] = info["nfev"]
+    return params
 
 
 @staticmethod
@@ -571,16 +3003,93 @@ def df_join(directory, direction):
     
     Returns:
     ----------
-    data (pandas.Dataframe): A Pandas DataFrame containing the contents of the joined csv files and an additional column with the name of the directory.
+    data (pandas.Dataframe): A Pandas DataFrame containing the contents of the joined csv files and additional columns with the name of the directory
+        and the ardu, test, temp and direction taken from the file names.
     """
     
-    files = [file for file in os.listdir(directory) if direction in file and file.endswith(".csv")]
-    dfs = [pd.read_csv(os.path.join(directory, file)) for file in files]
+    files = [file for file in os.listdir(directory) if direction in file and file.endswith("_results.csv")]
+    dfs = []
+    for file in files:
+        df = pd.read_csv(os.path.join(directory, file))
+        info = re.search(r"Arduino(.+?)_Test(.+?)_Temp(.+?)_(Forward|Reverse)_results\.csv", file)
+        if info:  # File metadata from the name given by Single.output_name
+            df = df.assign(ardu=info.group(1), test=info.group(2), temp=info.group(3), direction=info.group(4)[0].lower())
+        dfs.append(df)
     data = pd.concat(dfs)
-    data["subdir"] = os.path.basename(directory)
+    data["dataset"] = os.path.basename(directory)
     return data
 
 
+def results_from_csv(top):
+    """
+    Collect the *_results.csv files of every subfolder of top, in the format of the ResultsStore tables.
+
+    Args:
+    ----------
+        top (str): the "results" folder.
+
+    Returns:
+    ----------
+        results (dict): {"forward": DataFrame, "reverse": DataFrame}
+    """
+    fwd_all = []
+    rev_all = []
+    for subdir, dirs, files in os.walk(top):
+        for dir in dirs:
+            subdir_path = os.path.join(subdir, dir)
+            if any(file.endswith("_results.csv") for file in os.listdir(subdir_path)):
+                fwd_all.append(df_join(subdir_path, "Forward"))
+                rev_all.append(df_join(subdir_path, "Reverse"))
+    return {"forward": pd.concat(fwd_all), "reverse": pd.concat(rev_all)}
+
+
+def split_directions(table):
+    """
+    Split tagged results into forward and reverse tables.
+
+    Args:
+    ----------
+        table (pandas.DataFrame): tagged results of any direction.
+
+    Returns:
+    ----------
+        results (dict): {"forward": DataFrame, "reverse": DataFrame}
+    """
+    forward = table["direction"] == "f"
+    return {
+        "forward": table[forward].dropna(axis=1, how="all").reset_index(drop=True),
+        "reverse": table[~forward].dropna(axis=1, how="all").reset_index(drop=True),
+    }
+
+
+def comparison_hist(fwd, rev, title, plotpath):
+    """
+    Plot the R_q and V_bd histograms of several datasets on top of each other.
+
+    Args:
+    ----------
+        fwd (pandas.DataFrame): forward results with a "dataset" column.
+        rev (pandas.DataFrame): reverse results with a "dataset" column.
+        title (str): title of the plot.
+        plotpath (str): path of the saved .png.
+
+    Returns:
+    ----------
+        None
+    """
+    fig, axs = plt.subplots(2)
+    hist_params(fig, axs, title)
+    for dataset, group in fwd.groupby("dataset"):
+        group["R_quenching"].hist(ax=axs[0], label=dataset, bins=15, alpha=0.6)
+    for dataset, group in rev.groupby("dataset"):
+        group["V_bd"].hist(ax=axs[1], label=dataset, bins=15, alpha=0.6)
+    [ax.legend() for ax in axs]
+    plt.tight_layout()
+    plt.savefig(plotpath, bbox_inches="tight")
+    plt.close()
+    print(f"Plot saved as {plotpath}")
+
+
 @staticmethod
 def progress_bar(progress, total):
     """
@@ -8,7 +8,7 @@ import fnmatch
 Author: Jacopo Altieri
 
 This program analyzes SiPM data from either a single .csv file or a directory containing multiple .csv files.
-For a single SiPM file, it reads the Arduino info, data and the direction, and then produces the following analysis for each SiPM in the arduino (30 total):
+For a single SiPM file, it reads the Arduino info, data and the direction, and then produces the following analysis for each SiPM in the arduino (30 on the current boards, any number is supported):
 - If the direction is forward, it produces a linear regression on the linear part of the curve, an plots it.
   The slope of this line is the Quenching Resistance (rescaled by some constant factors).
 - If the direction is reverse, it evaluates the derivative of the data, fits a 5th-degree polynomial on it and then a gaussian curve on top of the polynomial peak.
@@ -19,6 +19,16 @@ On top of the single analysis, histograms of all the R_q and V_bd are also gener
 Usage: 
 ----------
     $ python .\SiPM_main.py <input_file/input_directory>
+    $ python .\SiPM_main.py <command> <input_file/input_directory>
+
+Commands:
+----------
+    (none): the whole analysis described above.
+    discover: list the ARDU files and their Arduino, test, temperature and direction.
+    fit: evaluate and save the results, without plots.
+    plot: render the plots from the saved results (after "fit").
+    histogram: plot the histograms from the saved results (after "fit" or a whole analysis of a directory).
+    pandas, scipy and matplotlib are imported only by the commands that use them, and the plots are rendered headless (Agg backend) unless MPLBACKEND is set.
 
 Inputs:
 ----------
@@ -43,25 +53,65 @@ Dependencies:
     fnmatch
 """
 
+# Subcommands, each loading only the modules it needs (pandas, scipy and matplotlib are imported by SiPM_class on first use)
+COMMANDS = ["discover", "fit", "plot", "histogram"]
+
 # Check if a valid argument is given
-if len(sys.argv) != 2:
-    print("\nUsage: insert a valid path to a .csv file or directory\n")
+if len(sys.argv) == 3 and sys.argv[1] in COMMANDS:
+    command, path = sys.argv[1], sys.argv[2]
+elif len(sys.argv) == 2:
+    command, path = "analyze", sys.argv[1]
+else:
+    print(f"\nUsage: insert a valid path to a .csv file or directory, optionally after a command ({', '.join(COMMANDS)})\n")
     sys.exit(1)
 
-path = sys.argv[1]
+is_file = fnmatch.fnmatch(path, "*ARDU_*_dataframe.csv")
+if not (os.path.isdir(path) or is_file):
+    print("Please provide a valid path to a .csv file or directory")
+    sys.exit(1)
+
+
+if command == "discover":
+    files = [path] if is_file else sipm.DirReader(path).dir_walker()
+    for file in files:
+        info = sipm.Single(file).get_fileinfo()
+        direction = "forward" if info["direction"] == "f" else "reverse"
+        print(f"{file}: Arduino {info['ardu']}, Test {info['test']}, {info['temp']}, {direction}")
+    print(f"{len(files)} ARDU files found")
 
-if os.path.isdir(path):
+elif command == "fit":
+    if is_file:
+        single = sipm.Single(path)
+        single.reader()
+        single.analyzer(plots=None)  # Results only, the plots can be rendered later with the "plot" command
+    else:
+        directory = sipm.DirReader(path)
+        directory.dir_walker()
+        directory.dir_analyzer(plots=None)
+
+elif command == "plot":
+    files = [path] if is_file else sipm.DirReader(path).dir_walker()
+    for file in files:
+        single = sipm.Single(file)
+        single.reader()
+        savepath = os.getcwd() if is_file else sipm.results_savepath(file, os.getcwd())
+        plot_name = single.plotter(savepath)  # Default arguments: (savepath=os.getcwd(), plots="pdf", plot_workers=1, dpi=100), uses the saved results
+        print(f"Plot saved as {savepath}\\{plot_name}")
+
+elif command == "histogram":
+    store = os.path.join(os.getcwd(), "results", "sipm_results.sqlite")
+    directory = sipm.DirReader(path)
+    directory.histograms(store=store if os.path.exists(store) else None)  # Falls back to the *_results.csv files in the results folder
+
+elif os.path.isdir(path):
     print("Provided a directory path, analyzing...")
     directory = sipm.DirReader(path)
     directory.dir_walker()
-    directory.dir_analyzer()  # Default arguments: (root_savepath = os.getcwd() ,hide_progress=True)
-    directory.histograms()  # Default arguments (compare_temp=True , compare_day=True)
-
+    directory.dir_analyzer()  # Default arguments: (root_savepath = os.getcwd(), workers=1, store="sipm_results.sqlite", incremental=True, profile=False, write_behind=False)
+    directory.histograms()  # Default arguments (compare_temp=True , compare_day=True, store=None, results=None, comparisons=None), uses the in-memory results of dir_analyzer
 
-elif fnmatch.fnmatch(path, "*ARDU_*_dataframe.csv"):
+else:
     print("Provided a file path, analyzing...")
     single = sipm.Single(path)
     single.reader()
-    single.analyzer()  # Default arguments: (room_f_start=0.75, ln2_f_start=1.55, peak_width=10, savepath=os.getcwd(), hide_progress=False)
-
-else: print("Please provide a valid path to a .csv file or directory")  
+    single.analyzer()  # Default arguments: (room_f_start=0.75, ln2_f_start=1.55, peak_width=10, savepath=os.getcwd(), hide_progress=False, peak_mode="gauss", plots="pdf", plot_workers=1, batch_rows=None, bootstrap=0, ci=0.95)
@@ -0,0 +1,61 @@
+import SiPM_class as sipm
+import sys
+import socket
+
+
+"""
+This program replays an existing ARDU file as a live measurement, as a local stand-in for a board when testing SiPM_stream.py.
+
+The rows are sent in measurement order (all the SiPMs at each step, one step after the other) at the given rate.
+
+Usage:
+----------
+    $ python .\SiPM_replay.py <input_file> <rate> [output]
+
+Inputs:
+----------
+    input_file: str
+        Path to an ARDU file.
+    rate: float
+        Rows per second, 0 to send them without delay.
+    output: str, optional
+        Where to send the rows: "-" for the standard output (default), ":port" to serve them on a socket, or the path of a file to append them to.
+
+Examples:
+----------
+    $ python .\SiPM_replay.py <input_file> 500 | python .\SiPM_stream.py <input_file> -
+    $ python .\SiPM_replay.py <input_file> 500 :5000       and       $ python .\SiPM_stream.py <input_file> localhost:5000
+
+Dependencies:
+----------
+    SiPM_class.py
+    sys
+    socket
+"""
+
+if len(sys.argv) not in (3, 4):
+    print("\nUsage: insert a valid path to a .csv file, the rate in rows per second and optionally the output (-, :port or file)\n")
+    sys.exit(1)
+
+path, rate = sys.argv[1], float(sys.argv[2])
+output = sys.argv[3] if len(sys.argv) == 4 else "-"
+lines = sipm.replay_rows(path, rate)
+
+if output == "-":
+    for line in lines:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+elif output.startswith(":"):
+    with socket.create_server(("", int(output[1:]))) as server:
+        print(f"Waiting for a connection on port {output[1:]}...")
+        connection, address = server.accept()
+        with connection:
+            for line in lines:
+                connection.sendall(line.encode())
+
+else:
+    with open(output, "a") as file:
+        for line in lines:
+            file.write(line)
+            file.flush()
@@ -0,0 +1,59 @@
+import SiPM_class as sipm
+import sys
+
+
+"""
+This program analyzes a SiPM measurement while it is being taken.
+
+The rows (SiPM, Step, V, I, I_err) of the measurement are read from a pipe, a socket or a file being appended, and analyzed online by sipm.Stream:
+- If the direction is forward, the linear fit of each SiPM is updated at every new point, so R_q is always up to date.
+- If the direction is reverse, the breakdown voltage of each SiPM is evaluated as soon as its sweep is complete.
+The result of each SiPM is printed on terminal when its sweep is complete, and all the results are saved at the end of the measurement.
+SiPM_replay.py can stream an existing ARDU file in place of a board.
+
+Usage:
+----------
+    $ python .\SiPM_stream.py <ARDU_file_name> <source> [n_steps]
+
+Inputs:
+----------
+    ARDU_file_name: str
+        Name of the measurement, in the ARDU file format (e.g. ARDU_0_Test_272_f_LN2_dataframe.csv), used for the metadata.
+    source: str
+        "-" for the standard input, "host:port" for a socket, or the path of a file being appended.
+    n_steps: int, optional
+        Number of steps of each sweep. If not given, the sweeps are completed at the end of the measurement.
+
+Outputs:
+----------
+    .csv containing the evaluated data (R_q or V_bd based on the direction), as in SiPM_main.py.
+
+Dependencies:
+----------
+    SiPM_class.py
+    sys
+"""
+
+if len(sys.argv) not in (3, 4):
+    print("\nUsage: insert the ARDU file name of the measurement, the source (-, host:port or file) and optionally the number of steps\n")
+    sys.exit(1)
+
+name, source = sys.argv[1], sys.argv[2]
+n_steps = int(sys.argv[3]) if len(sys.argv) == 4 else None
+
+
+def print_result(sipm_number, result):
+    if "R_quenching" in result:
+        print(f"SiPM {sipm_number}: R_q = {result['R_quenching']:.2f} +- {result['R_quenching_std']:.2f}")
+    else:
+        print(f"SiPM {sipm_number}: V_bd = {result['V_bd']:.3f} +- {result['V_bd_std']:.3f}")
+
+
+stream = sipm.Stream(name, n_steps=n_steps, on_result=print_result)
+# Default arguments: (room_f_start=0.75, ln2_f_start=1.55, peak_width=10, peak_mode="gauss", n_steps=None, on_result=None)
+try:
+    stream.consume(sipm.stream_lines(source))  # Default arguments: (follow=True, idle_timeout=10, poll=0.2)
+except KeyboardInterrupt:
+    print("Measurement interrupted")
+stream.close()
+print(f"Results saved as {stream.save()}")